@@ -1,16 +1,28 @@
 # final_project/agent.py
 
 from langchain.chains import RetrievalQA
-from langchain_community.chat_models import ChatOpenAI
-from final_project.config import OPENAI_MODEL_NAME
+from final_project.openai_client import chat_model
+from final_project.config import OPENAI_MODEL_NAME, ANSWER_CACHE_ENABLED, RETRIEVAL_MODE
+from final_project.answer_cache import CachedQAChain, AnswerCache, get_answer_cache
+from final_project.hybrid_retriever import make_retriever
+from final_project.telemetry import span, timed, log_event
 
-def build_agent(vectorstore, model_name: str = None):
+@timed("build_agent")
+def build_agent(vectorstore, model_name: str = None, cache_key: str = None,
+                docs: list = None, retrieval_mode: str = RETRIEVAL_MODE, partial: bool = False):
     """
     Builds a RetrievalQA chain based on the vector store,
     so that it answers only based on the video's transcript.
+    When the transcript chunks (docs) are given, retrieval uses the local BM25
+    index as well ("hybrid") or only ("lexical", no embedding call per question).
+    With ANSWER_CACHE_ENABLED the chain is wrapped in a CachedQAChain;
+    pass the video's cache_key to share answers between all agents of that video.
+    partial=True (the video is still being indexed) reads the shared answers
+    but does not add any, since they may miss the part not indexed yet.
     """
-    llm = ChatOpenAI(model_name=model_name or OPENAI_MODEL_NAME)
-    retriever = vectorstore.as_retriever()
+    model_to_use = model_name or OPENAI_MODEL_NAME
+    llm = chat_model(model_to_use)
+    retriever = make_retriever(vectorstore, docs, mode=retrieval_mode)
 
     qa_chain = RetrievalQA.from_chain_type(
         llm=llm,
@@ -19,4 +31,24 @@ def build_agent(vectorstore, model_name: str = None):
         return_source_documents=False
     )
 
-    return qa_chain
+    if not ANSWER_CACHE_ENABLED:
+        return qa_chain
+
+    cache = get_answer_cache(cache_key, model_to_use) if cache_key else AnswerCache()
+    # Lexical mode stays embedding-free: the cache then only matches exact questions
+    embeddings = None if (docs and retrieval_mode == "lexical") else getattr(vectorstore, "embeddings", None)
+    return CachedQAChain(qa_chain, embeddings=embeddings, cache=cache, store=not partial)
+
+
+def answer_question(qa_bot, question: str, cache_key: str = None) -> tuple:
+    """
+    Runs the QA chain in a "qa" span and logs the exchange as a "qa" event
+    in the telemetry log. Returns (answer, True if it came from the answer cache).
+    """
+    with span("qa", key=cache_key) as s:
+        if isinstance(qa_bot, CachedQAChain):
+            answer, s["lookup"] = qa_bot.lookup(question)
+        else:
+            answer, s["lookup"] = qa_bot.run(question), None
+    log_event("qa", key=cache_key, question=question, answer=answer, lookup=s["lookup"])
+    return answer, s["lookup"] in ("exact", "semantic")
@@ -0,0 +1,146 @@
+# final_project/answer_cache.py
+"""
+Per-video answer cache in front of the RetrievalQA chain.
+
+A question is first matched by its normalized text, then by embedding
+similarity against earlier questions about the same video. Entries expire
+after ANSWER_CACHE_TTL_SEC and the least recently used are dropped beyond
+ANSWER_CACHE_MAX_ENTRIES.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from final_project.config import (
+    ANSWER_CACHE_TTL_SEC,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_MAX_VIDEOS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases, drops punctuation and collapses whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+class AnswerCache:
+    """Thread-safe TTL/LRU cache of answers, with exact and semantic lookup."""
+
+    def __init__(self, ttl_sec: float = ANSWER_CACHE_TTL_SEC, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries = OrderedDict()     # normalized question → (answer, unit vector or None, created)
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_sec
+        for q in [q for q, (_, _, created) in self._entries.items() if created < cutoff]:
+            del self._entries[q]
+
+    def get_exact(self, question: str):
+        norm = normalize_question(question)
+        with self._lock:
+            self._expire()
+            if norm in self._entries:
+                self._entries.move_to_end(norm)
+                self.stats["exact_hits"] += 1
+                return self._entries[norm][0]
+        return None
+
+    def get_similar(self, vector: np.ndarray):
+        """Returns the answer of the most similar cached question above the threshold."""
+        with self._lock:
+            candidates = [(q, v) for q, (_, v, _) in self._entries.items() if v is not None]
+            if candidates:
+                matrix = np.stack([v for _, v in candidates])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    q = candidates[best][0]
+                    self._entries.move_to_end(q)
+                    self.stats["semantic_hits"] += 1
+                    return self._entries[q][0]
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, question: str, answer: str, vector: np.ndarray = None) -> None:
+        with self._lock:
+            self._entries[normalize_question(question)] = (answer, vector, time.time())
+            self._entries.move_to_end(normalize_question(question))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _unit(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class CachedQAChain:
+    """
+    Wraps a RetrievalQA chain: run() answers from the cache when it can,
+    otherwise calls the chain and stores the answer. Other attributes are
+    passed through to the wrapped chain. With store=False (the index is still
+    being built) answers are looked up but not stored.
+    """
+
+    def __init__(self, chain, embeddings=None, cache: AnswerCache = None, store: bool = True):
+        self.chain = chain
+        self.embeddings = embeddings
+        self.cache = cache or AnswerCache()
+        self.store = store
+
+    def lookup(self, question: str) -> tuple:
+        """Returns (answer, "exact" | "semantic" | "miss")."""
+        answer = self.cache.get_exact(question)
+        if answer is not None:
+            return answer, "exact"
+
+        vector = None
+        if self.embeddings is not None:
+            vector = _unit(self.embeddings.embed_query(question))
+            answer = self.cache.get_similar(vector)
+            if answer is not None:
+                return answer, "semantic"
+        else:
+            self.cache.stats["misses"] += 1
+
+        answer = self.chain.run(question)
+        if self.store:
+            self.cache.put(question, answer, vector)
+        return answer, "miss"
+
+    def run(self, question: str) -> str:
+        return self.lookup(question)[0]
+
+    def __getattr__(self, name):
+        return getattr(self.chain, name)
+
+
+# One cache per (video, model), shared by every agent built for them;
+# the least recently used beyond ANSWER_CACHE_MAX_VIDEOS are dropped
+_caches = OrderedDict()
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(video_key: str, model_name: str) -> AnswerCache:
+    with _caches_lock:
+        key = (video_key, model_name)
+        if key not in _caches:
+            _caches[key] = AnswerCache()
+        _caches.move_to_end(key)
+        while len(_caches) > ANSWER_CACHE_MAX_VIDEOS:
+            _caches.popitem(last=False)
+        return _caches[key]
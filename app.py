@@ -2,28 +2,20 @@
 
 import os
 import logging
+import threading
 from textwrap import shorten
 
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
-from yt_dlp import YoutubeDL
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+# Only light modules here: yt_dlp, LangChain, Chroma, the OpenAI SDK and
+# faster_whisper are imported where they are first used, so the first page
+# renders without waiting for them
+from final_project.cache_utils import load_cache, generate_cache_key, get_cache_manager
+from final_project.config import WHISPER_PREWARM
+from final_project.telemetry import log_event
 
-from openai import OpenAI
-from langsmith import Client
-
-from final_project.download_audio import download_audio_from_youtube
-from final_project.transcribe_audio import transcribe_audio
-from final_project.text_processing import split_text
-from final_project.embeddings_database import create_vectorstore
-from final_project.summarization import generate_summary
-from final_project.cache_utils import save_cache, load_cache, generate_cache_key
-from final_project.agent import build_agent
-from final_project.config import select_gpt_model_by_whisper
-
-# ─── Load API keys and initialize clients
+# ─── Load API keys (the OpenAI and LangSmith clients are created on first use)
 dotenv_path = find_dotenv(".env", raise_error_if_not_found=True)
 load_dotenv(dotenv_path)
 
@@ -45,9 +37,6 @@ os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
 os.environ["LANGCHAIN_TRACING_V2"] = LANGCHAIN_TRACING_V2
 os.environ["LANGCHAIN_PROJECT"] = LANGCHAIN_PROJECT
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-langsmith_client = Client()
-
 # ─── Logging setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -69,11 +58,26 @@ st.markdown("""
 for d in ("audio", "transcripts", "summaries", "vectorstore", "temp"):
     os.makedirs(f"cache/{d}", exist_ok=True)
 
+# ─── Pre-load Whisper models once per server process (in the background)
+def _warm_up():
+    from final_project.model_registry import warm_up_models
+    warm_up_models()
+
+@st.cache_resource
+def _start_model_warm_up():
+    thread = threading.Thread(target=_warm_up, daemon=True)
+    thread.start()
+    return thread
+
+if WHISPER_PREWARM:
+    _start_model_warm_up()
+
 # ─── Default values for session state
 st.session_state.setdefault("chat_history", [])
 st.session_state.setdefault("brief", "No summary yet.")
 
 def get_video_metadata(url: str) -> dict:
+    from yt_dlp import YoutubeDL
     try:
         with YoutubeDL({"quiet": True, "skip_download": True}) as ydl:
             info = ydl.extract_info(url, download=False)
@@ -101,67 +105,121 @@ with st.form("url_form"):
     )
     process = st.form_submit_button("ENTER")
 
-# ─── Main video processing workflow
+# ─── Shared across sessions and reruns: one Chroma handle and one agent per cached video
+@st.cache_resource
+def _open_vectorstore(vs_dir: str, key: str):
+    from final_project.embeddings_database import open_vectorstore
+    return open_vectorstore(vs_dir, key)
+
+@st.cache_resource
+def _cached_agent(key: str, vs_dir: str, model_name: str):
+    from final_project.agent import build_agent
+    from final_project.embeddings_database import stored_documents
+    store = _open_vectorstore(vs_dir, key)
+    # BM25 indexes the chunks in the store, so fusion matches vector hits by their text
+    return build_agent(store, model_name=model_name, cache_key=key, docs=stored_documents(store) or None)
+
+# ─── Main video processing workflow (the work itself runs in a background job)
 if process and youtube_url:
-    with st.spinner("Processing…"):
-        try:
-            key = generate_cache_key(youtube_url)
-            cached = load_cache(key)
-
-            if cached:
-                transcript, summary, vs_dir = cached
-                vectorstore = Chroma(
-                    persist_directory=vs_dir,
-                    embedding_function=OpenAIEmbeddings()
-                )
-                chosen_model = gpt_model_choice or "gpt-4"
-            else:
-                wav = download_audio_from_youtube(youtube_url)
-                wav_p = f"cache/audio/{key}.wav"
-                os.replace(wav, wav_p)
-
-                progress_bar = st.progress(0)
-                transcript, whisper_used = transcribe_audio(wav_p, progress_bar)
-                progress_bar.progress(1.0)
-
-                chosen_model = gpt_model_choice or select_gpt_model_by_whisper(whisper_used)
-
-                with open(f"cache/transcripts/{key}.txt", "w", encoding="utf-8") as f:
-                    f.write(transcript)
-
-                try:
-                    summary = generate_summary(transcript, model_name=chosen_model)
-                except Exception as e:
-                    msg = str(e).lower()
-                    if "insufficient_quota" in msg or "429" in msg:
-                        st.error("OpenAI quota exceeded. Summary generation is not available at the moment.")
-                        summary = "—"
-                    else:
-                        raise
-
-                with open(f"cache/summaries/{key}.txt", "w", encoding="utf-8") as f:
-                    f.write(summary)
-
-                vs_dir = f"cache/vectorstore/{key}"
-                vectorstore = create_vectorstore(split_text(transcript), persist_dir=vs_dir)
-                save_cache(key, transcript, summary, vs_dir)
-
-            agent = build_agent(vectorstore, model_name=chosen_model)
-            st.session_state.qa_bot = agent
-            st.session_state.metadata = get_video_metadata(youtube_url)
+    try:
+        key = generate_cache_key(youtube_url)
+        cached = load_cache(key, url=youtube_url)
+
+        st.session_state.pop("qa_bot", None)
+        st.session_state.pop("job_key", None)
+        st.session_state.pop("job_error", None)
+        st.session_state.video_key = key
+        st.session_state.gpt_model = gpt_model_choice
+        st.session_state.metadata = get_video_metadata(youtube_url)
+        st.session_state.chat_history = []
+
+        if cached:
+            transcript, summary, vs_dir = cached
             st.session_state.brief = summary
-            st.session_state.chat_history = []
+            st.session_state.qa_bot = _cached_agent(key, vs_dir, gpt_model_choice or "gpt-4")
+        else:
+            from final_project.jobs import get_job_manager
+            get_job_manager().submit(youtube_url, gpt_model_choice)
+            st.session_state.job_key = key
+            st.session_state.brief = "⏳ The summary will appear when processing finishes."
 
-        except Exception as e:
-            logger.error(f"Processing error: {e}")
-            st.error(f"Error during processing: {e}")
+    except Exception as e:
+        logger.error(f"Processing error: {e}")
+        st.error(f"Error during processing: {e}")
 
 # ─── Display video title and summary
 if "metadata" in st.session_state:
     md = st.session_state.metadata
-    st.markdown(f"**Title:** {md['Title']}  \n**Duration:** {md['duration']}")
+    st.markdown(f"**Title:** {md['title']}  \n**Duration:** {md['duration']}")
     st.markdown("**Brief:**")
     st.write(st.session_state.brief)
+    if st.session_state.get("ingest_note"):
+        st.caption(st.session_state.ingest_note)
+    if st.session_state.get("job_error"):
+        st.error(f"Error during processing: {st.session_state.job_error}")
+
+def _ingest_note(stats: dict) -> str:
+    notes = []
+    if stats.get("transcript_source", "").startswith("captions:"):
+        _, kind, lang = stats["transcript_source"].split(":", 2)
+        notes.append(f"💬 Transcript from {kind} captions ({lang})")
+    if stats.get("time_to_first_segment") is not None:
+        notes.append(f"⏱️ First segment after {stats['time_to_first_segment']:.1f}s, "
+                     f"done in {stats['total_time']:.1f}s")
+    if stats.get("embedding"):
+        emb = stats["embedding"]
+        notes.append(f"🧮 Embedding cache: {emb['hits']}/{emb['texts']} chunks reused, "
+                     f"{emb['api_calls_saved']} API calls saved")
+    return " · ".join(notes)
+
+# ─── Job status (polled; the script thread never runs the pipeline itself)
+_STAGE_LABELS = {
+    "queued": "⏳ Waiting for a free worker",
+    "captions": "💬 Checking captions",
+    "downloading": "⬇️ Downloading audio",
+    "transcribing": "📝 Transcribing",
+    "summarizing": "📄 Summarizing",
+    "indexing": "🔍 Indexing",
+}
+
+@st.fragment(run_every=2)
+def _job_status():
+    key = st.session_state.get("job_key")
+    if key is None:
+        return
+    from final_project.jobs import get_job_manager
+    job = get_job_manager().get(key)
+    if job is None:
+        st.session_state.pop("job_key")
+        return
+    if job.error:
+        # Stop polling; the error stays on the page until the next video is submitted
+        st.session_state.pop("job_key")
+        st.session_state.job_error = job.error
+        st.rerun()
+
+    model_name = st.session_state.get("gpt_model") or job.chosen_model
+    if job.done:
+        st.session_state.pop("job_key")
+        if job.warning:
+            st.toast(job.warning, icon="⚠️")
+        st.session_state.brief = job.summary
+        st.session_state.ingest_note = _ingest_note(job.stats)
+        st.session_state.qa_bot = job.agent(model_name)
+        st.rerun()
+
+    status = get_cache_manager().get_job_status(key) or {"stage": job.stage, "progress": 0.0, "position": 0.0}
+    label = _STAGE_LABELS.get(status["stage"], status["stage"])
+    if status["position"]:
+        mins, secs = divmod(int(status["position"]), 60)
+        label += f" · transcribed up to {mins:02d}:{secs:02d}"
+    st.progress(min(1.0, status["progress"]), text=label)
+
+    if job.ready and "qa_bot" not in st.session_state:
+        st.session_state.qa_bot = job.agent(model_name)
+        st.rerun()
+
+_job_status()
 
 # ─── Display past user-bot interactions
 if st.session_state.chat_history:
@@ -179,25 +237,31 @@ if "qa_bot" in st.session_state:
         with st.chat_message("user"):
             st.markdown(f"<div class='user-bubble'>{user_question}</div>", unsafe_allow_html=True)
 
+        from_cache = False
+        video_key = st.session_state.get("video_key")
         if "title" in user_question.lower():
             answer_text = st.session_state.metadata.get("title", "Sorry, the title is not available.")
+            log_event("qa", key=video_key, question=user_question, answer=answer_text, lookup="metadata")
         elif any(k in user_question.lower() for k in ("summary", "brief")):
             answer_text = st.session_state.brief
+            log_event("qa", key=video_key, question=user_question, answer=answer_text, lookup="metadata")
         else:
+            from final_project.agent import answer_question
+            from final_project.openai_client import is_rate_limit_error, is_quota_error
             with st.spinner("✍️ Generating Answer..."):
                 try:
-                    answer_text = st.session_state.qa_bot.run(user_question)
+                    answer_text, from_cache = answer_question(st.session_state.qa_bot, user_question, video_key)
                 except Exception as e:
-                    msg = str(e).lower()
-                    if "insufficient_quota" in msg or "429" in msg:
-                        st.error("OpenAI quota exceeded. Answer generation is not available at the moment.")
+                    if is_rate_limit_error(e):
+                        reason = "quota exceeded" if is_quota_error(e) else "rate limit reached"
+                        st.error(f"OpenAI {reason}. Answer generation is not available at the moment.")
                         answer_text = "Sorry, I can't generate an answer right now."
                     else:
                         raise
 
         with st.chat_message("assistant"):
             st.markdown(f"<div class='bot-bubble'>{answer_text}</div>", unsafe_allow_html=True)
+            if from_cache:
+                st.caption("⚡ Answered from cache")
 
         st.session_state.chat_history.append((user_question, answer_text))
-        with open("qa_log.txt", "a", encoding="utf-8") as f:
-            f.write(f"Q: {user_question}\nA: {answer_text}\n{'-'*40}\n")
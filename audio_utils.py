@@ -1,39 +1,154 @@
 import os
-from pydub.utils import mediainfo
-from pydub import AudioSegment
+import glob
+import shutil
+import wave
+import subprocess
 
+from final_project.telemetry import timed
+
+# Whisper works on 16 kHz mono audio, so parts are written in that format directly
+TARGET_SAMPLE_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2          # 16-bit PCM
+
+# Frames copied per read while streaming a WAV (≈ 10 s at 16 kHz)
+_STREAM_WINDOW_FRAMES = 160_000
+
+
+def _wav_params(filepath: str):
+    """Returns the WAV header parameters, or None if the file is not a plain PCM WAV."""
+    try:
+        with wave.open(filepath, "rb") as wf:
+            return wf.getparams()
+    except (wave.Error, EOFError):
+        return None
+
+
+@timed("audio_duration")
 def get_audio_duration(filepath: str) -> float:
     """
     Reads the duration of an audio file in minutes.
+    WAV files are measured from their header; other formats fall back to mediainfo.
     """
+    params = _wav_params(filepath)
+    if params is not None:
+        return params.nframes / params.framerate / 60
+
+    from pydub.utils import mediainfo
     info = mediainfo(filepath)
     duration_sec = float(info['duration'])
     return duration_sec / 60  # Convert from seconds to minutes
 
 
+def _part_path(filepath: str, output_dir: str, index: int) -> str:
+    base = os.path.splitext(os.path.basename(filepath))[0]
+    return os.path.join(output_dir, f"{base}_part{index}.wav")
+
+
+def _split_wav_stream(filepath: str, chunk_frames: int, output_dir: str) -> list:
+    """
+    Copies a 16 kHz mono WAV into parts window by window,
+    so memory stays constant whatever the length of the file.
+    """
+    chunks = []
+    with wave.open(filepath, "rb") as src:
+        params = src.getparams()
+        remaining = params.nframes
+        index = 0
+        while remaining > 0:
+            chunk_path = _part_path(filepath, output_dir, index)
+            part_frames = min(chunk_frames, remaining)
+            with wave.open(chunk_path, "wb") as dst:
+                dst.setparams(params)
+                left = part_frames
+                while left > 0:
+                    frames = src.readframes(min(_STREAM_WINDOW_FRAMES, left))
+                    if not frames:
+                        break
+                    dst.writeframes(frames)
+                    left -= len(frames) // (params.sampwidth * params.nchannels)
+            chunks.append(chunk_path)
+            remaining -= part_frames
+            index += 1
+    return chunks
+
+
+def _split_with_ffmpeg(filepath: str, chunk_sec: int, output_dir: str) -> list:
+    """
+    Lets ffmpeg's segment muxer cut and resample the file in one streaming pass.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is required to split non-16 kHz / non-WAV audio")
+
+    base = os.path.splitext(os.path.basename(filepath))[0]
+    pattern = os.path.join(output_dir, f"{base}_part%d.wav")
+    subprocess.run(
+        [
+            ffmpeg, "-v", "error", "-y", "-i", filepath,
+            "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), "-c:a", "pcm_s16le",
+            "-f", "segment", "-segment_time", str(chunk_sec), "-reset_timestamps", "1",
+            pattern,
+        ],
+        check=True,
+    )
+
+    chunks = []
+    while os.path.exists(_part_path(filepath, output_dir, len(chunks))):
+        chunks.append(_part_path(filepath, output_dir, len(chunks)))
+    return chunks
+
+
+@timed("convert_audio")
+def convert_to_wav16k(filepath: str, output_dir: str) -> str:
+    """Decodes any audio file to a 16 kHz mono 16-bit WAV in output_dir (streamed by ffmpeg)."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is required to convert non-16 kHz / non-WAV audio")
+
+    base = os.path.splitext(os.path.basename(filepath))[0]
+    wav_path = os.path.join(output_dir, f"{base}_16k.wav")
+    subprocess.run(
+        [
+            ffmpeg, "-v", "error", "-y", "-i", filepath,
+            "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), "-c:a", "pcm_s16le",
+            wav_path,
+        ],
+        check=True,
+    )
+    return wav_path
+
+
+@timed("split_audio")
 def split_audio(filepath: str, chunk_duration_min: int = 20, output_dir: str = None) -> list:
     """
     Splits a long audio file into chunks of a specified duration (in minutes),
     and saves the chunks into a specified folder (e.g., cache/audio/).
+    The file is never fully loaded into memory: 16 kHz mono WAVs are copied
+    frame window by frame window, anything else is segmented by ffmpeg.
+    Parts are always written as 16 kHz mono 16-bit WAV.
 
     Returns:
         A list of full paths for all the split audio parts.
     """
-    audio = AudioSegment.from_file(filepath)
-    duration_ms = len(audio)
-    chunk_duration_ms = chunk_duration_min * 60 * 1000  # Duration per chunk in milliseconds
-
     # Determine output directory
     if output_dir is None:
         output_dir = os.path.join(os.path.dirname(filepath), "split_parts")
     os.makedirs(output_dir, exist_ok=True)
 
-    chunks = []
-    for i in range(0, duration_ms, chunk_duration_ms):
-        chunk = audio[i:i + chunk_duration_ms]
-        chunk_filename = f"{os.path.splitext(os.path.basename(filepath))[0]}_part{i // chunk_duration_ms}.wav"
-        chunk_path = os.path.join(output_dir, chunk_filename)
-        chunk.export(chunk_path, format="wav")
-        chunks.append(chunk_path)
+    # Remove parts left over from an earlier split of the same file
+    base = os.path.splitext(os.path.basename(filepath))[0]
+    for old_part in glob.glob(os.path.join(glob.escape(output_dir), f"{glob.escape(base)}_part*.wav")):
+        os.remove(old_part)
 
-    return chunks
+    chunk_sec = chunk_duration_min * 60
+    params = _wav_params(filepath)
+    if (
+        params is not None
+        and params.framerate == TARGET_SAMPLE_RATE
+        and params.nchannels == TARGET_CHANNELS
+        and params.sampwidth == TARGET_SAMPLE_WIDTH
+    ):
+        return _split_wav_stream(filepath, chunk_sec * TARGET_SAMPLE_RATE, output_dir)
+
+    return _split_with_ffmpeg(filepath, chunk_sec, output_dir)
@@ -0,0 +1,379 @@
+# final_project/batch.py
+"""
+Headless batch ingestion of many videos, e.g. whole playlists or channels overnight.
+
+    python -m final_project.batch URL [URL ...]
+    python -m final_project.batch --file urls.txt
+    python -m final_project.batch --reindex [URL ...]
+
+Download → transcription → summarization → embedding run as separate stages
+joined by bounded queues, each with its own concurrency: downloads and API calls
+use threads, Whisper runs in worker processes. Every finished artifact is saved
+through cache_utils right away, so a rerun after a crash skips what is done.
+
+--reindex rebuilds the vectorstores of already transcribed videos (all of them
+when no URL is given) from their stored segments, e.g. after changing
+CHUNK_SIZE / CHUNK_OVERLAP. Nothing is downloaded or transcribed again.
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import logging
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from yt_dlp import YoutubeDL
+
+from final_project.download_audio import download_audio_from_youtube
+from final_project.captions import fetch_captions
+from final_project.transcribe_audio import transcribe_audio
+from final_project.audio_utils import get_audio_duration
+from final_project.segment_store import save_segments, video_documents
+from final_project.telemetry import flushed
+from final_project.embeddings_database import create_vectorstore, vectorstore_location
+from final_project.summarization import generate_summary
+from final_project.cache_utils import (
+    generate_cache_key,
+    extract_video_id,
+    artifact_path,
+    is_shared_vectorstore,
+    get_cache_manager,
+    load_cache,
+    save_cache,
+)
+from final_project.config import (
+    select_gpt_model_by_whisper,
+    PIPELINE_KEEP_WAV,
+    WHISPER_CPU_THREADS,
+    BATCH_QUEUE_SIZE,
+    BATCH_DOWNLOAD_WORKERS,
+    BATCH_TRANSCRIBE_WORKERS,
+    BATCH_SUMMARY_WORKERS,
+    BATCH_EMBED_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the input on a stage queue
+_DONE = object()
+
+
+# ─────────────────────────── Input expansion ───────────────────────────
+def expand_urls(urls: list, _depth: int = 0) -> list:
+    """
+    Turns playlist and channel URLs into video URLs (without downloading anything).
+    A URL that already names a video, e.g. watch?v=…&list=…, stays a single video.
+    """
+    videos = []
+    for url in urls:
+        if extract_video_id(url):
+            videos.append(url)
+            continue
+        if _depth >= 2:
+            continue
+        try:
+            with YoutubeDL({"quiet": True, "extract_flat": "in_playlist", "skip_download": True}) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            logger.error(f"Could not expand {url}: {e}")
+            continue
+        # Channel pages list their tabs (Videos, Shorts…) as nested playlists
+        entries = [e.get("url") or e.get("id") for e in info.get("entries") or [] if e]
+        videos.extend(expand_urls([e for e in entries if e], _depth + 1))
+
+    # Keep the first occurrence of each video
+    seen, unique = set(), []
+    for url in videos:
+        key = generate_cache_key(url)
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+
+# ─────────────────────────── Stages ───────────────────────────
+class Stage:
+    """
+    A pool of worker threads that take items from `inbox`, call `func(item)`
+    and put the result on `outbox`. `func` may return None to drop an item.
+    When the last worker sees the end marker, it forwards it downstream.
+    """
+
+    def __init__(self, name: str, func, workers: int, inbox: queue.Queue, outbox: queue.Queue = None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.inbox = inbox
+        self.outbox = outbox
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.started = None
+        self.finished = None
+        self._alive = self.workers
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+
+    def start(self) -> "Stage":
+        self.started = time.perf_counter()
+        for t in self._threads:
+            t.start()
+        return self
+
+    def join(self) -> None:
+        for t in self._threads:
+            t.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                self.inbox.put(_DONE)          # let sibling workers see it too
+                break
+            t0 = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                logger.error(f"[{self.name}] {item['url']} failed: {e}")
+                with self._lock:
+                    self.failed += 1
+                continue
+            finally:
+                with self._lock:
+                    self.busy_seconds += time.perf_counter() - t0
+            with self._lock:
+                if result is None:
+                    self.skipped += 1
+                else:
+                    self.processed += 1
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last:
+            self.finished = time.perf_counter()
+            if self.outbox is not None:
+                self.outbox.put(_DONE)
+
+    def report(self) -> str:
+        wall = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        rate = self.processed / wall * 60 if wall > 0 else 0.0
+        return (
+            f"{self.name:<11} workers={self.workers:<2} done={self.processed:<4} "
+            f"skipped={self.skipped:<4} failed={self.failed:<3} busy={self.busy_seconds:8.1f}s "
+            f"wall={wall:8.1f}s  {rate:6.2f} items/min"
+        )
+
+
+@flushed
+def _transcribe_job(path: str, cpu_threads: int) -> tuple:
+    """Runs inside a worker process; the process keeps its Whisper models between jobs."""
+    segments = []
+    transcript, model_size = transcribe_audio(
+        path, parallel=False, cpu_threads=cpu_threads,
+        on_segment=lambda start, end, text: segments.append((start, end, text)),
+    )
+    return transcript, model_size, get_audio_duration(path), segments
+
+
+class BatchIngestion:
+    """Wires the four stages together for one run."""
+
+    def __init__(self, gpt_model: str = "", download_workers: int = BATCH_DOWNLOAD_WORKERS,
+                 transcribe_workers: int = BATCH_TRANSCRIBE_WORKERS,
+                 summary_workers: int = BATCH_SUMMARY_WORKERS, embed_workers: int = BATCH_EMBED_WORKERS,
+                 queue_size: int = BATCH_QUEUE_SIZE):
+        self.gpt_model = gpt_model
+        self.cache = get_cache_manager()
+        self.cpu_threads = WHISPER_CPU_THREADS
+        self.transcribe_workers = transcribe_workers or max(1, (os.cpu_count() or 1) // self.cpu_threads)
+        self.audio_minutes = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = set()          # keys between the download and the end of embed
+
+
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(4)]
+        self.stages = [
+            Stage("download", self._tracked(self._download), download_workers, self.queues[0], self.queues[1]),
+            Stage("transcribe", self._tracked(self._transcribe), self.transcribe_workers,
+                  self.queues[1], self.queues[2]),
+            Stage("summarize", self._tracked(self._summarize), summary_workers, self.queues[2], self.queues[3]),
+            Stage("embed", self._tracked(self._embed, last=True), embed_workers, self.queues[3]),
+        ]
+        self._pool = None
+
+    def _tracked(self, func, last: bool = False):
+        """
+        Keeps item["key"] in _in_flight until the item leaves the pipeline (dropped,
+        failed, or through the last stage), so the eviction spares its audio meanwhile.
+        """
+        def run(item: dict):
+            with self._lock:
+                self._in_flight.add(item["key"])
+            result = None
+            try:
+                result = func(item)
+                return result
+            finally:
+                if result is None or last:
+                    with self._lock:
+                        self._in_flight.discard(item["key"])
+        return run
+
+    # Each stage function skips the work whose artifact is already cached
+
+    def _download(self, item: dict):
+        if load_cache(item["key"], url=item["url"]):
+            return None
+        if self.cache.get_path(item["key"], "transcript") or self.cache.get_path(item["key"], "audio"):
+            return item
+        captions = fetch_captions(item["url"])
+        if captions:
+            # Uploaded captions replace the audio: the transcribe stage finds the transcript cached
+            segments, source = captions
+            with self.cache.lock(item["key"]):
+                save_segments(item["key"], segments)
+                self.cache.write_text(item["key"], "transcript", " ".join(text for _, _, text in segments))
+                self.cache.set_meta(item["key"], "transcript_source", source)
+            return item
+        with self.cache.lock(item["key"]):
+            wav = download_audio_from_youtube(item["url"])
+            os.makedirs(os.path.dirname(artifact_path(item["key"], "audio")), exist_ok=True)
+            shutil.move(wav, artifact_path(item["key"], "audio"))
+            shutil.rmtree(os.path.dirname(wav), ignore_errors=True)
+            self.cache.register(item["key"], "audio")
+        return item
+
+    def _transcribe(self, item: dict):
+        transcript = self.cache.read_text(item["key"], "transcript")
+        if transcript is None:
+            future = self._pool.submit(_transcribe_job, artifact_path(item["key"], "audio"), self.cpu_threads)
+            transcript, model_size, minutes, segments = future.result()
+            with self._lock:
+                self.audio_minutes += minutes
+            with self.cache.lock(item["key"]):
+                save_segments(item["key"], segments)
+                self.cache.write_text(item["key"], "transcript", transcript)
+                self.cache.set_meta(item["key"], "transcript_source", f"whisper:{model_size}")
+                if not PIPELINE_KEEP_WAV:
+                    # The transcript is saved: the WAV would only take up disk budget
+                    self.cache.remove(item["key"], "audio")
+            item["whisper_model"] = model_size
+        item["transcript"] = transcript
+        return item
+
+    def _summarize(self, item: dict):
+        summary = self.cache.read_text(item["key"], "summary")
+        if summary is None:
+            whisper_model = item.get("whisper_model")
+            model = self.gpt_model or (select_gpt_model_by_whisper(whisper_model) if whisper_model else "gpt-4")
+            summary = generate_summary(item["transcript"], model_name=model)
+            with self.cache.lock(item["key"]):
+                self.cache.write_text(item["key"], "summary", summary)
+        item["summary"] = summary
+        return item
+
+    def _embed(self, item: dict):
+        vs_dir = vectorstore_location(item["key"])
+        # An unregistered directory is a leftover of an interrupted run
+        # (in the shared collection, create_vectorstore replaces the video's rows)
+        if not is_shared_vectorstore(vs_dir):
+            shutil.rmtree(vs_dir, ignore_errors=True)
+        docs = video_documents(item["key"], item["transcript"])
+        store = create_vectorstore(docs, persist_dir=vs_dir, video_key=item["key"])
+        with self._lock:
+            in_flight = set(self._in_flight)
+        save_cache(item["key"], item["transcript"], item["summary"], vs_dir,
+                   vectorstore_size=getattr(store, "bytes_added", None), protect=in_flight)
+        return item
+
+    def reindex(self, keys: list) -> None:
+        """Rebuilds the vectorstores of the given keys from their cached transcripts."""
+        started = time.perf_counter()
+        done = 0
+        for key in keys:
+            transcript = self.cache.read_text(key, "transcript")
+            summary = self.cache.read_text(key, "summary")
+            if transcript is None or summary is None:
+                logger.warning(f"{key}: no cached transcript and summary, skipping")
+                continue
+            self.cache.remove(key, "vectorstore")
+            self._embed({"url": key, "key": key, "transcript": transcript, "summary": summary})
+            done += 1
+        print(f"\nReindexed {done} videos in {time.perf_counter() - started:.1f}s")
+
+    def run(self, urls: list) -> None:
+        started = time.perf_counter()
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.transcribe_workers, mp_context=ctx) as self._pool:
+            for stage in self.stages:
+                stage.start()
+            for url in urls:
+                self.queues[0].put({"url": url, "key": generate_cache_key(url)})
+            self.queues[0].put(_DONE)
+            for stage in self.stages:
+                stage.join()
+
+        wall = time.perf_counter() - started
+        print(f"\nProcessed {len(urls)} videos in {wall:.1f}s")
+        for stage in self.stages:
+            print(stage.report())
+        if self.audio_minutes:
+            print(f"Whisper: {self.audio_minutes:.1f} audio minutes "
+                  f"({self.audio_minutes / (wall / 60):.2f} audio min per wall min)")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-index YouTube videos, playlists or channels.")
+    parser.add_argument("urls", nargs="*", help="video, playlist or channel URLs")
+    parser.add_argument("--file", help="text file with one URL per line")
+    parser.add_argument("--gpt-model", default="", help="GPT model for summaries (default: by Whisper model)")
+    parser.add_argument("--download-workers", type=int, default=BATCH_DOWNLOAD_WORKERS)
+    parser.add_argument("--transcribe-workers", type=int, default=BATCH_TRANSCRIBE_WORKERS)
+    parser.add_argument("--summary-workers", type=int, default=BATCH_SUMMARY_WORKERS)
+    parser.add_argument("--embed-workers", type=int, default=BATCH_EMBED_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=BATCH_QUEUE_SIZE)
+    parser.add_argument("--reindex", action="store_true",
+                        help="re-chunk and re-embed cached transcripts (all if no URL is given)")
+    args = parser.parse_args(argv)
+
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    logging.basicConfig(level=logging.INFO)
+    if args.reindex:
+        keys = [generate_cache_key(u) for u in expand_urls(urls)] if urls \
+            else get_cache_manager().keys_with("transcript")
+        BatchIngestion().reindex(keys)
+        return 0
+    if not urls:
+        parser.error("no URLs given")
+
+    videos = expand_urls(urls)
+    logger.info(f"{len(videos)} videos to process")
+
+    BatchIngestion(
+        gpt_model=args.gpt_model,
+        download_workers=args.download_workers,
+        transcribe_workers=args.transcribe_workers,
+        summary_workers=args.summary_workers,
+        embed_workers=args.embed_workers,
+        queue_size=args.queue_size,
+    ).run(videos)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
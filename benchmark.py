@@ -0,0 +1,685 @@
+# final_project/benchmark.py
+"""
+Offline benchmarks on the data already in cache/.
+
+    python -m final_project.benchmark retrieval [--queries 200] [--k 4] [--with-vectors]
+    python -m final_project.benchmark vectorstores [--queries 50] [--k 4]
+    python -m final_project.benchmark backends [--vectors 2000] [--queries 200] [--k 4]
+    python -m final_project.benchmark client [--requests 200] [--threads 16] [--rpm 600]
+    python -m final_project.benchmark pipeline [--minutes 5] [--questions 20] [--baseline bench.json]
+    python -m final_project.benchmark imports [--targets config app ...] [--repeat 3]
+
+retrieval: latency and recall@k of the lexical / vector / hybrid retrievers on
+the saved transcripts. Queries are spans of words taken from random chunks;
+a query counts as recalled when a returned chunk contains the span.
+Vector and hybrid modes open the saved Chroma stores and need the embeddings API.
+
+vectorstores: open latency, query latency and disk use of the per-video Chroma
+directories against the shared collection (filtered by video_key). Queries are
+random unit vectors, so no API calls are made.
+
+backends: Chroma against NumpyVectorStore (float16 and int8) on synthetic
+1536-dim vectors: build time, disk size, RSS after open + queries (each backend
+runs in a fresh process), query latency and recall@k against exact float32 search.
+
+client: the shared OpenAI client layer against a local mock server (no API key
+or network needed). Concurrent chat requests, part of them identical, part of
+the server replies 429; prints the client metrics next to the server's count
+of requests actually received.
+
+pipeline: the whole ingestion + Q&A path on generated audio, in a scratch
+directory, with the chat and embeddings APIs answered by the same mock server.
+Whisper, VAD and the audio stages run for real; the synthetic audio has no
+words, so the stages after Whisper get a generated transcript of the same length.
+Prints the per-stage timings and memory from telemetry.stage_stats();
+--save-baseline / --baseline catch per-stage latency and memory regressions
+(exit code 1). The tiktoken encodings must already be cached (no network needed otherwise).
+
+imports: cold import time of the main modules and of app.py's own imports,
+each in a fresh interpreter with -X importtime, with the packages that cost most.
+"""
+
+import os
+import sys
+import ast
+import json
+import hashlib
+import glob
+import time
+import random
+import threading
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from final_project.segment_store import video_documents
+from final_project.hybrid_retriever import HybridRetriever
+from final_project.cache_utils import get_cache_manager, is_shared_vectorstore
+from final_project.config import SHARED_VECTORSTORE_DIR
+
+_TRANSCRIPTS_GLOB = os.path.join("cache", "transcripts", "*.txt")
+
+
+# ─────────────────────────── Helpers ───────────────────────────
+def _saved_transcripts(limit: int = None) -> list:
+    """Returns [(key, transcript)] for the transcripts in cache/transcripts."""
+    items = []
+    for path in sorted(glob.glob(_TRANSCRIPTS_GLOB))[:limit]:
+        with open(path, "r", encoding="utf-8") as f:
+            items.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    return items
+
+
+def _span_queries(docs: list, n: int, words: int = 8, seed: int = 0) -> list:
+    """Picks n spans of `words` consecutive words from random chunks."""
+    rng = random.Random(seed)
+    queries = []
+    candidates = [d.page_content.split() for d in docs if len(d.page_content.split()) >= words]
+    for _ in range(n if candidates else 0):
+        tokens = rng.choice(candidates)
+        start = rng.randrange(len(tokens) - words + 1)
+        queries.append(" ".join(tokens[start:start + words]))
+    return queries
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _dir_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(path) for f in files
+    )
+
+
+def _print_table(headers: list, rows: list) -> None:
+    widths = [max(len(str(x)) for x in col) for col in zip(headers, *rows)]
+    line = "  ".join(f"{{:<{w}}}" for w in widths)
+    print(line.format(*headers))
+    print(line.format(*("-" * w for w in widths)))
+    for row in rows:
+        print(line.format(*row))
+
+
+# ─────────────────────────── Retrieval ───────────────────────────
+def bench_retrieval(args) -> None:
+    transcripts = _saved_transcripts(args.limit)
+    if not transcripts:
+        print(f"No saved transcripts found ({_TRANSCRIPTS_GLOB})")
+        return
+
+    modes = ["lexical"] + (["vector", "hybrid"] if args.with_vectors else [])
+    results = {m: {"latency": [], "hits": 0, "queries": 0, "build": 0.0} for m in modes}
+
+    for key, transcript in transcripts:
+        docs = video_documents(key, transcript)
+        queries = _span_queries(docs, args.queries, seed=args.seed)
+        vectorstore = None
+        if args.with_vectors:
+            vs_dir = get_cache_manager().get_path(key, "vectorstore")
+            if vs_dir is None:
+                print(f"{key}: no saved vectorstore, skipping vector modes")
+                continue
+            from langchain_community.vectorstores import Chroma
+            from final_project.openai_client import embeddings_model
+            vectorstore = Chroma(persist_directory=vs_dir, embedding_function=embeddings_model())
+
+        for mode in modes:
+            t0 = time.perf_counter()
+            retriever = HybridRetriever.from_documents(docs, vectorstore, mode=mode, k=args.k)
+            results[mode]["build"] += time.perf_counter() - t0
+            for query in queries:
+                t0 = time.perf_counter()
+                found = retriever.invoke(query)
+                results[mode]["latency"].append((time.perf_counter() - t0) * 1000)
+                results[mode]["queries"] += 1
+                results[mode]["hits"] += any(query in d.page_content for d in found)
+
+    rows = []
+    for mode, r in results.items():
+        rows.append([
+            mode,
+            r["queries"],
+            f"{r['hits'] / r['queries']:.3f}" if r["queries"] else "-",
+            f"{statistics.median(r['latency']):.2f}" if r["latency"] else "-",
+            f"{_percentile(r['latency'], 95):.2f}",
+            f"{r['build'] * 1000:.1f}",
+        ])
+    print(f"\nRetrieval on {len(transcripts)} transcripts, k={args.k}")
+    _print_table(["mode", "queries", f"recall@{args.k}", "p50 ms", "p95 ms", "index build ms"], rows)
+
+
+# ─────────────────────────── Vector stores ───────────────────────────
+def _time_queries(store, queries: list, k: int) -> list:
+    latency = []
+    for vector in queries:
+        t0 = time.perf_counter()
+        store.similarity_search_by_vector(vector, k=k)
+        latency.append((time.perf_counter() - t0) * 1000)
+    return latency
+
+
+def bench_vectorstores(args) -> None:
+    from langchain_community.vectorstores import Chroma
+    from final_project.embeddings_database import VideoVectorStore, get_shared_vectorstore
+
+    manager = get_cache_manager()
+    keys = manager.keys_with("vectorstore")[:args.limit]
+    rng = np.random.default_rng(args.seed)
+    results = {}
+
+    def queries(dim: int) -> list:
+        vectors = rng.standard_normal((args.queries, dim)).astype(np.float32)
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+    # Per-video directories: one Chroma client per video
+    per_video = {"open": [], "latency": [], "disk": 0, "videos": 0}
+    for key in keys:
+        vs_dir = manager.get_path(key, "vectorstore")
+        if vs_dir is None or is_shared_vectorstore(vs_dir):
+            continue
+        t0 = time.perf_counter()
+        store = Chroma(persist_directory=vs_dir)
+        per_video["open"].append((time.perf_counter() - t0) * 1000)
+        sample = store._collection.get(limit=1, include=["embeddings"])["embeddings"]
+        if sample is None or len(sample) == 0:
+            continue
+        per_video["latency"] += _time_queries(store, queries(len(sample[0])), args.k)
+        per_video["disk"] += _dir_size(vs_dir)
+        per_video["videos"] += 1
+    if per_video["videos"]:
+        results["per-video"] = per_video
+
+    # Shared collection: one client, every query filtered on video_key
+    shared_keys = [k for k in keys if is_shared_vectorstore(manager.get_path(k, "vectorstore") or "")]
+    if shared_keys:
+        shared = {"open": [], "latency": [], "disk": _dir_size(SHARED_VECTORSTORE_DIR), "videos": 0}
+        t0 = time.perf_counter()
+        store = get_shared_vectorstore()
+        shared["open"].append((time.perf_counter() - t0) * 1000)
+        sample = store._collection.get(limit=1, include=["embeddings"])["embeddings"]
+        if sample is not None and len(sample):
+            vectors = queries(len(sample[0]))
+            for key in shared_keys:
+                shared["latency"] += _time_queries(VideoVectorStore(store, key), vectors, args.k)
+                shared["videos"] += 1
+        results["shared"] = shared
+
+    if not results:
+        print("No saved vector stores found")
+        return
+
+    rows = []
+    for layout, r in results.items():
+        rows.append([
+            layout,
+            r["videos"],
+            f"{statistics.median(r['open']):.1f}" if r["open"] else "-",
+            f"{statistics.median(r['latency']):.2f}" if r["latency"] else "-",
+            f"{_percentile(r['latency'], 95):.2f}",
+            f"{r['disk'] / 2**20:.1f}",
+        ])
+    print(f"\nVector stores, {args.queries} queries per video, k={args.k}")
+    _print_table(["layout", "videos", "open ms", "p50 ms", "p95 ms", "disk MB"], rows)
+
+
+# ─────────────────────────── Vector backends ───────────────────────────
+def _rss_mb() -> float:
+    """Resident set size of this process (Linux), else its peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except ImportError:
+            return 0.0
+
+
+def _open_backend(backend: str, path: str):
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma(persist_directory=path)
+    from final_project.numpy_vectorstore import NumpyVectorStore
+    return NumpyVectorStore(path, None)
+
+
+def _probe_backend(backend: str, path: str, queries: list, k: int) -> dict:
+    """Runs in a fresh process: opens the store, runs the queries, reports memory."""
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    store = _open_backend(backend, path)
+    open_ms = (time.perf_counter() - t0) * 1000
+    latency, found = [], []
+    for vector in queries:
+        t0 = time.perf_counter()
+        docs = store.similarity_search_by_vector(vector, k=k)
+        latency.append((time.perf_counter() - t0) * 1000)
+        found.append([d.metadata["row"] for d in docs])
+    return {"open": open_ms, "latency": latency, "found": found, "rss": _rss_mb() - rss_before}
+
+
+def _build_backend(backend: str, path: str, texts: list, vectors: np.ndarray) -> None:
+    metadatas = [{"row": i} for i in range(len(texts))]
+    if backend == "chroma":
+        collection = _open_backend("chroma", path)._collection
+        for start in range(0, len(texts), 1000):
+            end = start + 1000
+            collection.add(ids=[str(i) for i in range(start, min(end, len(texts)))],
+                           embeddings=vectors[start:end].tolist(),
+                           documents=texts[start:end], metadatas=metadatas[start:end])
+    else:
+        from final_project.numpy_vectorstore import NumpyVectorStore
+        NumpyVectorStore(path, None, dtype=backend.split("-")[1]).add_embeddings(texts, vectors, metadatas)
+
+
+def bench_backends(args) -> None:
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    words = ["video", "audio", "model", "chunk", "query", "answer", "speaker", "topic"]
+    texts = [" ".join(rng.choice(words, size=150)) for _ in range(args.vectors)]
+
+    # Queries near stored vectors; the exact float32 top-k is the reference
+    picks = rng.integers(0, args.vectors, size=args.queries)
+    queries = vectors[picks] + 0.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32) \
+        / np.sqrt(args.dim)
+    exact = [set(np.argsort(-(vectors @ q))[:args.k].tolist()) for q in queries]
+    queries = queries.tolist()
+
+    root = tempfile.mkdtemp(prefix="vector_backends_")
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    try:
+        for backend in ("chroma", "numpy-float16", "numpy-int8"):
+            path = os.path.join(root, backend)
+            t0 = time.perf_counter()
+            _build_backend(backend, path, texts, vectors)
+            build = time.perf_counter() - t0
+            with ctx.Pool(1) as pool:
+                r = pool.apply(_probe_backend, (backend, path, queries, args.k))
+            recall = statistics.mean(len(set(f) & e) / args.k for f, e in zip(r["found"], exact))
+            rows.append([
+                backend,
+                f"{build:.2f}",
+                f"{_dir_size(path) / 2**20:.1f}",
+                f"{r['rss']:.1f}",
+                f"{r['open']:.1f}",
+                f"{statistics.median(r['latency']):.2f}",
+                f"{_percentile(r['latency'], 95):.2f}",
+                f"{recall:.3f}",
+            ])
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\nVector backends, {args.vectors} vectors × {args.dim} dims, {args.queries} queries, k={args.k}")
+    _print_table(["backend", "build s", "disk MB", "RSS MB", "open ms", "p50 ms", "p95 ms",
+                  f"recall@{args.k}"], rows)
+
+
+# ─────────────────────────── OpenAI client layer ───────────────────────────
+def _mock_vector(text, dim: int = 64) -> list:
+    """Deterministic unit vector of a text (or token id list)."""
+    seed = int.from_bytes(hashlib.sha1(str(text).encode("utf-8")).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+def _mock_answer(payload: dict) -> str:
+    """The last words of the prompt, so summaries shrink like real ones."""
+    words = str(payload["messages"][-1].get("content") or "").split()
+    return " ".join(words[-40:]) or "ok"
+
+
+class _MockOpenAI(BaseHTTPRequestHandler):
+    """/chat/completions and /embeddings; every server.fail_every-th request gets a 429."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.received += 1
+            n = server.received
+        time.sleep(server.latency)
+
+        if server.fail_every and n % server.fail_every == 0:
+            error = {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}
+            return self._reply(429, {"error": error}, {"retry-after-ms": "50"})
+        if self.path.endswith("/embeddings"):
+            inputs = payload["input"]
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            data = [{"object": "embedding", "index": i, "embedding": _mock_vector(text)}
+                    for i, text in enumerate(inputs)]
+            return self._reply(200, {"object": "list", "data": data, "model": payload["model"],
+                                     "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}})
+        self._reply(200, {
+            "id": f"mock-{n}", "object": "chat.completion", "created": int(time.time()), "model": payload["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": _mock_answer(payload)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 20, "completion_tokens": 1, "total_tokens": 21},
+        })
+
+    def _reply(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _start_mock(latency_ms: float, fail_every: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockOpenAI)
+    server.lock, server.received = threading.Lock(), 0
+    server.latency, server.fail_every = latency_ms / 1000, fail_every
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_client(args) -> None:
+    from final_project.openai_client import get_openai_client, get_metrics, reset_metrics, set_rate_limit
+
+    server = _start_mock(args.latency_ms, args.fail_every)
+
+    model = "mock-model"
+    set_rate_limit(model, args.rpm, args.tpm)
+    reset_metrics()
+    client = get_openai_client(base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="mock")
+
+    rng = random.Random(args.seed)
+    distinct = max(1, int(args.requests * (1 - args.duplicates)))
+    prompts = [f"question {rng.randrange(distinct)}" for _ in range(args.requests)]
+
+    def ask(prompt: str) -> float:
+        t0 = time.perf_counter()
+        client.chat.completions.create(model=model, messages=[{"role": "user", "content": prompt}])
+        return (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        latency = list(pool.map(ask, prompts))
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+
+    m = get_metrics()
+    print(f"\n{args.requests} chat requests from {args.threads} threads in {elapsed:.2f}s "
+          f"({args.rpm} rpm, {args.duplicates:.0%} duplicates, 429 every {args.fail_every or '-'} requests)")
+    _print_table(
+        ["server received", "api calls", "coalesced", "retries", "429s", "errors", "throttled s", "backoff s",
+         "p50 ms", "p95 ms"],
+        [[server.received, m["requests"], m["coalesced"], m["retries"], m["rate_limited"], m["errors"],
+          f"{m['throttle_sec']:.2f}", f"{m['backoff_sec']:.2f}",
+          f"{statistics.median(latency):.1f}", f"{_percentile(latency, 95):.1f}"]],
+    )
+
+
+# ─────────────────────────── Full pipeline ───────────────────────────
+_WORDS = ["video", "audio", "model", "speaker", "topic", "question", "answer", "example",
+          "result", "method", "data", "time", "people", "system", "problem", "idea"]
+
+
+def _generate_audio(path: str, minutes: float, seed: int = 0) -> None:
+    """16 kHz mono WAV of voiced, syllable-rate modulated bursts separated by pauses."""
+    import wave
+    rate = 16000
+    rng = np.random.default_rng(seed)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        remaining = int(minutes * 60 * rate)
+        while remaining > 0:
+            n = min(remaining, int(rng.uniform(2, 8) * rate))
+            t = np.arange(n) / rate
+            pitch = rng.uniform(100, 250)
+            voice = sum(np.sin(2 * np.pi * pitch * h * t) / h for h in range(1, 6))
+            envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+            pause = np.zeros(min(remaining - n, int(rng.uniform(0.3, 2) * rate)))
+            samples = np.concatenate([0.2 * voice * envelope, pause])
+            w.writeframes((samples * 32767).astype(np.int16).tobytes())
+            remaining -= len(samples)
+
+
+def _generated_segments(duration_sec: float, seed: int = 0) -> list:
+    """About 150 words per minute, in segments of 5 seconds."""
+    rng = random.Random(seed)
+    return [
+        (start, min(duration_sec, start + 5.0), " ".join(rng.choice(_WORDS) for _ in range(12)) + ".")
+        for start in np.arange(0.0, duration_sec, 5.0).tolist()
+    ]
+
+
+def _run_pipeline(wav: str, args) -> None:
+    from final_project.audio_utils import get_audio_duration
+    from final_project.transcribe_audio import transcribe_audio
+    from final_project.text_processing import split_text, chunk_segments
+    from final_project.summarization import generate_summary
+    from final_project.embeddings_database import create_vectorstore, vectorstore_location
+    from final_project.agent import build_agent, answer_question
+
+    key = "benchmark"
+    duration_sec = get_audio_duration(wav) * 60
+    if not args.skip_whisper:
+        transcribe_audio(wav)
+    segments = _generated_segments(duration_sec, args.seed)
+    transcript = " ".join(text for _, _, text in segments)
+
+    generate_summary(transcript, model_name=args.model)
+    split_text(transcript)
+    docs = chunk_segments(segments)
+    store = create_vectorstore(docs, vectorstore_location(key), key)
+    qa_bot = build_agent(store, model_name=args.model, cache_key=key, docs=docs)
+    for question in _span_queries(docs, args.questions, seed=args.seed):
+        answer_question(qa_bot, question, key)
+
+
+def _compare(stats: dict, baseline: dict, tolerance: float) -> list:
+    """Stages whose total time or memory grew by more than tolerance over the baseline."""
+    regressions = []
+    for stage, base in baseline.items():
+        now = stats.get(stage)
+        if now is None:
+            continue
+        for metric, floor in (("total_sec", 0.05), ("max_rss_mb", 16)):
+            # Small absolute values are noise: only changes above floor count
+            if now[metric] > base[metric] * (1 + tolerance) and now[metric] - base[metric] > floor:
+                regressions.append(f"{stage}: {metric} {base[metric]:.2f} → {now[metric]:.2f}")
+    return regressions
+
+
+def bench_pipeline(args) -> int:
+    from final_project import telemetry
+
+    root = tempfile.mkdtemp(prefix="pipeline_bench_")
+    cwd = os.getcwd()
+    server = _start_mock(args.llm_latency_ms, 0)
+    saved_env = {k: os.environ.get(k) for k in ("OPENAI_BASE_URL", "OPENAI_API_KEY")}
+    os.environ.update(OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_port}/v1", OPENAI_API_KEY="mock")
+    try:
+        # Every cache, store and log of the run lives in the scratch directory
+        if os.path.isdir(os.path.join(cwd, "models")):
+            os.symlink(os.path.join(cwd, "models"), os.path.join(root, "models"))
+        os.chdir(root)
+        wav = os.path.join(root, "generated.wav")
+        t0 = time.perf_counter()
+        _generate_audio(wav, args.minutes, args.seed)
+        print(f"Generated {args.minutes} min of audio in {time.perf_counter() - t0:.1f}s")
+
+        telemetry.reset_stats()
+        t0 = time.perf_counter()
+        _run_pipeline(wav, args)
+        elapsed = time.perf_counter() - t0
+        stats = telemetry.stage_stats()
+    finally:
+        telemetry.flush()               # the run's events go to the scratch directory
+        os.chdir(cwd)
+        server.shutdown()
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\nPipeline on {args.minutes} min of generated audio: {elapsed:.1f}s, "
+          f"{server.received} mock API requests")
+    _print_table(
+        ["stage", "runs", "total s", "p50 ms", "p95 ms", "CPU s", "max RSS MB", "errors"],
+        [[stage, s["count"], f"{s['total_sec']:.2f}", f"{s['p50_sec'] * 1000:.1f}", f"{s['p95_sec'] * 1000:.1f}",
+          f"{s['cpu_sec']:.2f}", f"{s['max_rss_mb']:.0f}", s["errors"]]
+         for stage, s in sorted(stats.items(), key=lambda item: -item[1]["total_sec"])],
+    )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        print(f"\nSaved baseline {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = _compare(stats, json.load(f), args.tolerance)
+        print(f"\n{len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        for line in regressions:
+            print(f"  {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+# ─────────────────────────── Import time ───────────────────────────
+_IMPORT_TARGETS = ["config", "telemetry", "cache_utils", "openai_client", "agent", "ingestion", "jobs", "app"]
+
+
+def _package_dir() -> str:
+    return os.path.abspath(sys.modules["final_project"].__path__[0])
+
+
+def _app_imports() -> str:
+    """The module-level import statements of app.py (the script itself needs streamlit run)."""
+    with open(os.path.join(_package_dir(), "app.py"), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def _import_profile(code: str) -> dict:
+    """
+    Runs code in a fresh interpreter with -X importtime.
+    Returns the wall time of the imports (ms) and the self time (ms) of every module loaded.
+    """
+    timed_code = f"import time\n_t0 = time.perf_counter()\n{code}\nprint(time.perf_counter() - _t0)"
+    path = os.pathsep.join(filter(None, [os.path.dirname(_package_dir()), os.environ.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", timed_code],
+                            capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=path))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        fields = line.partition("import time:")[2].split("|")
+        if len(fields) == 3 and fields[0].strip().isdigit():     # skips the header
+            modules[fields[2].strip()] = int(fields[0]) / 1000
+    return {"wall_ms": float(result.stdout.split()[-1]) * 1000, "modules": modules}
+
+
+def bench_imports(args) -> None:
+    # Modules the interpreter loads at startup are not counted
+    startup = set(_import_profile("pass")["modules"])
+    rows = []
+    for target in args.targets:
+        code = _app_imports() if target == "app" else f"import final_project.{target}"
+        try:
+            runs = [_import_profile(code) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            rows.append([target, "-", "-", f"failed: {e}"])
+            continue
+        best = min(runs, key=lambda r: r["wall_ms"])
+        loaded = {m: ms for m, ms in best["modules"].items() if m not in startup}
+        packages = {}
+        for module, ms in loaded.items():
+            packages[module.split(".")[0]] = packages.get(module.split(".")[0], 0.0) + ms
+        top = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        rows.append([target, f"{statistics.median(r['wall_ms'] for r in runs):.0f}", len(loaded),
+                     ", ".join(f"{p} {ms:.0f}" for p, ms in top)])
+
+    print(f"\nImport time in a fresh interpreter (median of {args.repeat}), heaviest packages by self time (ms)")
+    _print_table(["target", "wall ms", "modules", "heaviest packages"], rows)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("retrieval", help="latency and recall of the retrievers on saved transcripts")
+    p.add_argument("--queries", type=int, default=200, help="queries per transcript")
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--limit", type=int, default=None, help="max transcripts")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--with-vectors", action="store_true", help="also run vector and hybrid modes (API calls)")
+    p.set_defaults(func=bench_retrieval)
+
+    p = sub.add_parser("vectorstores", help="per-video Chroma directories vs the shared collection")
+    p.add_argument("--queries", type=int, default=50, help="queries per video")
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--limit", type=int, default=None, help="max videos")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_vectorstores)
+
+    p = sub.add_parser("backends", help="Chroma vs NumpyVectorStore (float16 / int8) on synthetic vectors")
+    p.add_argument("--vectors", type=int, default=2000, help="vectors in the store (a long video)")
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser("client", help="the OpenAI client layer against a local mock server")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--duplicates", type=float, default=0.3, help="share of requests repeating another prompt")
+    p.add_argument("--rpm", type=float, default=600, help="requests per minute allowed by the client")
+    p.add_argument("--tpm", type=float, default=1_000_000, help="tokens per minute allowed by the client")
+    p.add_argument("--fail-every", type=int, default=20, help="the mock answers every n-th request with a 429")
+    p.add_argument("--latency-ms", type=float, default=50)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_client)
+
+    p = sub.add_parser("pipeline", help="the full pipeline on generated audio with mock chat / embeddings APIs")
+    p.add_argument("--minutes", type=float, default=5, help="length of the generated audio")
+    p.add_argument("--questions", type=int, default=20)
+    p.add_argument("--model", default="gpt-3.5-turbo", help="GPT model name sent to the mock")
+    p.add_argument("--llm-latency-ms", type=float, default=20, help="mock API latency per request")
+    p.add_argument("--skip-whisper", action="store_true", help="leave out transcription (no Whisper model needed)")
+    p.add_argument("--save-baseline", help="write the per-stage results to this JSON file")
+    p.add_argument("--baseline", help="compare with a saved baseline; exit code 1 on regressions")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth per stage")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("imports", help="cold import time of the modules (python -X importtime)")
+    p.add_argument("--targets", nargs="*", default=_IMPORT_TARGETS, help="module names, or app")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--top", type=int, default=5, help="heaviest packages listed per target")
+    p.set_defaults(func=bench_imports)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
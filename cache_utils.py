@@ -1,59 +1,520 @@
 # final_project/cache_utils.py
 """
 Cache for each video's data:
+- The audio file (optional)
 - Stores the transcript
 - The summary
-- The Chroma vectorstore path (vectorstore_dir)
+- The Chroma vectorstore directory
+
+Every artifact is tracked in a single SQLite index (cache/index.sqlite)
+with its size and last-access time, including the caches shared by all
+videos (chunk embeddings, partial summaries; key SHARED_KEY).
+Audio chunks are scratch files: they are deleted after transcription,
+and the budget counts them while they exist. Text artifacts are written atomically
+(temp file + rename), and once the cache grows past CACHE_DISK_BUDGET_MB
+the least recently used artifacts are deleted, large WAVs first and
+small transcripts last (see CACHE_EVICTION_ORDER).
 
 ❱ The actual vectorstore is saved to disk inside create_vectorstore,
-  so we don't store the object inside Pickle.
+  so only its directory is registered here.
 """
 
 import os
+import re
+import time
+import shutil
 import hashlib
 import pickle
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
 from typing import Tuple, Optional
+from urllib.parse import urlparse, parse_qs
+
+from filelock import FileLock, Timeout
+
+from final_project.config import (
+    CACHE_DISK_BUDGET_MB,
+    CACHE_EVICTION_ORDER,
+    SHARED_VECTORSTORE_DIR,
+    EMBEDDING_CACHE_DIR,
+    SUMMARY_PARTIALS_DIR,
+)
 
-# Single directory for all small cache files (.pkl)
+_CACHE_ROOT = "cache"
+_DB_PATH = os.path.join(_CACHE_ROOT, "index.sqlite")
+_LOCK_DIR = os.path.join(_CACHE_ROOT, "locks")
+
+# Legacy one-pickle-per-video directory, migrated on first access
 _META_DIR = "cache/meta"
-os.makedirs(_META_DIR, exist_ok=True)
+
+# Where each kind of artifact lives
+_ARTIFACT_PATHS = {
+    "audio": "cache/audio/{key}.wav",
+    "transcript": "cache/transcripts/{key}.txt",
+    "segments": "cache/segments/{key}",
+    "summary": "cache/summaries/{key}.txt",
+    "vectorstore": "cache/vectorstore/{key}",
+    # Shared by all videos, registered under SHARED_KEY
+    "embeddings": EMBEDDING_CACHE_DIR,
+    "summary_partials": SUMMARY_PARTIALS_DIR,
+}
+
+# Key of the artifacts that belong to no single video (never a valid cache key)
+SHARED_KEY = "_shared"
+
+# Scratch audio parts of long files (see transcribe_audio)
+AUDIO_CHUNKS_DIR = os.path.join(_CACHE_ROOT, "audio", "chunks")
+
+os.makedirs(_LOCK_DIR, exist_ok=True)
 
 
 # ─────────────────────────── General Functions ───────────────────────────
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com", "youtu.be")
+# Path forms that carry the ID as the second segment, e.g. /shorts/<id>
+_ID_PATH_PREFIXES = ("embed", "v", "e", "shorts", "live", "watch")
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """
+    Extracts the 11-character video ID from any common YouTube URL form, offline:
+    watch?v=, youtu.be/, m./music./www. hosts, embed/, shorts/, live/, v/,
+    youtube-nocookie.com, attribution links, extra parameters (t, list, index, si…)
+    and a bare ID. Returns None if no ID can be found.
+    """
+    url = url.strip()
+    if _VIDEO_ID_RE.match(url):
+        return url
+    if "://" not in url:
+        url = "https://" + url
+
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    if not any(host == h or host.endswith("." + h) for h in _YOUTUBE_HOSTS):
+        return None
+
+    query = parse_qs(parsed.query)
+    parts = [p for p in parsed.path.split("/") if p]
+
+    if host == "youtu.be" or host.endswith(".youtu.be"):
+        candidate = parts[0] if parts else None
+    elif query.get("v"):
+        candidate = query["v"][0]
+    elif len(parts) >= 2 and parts[0] in _ID_PATH_PREFIXES:
+        candidate = parts[1]
+    elif parts and parts[0] == "attribution_link" and query.get("u"):
+        return extract_video_id("https://www.youtube.com" + query["u"][0])
+    else:
+        candidate = None
+
+    return candidate if candidate and _VIDEO_ID_RE.match(candidate) else None
+
+
 def generate_cache_key(url: str) -> str:
     """
     Converts a YouTube URL into a consistent 16-character MD5 key.
+    The key is derived from the canonical video ID, so every URL form of the
+    same video shares one cache entry. Non-YouTube URLs fall back to the URL itself.
+    (The ID is hashed rather than used directly because IDs are case-sensitive
+    and the cache may live on a case-insensitive filesystem.)
     Example:  8ffdefbdec95 = generate_cache_key("https://youtu.be/...")
     """
+    video_id = extract_video_id(url)
+    source = f"youtube:{video_id}" if video_id else url.strip()
+    return hashlib.md5(source.encode("utf-8")).hexdigest()[:16]
+
+
+def legacy_cache_key(url: str) -> str:
+    """Key used before canonical IDs: the MD5 of the raw URL string."""
     return hashlib.md5(url.encode("utf-8")).hexdigest()[:16]
 
 
-def _meta_path(key: str) -> str:
-    """Returns the full path to the Pickle file for the given key."""
-    return os.path.join(_META_DIR, f"{key}.pkl")
+def artifact_path(key: str, kind: str) -> str:
+    """Returns the path of an artifact ("audio", "transcript", "summary", "vectorstore", ...)."""
+    return _ARTIFACT_PATHS[kind].format(key=key)
+
+
+# Callbacks set by embeddings_database to delete / re-key one video's rows
+# in the shared collection (whose directory must never be removed as a whole)
+_shared_store_hooks = {}
+
+
+def register_shared_store_hooks(remove, rename) -> None:
+    _shared_store_hooks.update(remove=remove, rename=rename)
+
+
+def is_shared_vectorstore(path: str) -> bool:
+    return os.path.normpath(path) == os.path.normpath(SHARED_VECTORSTORE_DIR)
+
+
+def _path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(path) for f in files
+        )
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _remove_embeddings(root: str) -> None:
+    """
+    Empties each model folder of the embedding cache under its write lock
+    (see embedding_cache.EmbeddingStore), skipping folders being written.
+    """
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        folder = os.path.join(root, name)
+        try:
+            with FileLock(os.path.join(folder, "write.lock"), timeout=0):
+                for data in ("vectors.f32", "keys.txt", "meta.json"):
+                    _remove_path(os.path.join(folder, data))
+        except Timeout:
+            continue
+
+
+def _remove_path(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
 
 
-def save_cache(key: str, transcript: str, summary: str, vectorstore_dir: str) -> None:
+def atomic_write_text(path: str, text: str) -> None:
+    """Writes text to a temp file in the same folder, then renames it into place."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ─────────────────────────── Cache Manager ───────────────────────────
+class CacheManager:
     """
-    Writes a Pickle file containing only paths and text data.
+    SQLite-indexed store of every cached artifact, with LRU eviction under a disk budget.
+    A short-lived connection is opened per operation, so the manager can be shared
+    by all Streamlit sessions (threads) and by other processes using the same cache.
     """
-    payload = {
-        "transcript": transcript,
-        "summary": summary,
-        "vectorstore_dir": vectorstore_dir,
-    }
-    with open(_meta_path(key), "wb") as fp:
-        pickle.dump(payload, fp)
 
+    def __init__(self, db_path: str = _DB_PATH, budget_mb: float = CACHE_DISK_BUDGET_MB):
+        self.db_path = db_path
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._evict_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS artifacts (
+                       key TEXT NOT NULL,
+                       kind TEXT NOT NULL,
+                       path TEXT NOT NULL,
+                       size INTEGER NOT NULL,
+                       created REAL NOT NULL,
+                       last_access REAL NOT NULL,
+                       PRIMARY KEY (key, kind)
+                   )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS meta (
+                       key TEXT NOT NULL,
+                       name TEXT NOT NULL,
+                       value TEXT NOT NULL,
+                       PRIMARY KEY (key, name)
+                   )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                       key TEXT PRIMARY KEY,
+                       stage TEXT NOT NULL,
+                       progress REAL NOT NULL,
+                       position REAL NOT NULL,
+                       updated REAL NOT NULL
+                   )"""
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def lock(key: str) -> FileLock:
+        """Inter-process lock for one key; hold it while writing that key's artifacts."""
+        return FileLock(os.path.join(_LOCK_DIR, f"{key}.lock"))
+
+    def register(self, key: str, kind: str, path: str = None, size: int = None) -> None:
+        """
+        Records (or refreshes) an artifact that already exists on disk.
+        For rows in the shared vector collection, pass their estimated size.
+        """
+        path = path or artifact_path(key, kind)
+        if size is None:
+            size = 0 if is_shared_vectorstore(path) else _path_size(path)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO artifacts (key, kind, path, size, created, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (key, kind) DO UPDATE SET
+                       path = excluded.path, size = excluded.size, last_access = excluded.last_access""",
+                (key, kind, path, size, now, now),
+            )
+
+    def write_text(self, key: str, kind: str, text: str) -> str:
+        """Atomically writes a text artifact and registers it."""
+        path = artifact_path(key, kind)
+        atomic_write_text(path, text)
+        self.register(key, kind, path)
+        return path
+
+    def read_text(self, key: str, kind: str) -> Optional[str]:
+        path = self.get_path(key, kind)
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def get_path(self, key: str, kind: str) -> Optional[str]:
+        """Returns the artifact path if it is registered and still on disk (and marks it used)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT path FROM artifacts WHERE key = ? AND kind = ?", (key, kind)
+            ).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                conn.execute("DELETE FROM artifacts WHERE key = ? AND kind = ?", (key, kind))
+                return None
+            conn.execute(
+                "UPDATE artifacts SET last_access = ? WHERE key = ? AND kind = ?",
+                (time.time(), key, kind),
+            )
+        return row[0]
+
+    def kinds(self, key: str) -> set:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT kind FROM artifacts WHERE key = ?", (key,)).fetchall()
+        return {r[0] for r in rows}
+
+    def set_meta(self, key: str, name: str, value: str) -> None:
+        """Stores a small fact about a cached video, e.g. where its transcript came from."""
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO meta (key, name, value) VALUES (?, ?, ?)
+                   ON CONFLICT (key, name) DO UPDATE SET value = excluded.value""",
+                (key, name, value),
+            )
+
+    def get_meta(self, key: str, name: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ? AND name = ?", (key, name)).fetchone()
+        return row[0] if row else None
+
+    def keys_with(self, kind: str) -> list:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key FROM artifacts WHERE kind = ?", (kind,)).fetchall()
+        return [r[0] for r in rows]
+
+    def total_size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def remove(self, key: str, kind: str = None) -> None:
+        """Deletes one artifact (or all artifacts) of a key from disk and from the index."""
+        with self._connect() as conn:
+            if kind is None:
+                rows = conn.execute("SELECT kind, path FROM artifacts WHERE key = ?", (key,)).fetchall()
+                conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+                conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+            else:
+                rows = conn.execute(
+                    "SELECT kind, path FROM artifacts WHERE key = ? AND kind = ?", (key, kind)
+                ).fetchall()
+                conn.execute("DELETE FROM artifacts WHERE key = ? AND kind = ?", (key, kind))
+        for kind, path in rows:
+            if is_shared_vectorstore(path):
+                if "remove" in _shared_store_hooks:
+                    _shared_store_hooks["remove"](key)
+            elif kind == "embeddings":
+                _remove_embeddings(path)
+            else:
+                _remove_path(path)
+
+    def evict(self, protect: set = ()) -> int:
+        """
+        Deletes artifacts until the cache fits in the budget.
+        Kinds with a lower CACHE_EVICTION_ORDER go first, then least recently used.
+        Keys in `protect` or currently locked by a writer are skipped.
+        Returns the number of bytes freed.
+        """
+        with self._evict_lock:
+            excess = self.total_size() + _path_size(AUDIO_CHUNKS_DIR) - self.budget_bytes
+            if excess <= 0:
+                return 0
+
+            with self._connect() as conn:
+                rows = conn.execute("SELECT key, kind, size, last_access FROM artifacts").fetchall()
+            rows.sort(key=lambda r: (CACHE_EVICTION_ORDER.get(r[1], 0), r[3]))
+
+            freed = 0
+            for key, kind, size, _ in rows:
+                if freed >= excess:
+                    break
+                if key in protect:
+                    continue
+                lock = self.lock(key)
+                try:
+                    lock.acquire(timeout=0)
+                except Timeout:
+                    continue
+                try:
+                    self.remove(key, kind)
+                finally:
+                    lock.release()
+                freed += size
+            return freed
+
+    def set_job_status(self, key: str, stage: str, progress: float = 0.0, position: float = 0.0) -> None:
+        """Records the ingestion stage of a key, its progress (0-1) and the audio position reached (s)."""
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO jobs (key, stage, progress, position, updated) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                       stage = excluded.stage, progress = excluded.progress,
+                       position = excluded.position, updated = excluded.updated""",
+                (key, stage, progress, position, time.time()),
+            )
 
-def load_cache(key: str) -> Optional[Tuple[str, str, str]]:
+    def get_job_status(self, key: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT stage, progress, position, updated FROM jobs WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("stage", "progress", "position", "updated"), row))
+
+    def rename_key(self, old_key: str, new_key: str) -> bool:
+        """
+        Moves every artifact of old_key to the paths of new_key.
+        Returns False if old_key has nothing cached or new_key already exists.
+        """
+        if old_key == new_key or self.kinds(new_key):
+            return False
+        with self.lock(old_key), self.lock(new_key):
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT kind, path FROM artifacts WHERE key = ?", (old_key,)
+                ).fetchall()
+            if not rows:
+                return False
+            for kind, path in rows:
+                if is_shared_vectorstore(path):
+                    new_path = path
+                    if "rename" in _shared_store_hooks:
+                        _shared_store_hooks["rename"](old_key, new_key)
+                else:
+                    new_path = artifact_path(new_key, kind) if kind in _ARTIFACT_PATHS else path
+                    if os.path.exists(path) and path != new_path:
+                        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                        os.replace(path, new_path)
+                with self._connect() as conn:
+                    size = conn.execute(
+                        "SELECT size FROM artifacts WHERE key = ? AND kind = ?", (old_key, kind)
+                    ).fetchone()[0]
+                    conn.execute("DELETE FROM artifacts WHERE key = ? AND kind = ?", (old_key, kind))
+                self.register(new_key, kind, new_path, size=size if is_shared_vectorstore(path) else None)
+            with self._connect() as conn:
+                conn.execute("UPDATE meta SET key = ? WHERE key = ?", (new_key, old_key))
+        return True
+
+    def migrate_legacy_meta(self, key: str) -> bool:
+        """Imports an old cache/meta/<key>.pkl into the index. Returns True if one was found."""
+        legacy = os.path.join(_META_DIR, f"{key}.pkl")
+        if not os.path.exists(legacy):
+            return False
+        with open(legacy, "rb") as fp:
+            data = pickle.load(fp)
+        with self.lock(key):
+            self.write_text(key, "transcript", data["transcript"])
+            self.write_text(key, "summary", data["summary"])
+            if os.path.exists(data["vectorstore_dir"]):
+                self.register(key, "vectorstore", data["vectorstore_dir"])
+            if os.path.exists(artifact_path(key, "audio")):
+                self.register(key, "audio")
+        os.remove(legacy)
+        return True
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_cache_manager() -> CacheManager:
+    """Returns the process-wide CacheManager (created on first use)."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            os.makedirs(_CACHE_ROOT, exist_ok=True)
+            _manager = CacheManager()
+        return _manager
+
+
+def save_cache(key: str, transcript: str, summary: str, vectorstore_dir: str,
+               vectorstore_size: int = None, protect: set = ()) -> None:
     """
-    If the cache file exists, returns (transcript, summary, vectorstore_dir),
-    otherwise returns None.
+    Atomically writes the transcript and summary, registers the vectorstore
+    (and the audio file if it was kept), then enforces the disk budget.
+    vectorstore_size is only needed for the shared collection; the keys in
+    protect (e.g. videos still being processed) are not evicted.
     """
-    path = _meta_path(key)
-    if not os.path.exists(path):
+    manager = get_cache_manager()
+    with manager.lock(key):
+        manager.write_text(key, "transcript", transcript)
+        manager.write_text(key, "summary", summary)
+        manager.register(key, "vectorstore", vectorstore_dir, size=vectorstore_size)
+        if os.path.exists(artifact_path(key, "audio")):
+            manager.register(key, "audio")
+    manager.evict(protect={key, *protect})
+
+
+def migrate_cache_key(url: str, key: str) -> bool:
+    """
+    Moves an entry cached under the old raw-URL key of `url` to `key`
+    (including old cache/meta pickles). Returns True if something was migrated.
+    """
+    manager = get_cache_manager()
+    old_key = legacy_cache_key(url)
+    if old_key == key:
+        return False
+    manager.migrate_legacy_meta(old_key)
+    return manager.rename_key(old_key, key)
+
+
+def load_cache(key: str, url: str = None) -> Optional[Tuple[str, str, str]]:
+    """
+    If the transcript, summary and vectorstore are all cached, returns
+    (transcript, summary, vectorstore_dir), otherwise returns None.
+    When the URL is given, an entry cached under its old raw-URL key is migrated first.
+    """
+    manager = get_cache_manager()
+    if not manager.kinds(key):
+        manager.migrate_legacy_meta(key)
+        if url is not None:
+            migrate_cache_key(url, key)
+
+    transcript = manager.read_text(key, "transcript")
+    summary = manager.read_text(key, "summary")
+    vectorstore_dir = manager.get_path(key, "vectorstore")
+    if transcript is None or summary is None or vectorstore_dir is None:
         return None
-    with open(path, "rb") as fp:
-        data = pickle.load(fp)
-    return data["transcript"], data["summary"], data["vectorstore_dir"]
+    return transcript, summary, vectorstore_dir
@@ -0,0 +1,161 @@
+# final_project/captions.py
+"""
+Caption fast path: when the uploader supplied captions, use them as the
+transcript (with timestamps) and skip the audio download and Whisper.
+
+- find_caption_track picks a track from the `subtitles` (manual) and
+  `automatic_captions` entries of the yt-dlp info dict
+- parse_vtt / parse_srv turn WebVTT and YouTube srv1/srv2/srv3 (XML) into
+  (start, end, text) segments
+- fetch_captions returns (segments, source) or None, where source reads
+  like "captions:manual:en" and is recorded in the cache
+"""
+
+import re
+import html
+import logging
+import xml.etree.ElementTree as ET
+
+import yt_dlp
+
+from final_project.config import (
+    CAPTIONS_ENABLED,
+    CAPTION_LANGUAGES,
+    CAPTION_AUTO_POLICY,
+)
+from final_project.telemetry import timed
+
+logger = logging.getLogger(__name__)
+
+# Preferred formats, best first
+_FORMATS = ["vtt", "srv3", "srv2", "srv1"]
+
+_TIMING_RE = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})\s+-->\s+(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+# ─────────────────────────── Parsing ───────────────────────────
+def _seconds(h, m, s, ms) -> float:
+    return int(h or 0) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
+
+
+def parse_vtt(text: str, rolling: bool = False) -> list:
+    """
+    WebVTT → [(start, end, text)]. Inline tags are dropped. With rolling=True
+    (YouTube's automatic captions, where each cue repeats the previous line)
+    lines already shown by the previous cue are kept once; manual tracks keep
+    every line, including the ones a speaker really repeats.
+    """
+    segments, previous = [], []
+    # Cues are separated by empty lines; the whitespace-only lines inside YouTube's
+    # automatic cues are cue text, not separators
+    for block in re.split(r"(?:\r?\n){2,}", text):
+        lines = block.strip().splitlines()
+        for i, line in enumerate(lines):
+            match = _TIMING_RE.search(line)
+            if not match:
+                continue
+            g = match.groups()
+            start, end = _seconds(*g[:4]), _seconds(*g[4:])
+            cue = [html.unescape(_TAG_RE.sub("", l)).strip() for l in lines[i + 1:]]
+            cue = [l for l in cue if l]
+            new = [l for l in cue if l not in previous] if rolling else cue
+            previous = cue
+            if new:
+                segments.append((start, end, " ".join(new)))
+            break
+    return segments
+
+
+def parse_srv(text: str) -> list:
+    """YouTube timed-text XML (srv1: <text start dur>, srv2/srv3: <text|p t d> in ms) → [(start, end, text)]."""
+    segments = []
+    for el in ET.fromstring(text).iter():
+        if el.tag not in ("text", "p"):
+            continue
+        if "start" in el.attrib:
+            start = float(el.attrib["start"])
+            end = start + float(el.attrib.get("dur", 0))
+        elif "t" in el.attrib:
+            start = int(el.attrib["t"]) / 1000
+            end = start + int(el.attrib.get("d", 0)) / 1000
+        else:
+            continue
+        content = " ".join(html.unescape("".join(el.itertext())).split())
+        if content:
+            segments.append((start, end, content))
+    return segments
+
+
+def parse_captions(text: str, ext: str, kind: str = "manual") -> list:
+    return parse_vtt(text, rolling=kind == "auto") if ext == "vtt" else parse_srv(text)
+
+
+# ─────────────────────────── Track choice ───────────────────────────
+def _matching_lang(tracks: dict, languages: list) -> str:
+    """First track language equal to, or a regional variant of, a wanted language."""
+    for wanted in languages:
+        for lang in tracks:
+            if lang == wanted or lang.split("-")[0] == wanted:
+                return lang
+    return None
+
+
+def find_caption_track(info: dict, languages: list = CAPTION_LANGUAGES,
+                       auto_policy: str = CAPTION_AUTO_POLICY) -> tuple:
+    """
+    Returns (kind, lang, format dict) of the caption track to use, or None.
+    languages=[] means the video's own language. Automatic captions are used
+    only if auto_policy is "fallback" and no manual track matches; translated
+    automatic tracks are never used.
+    """
+    wanted = list(languages) or ([info["language"]] if info.get("language") else [])
+    manual = {k: v for k, v in (info.get("subtitles") or {}).items() if k != "live_chat"}
+    auto = info.get("automatic_captions") or {}
+
+    candidates = [("manual", manual)]
+    if auto_policy == "fallback":
+        # Only the original-language track: "<lang>-orig", else the video's language
+        originals = {k[:-len("-orig")]: v for k, v in auto.items() if k.endswith("-orig")}
+        if not originals and info.get("language") in auto:
+            originals = {info["language"]: auto[info["language"]]}
+        candidates.append(("auto", originals))
+
+    for kind, tracks in candidates:
+        if not wanted and len(tracks) == 1:
+            lang = next(iter(tracks))
+        else:
+            lang = _matching_lang(tracks, wanted)
+        if lang is None:
+            continue
+        by_ext = {f.get("ext"): f for f in tracks[lang] if f.get("url")}
+        for ext in _FORMATS:
+            if ext in by_ext:
+                return kind, lang, by_ext[ext]
+    return None
+
+
+@timed("captions")
+def fetch_captions(url: str, info: dict = None) -> tuple:
+    """
+    Downloads and parses the caption track chosen by find_caption_track.
+    Returns (segments, source) or None when captions are disabled, missing or unusable.
+    """
+    if not CAPTIONS_ENABLED:
+        return None
+    with yt_dlp.YoutubeDL({"quiet": True, "skip_download": True}) as ydl:
+        info = info or ydl.extract_info(url, download=False)
+        track = find_caption_track(info)
+        if track is None:
+            return None
+        kind, lang, fmt = track
+        try:
+            text = ydl.urlopen(fmt["url"]).read().decode("utf-8")
+            segments = parse_captions(text, fmt["ext"], kind)
+        except Exception as e:
+            logger.warning(f"Could not use the {kind} {lang} captions of {url}: {e}")
+            return None
+    if not segments:
+        return None
+    logger.info(f"Using {kind} {lang} captions ({fmt['ext']}, {len(segments)} segments) for {url}")
+    return segments, f"captions:{kind}:{lang}"
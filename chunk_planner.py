@@ -0,0 +1,179 @@
+# final_project/chunk_planner.py
+"""
+Silence-aware chunking of long audio for transcribe_audio.
+
+1. detect_speech: the Silero VAD bundled with faster-whisper runs once over
+   the whole 16 kHz WAV (window by window, so memory stays flat)
+2. plan_chunks: groups consecutive speech spans into chunks holding about the
+   same amount of speech; cuts always fall between spans, i.e. in a silence
+3. write_chunks: writes each chunk with its speech spans only, so long
+   silences are neither stored nor decoded
+
+Each AudioChunk maps its own time axis back to the source file (to_source_time).
+"""
+
+import os
+import glob
+import math
+import wave
+import logging
+from bisect import bisect_right
+
+import numpy as np
+
+from final_project.audio_utils import (
+    TARGET_SAMPLE_RATE,
+    TARGET_CHANNELS,
+    TARGET_SAMPLE_WIDTH,
+    convert_to_wav16k,
+)
+from final_project.config import (
+    VAD_CHUNK_TARGET_MIN,
+    VAD_MIN_SILENCE_MS,
+    VAD_SPEECH_PAD_MS,
+)
+from final_project.telemetry import timed
+
+logger = logging.getLogger(__name__)
+
+# Audio given to the VAD per call
+_VAD_WINDOW_SEC = 600
+
+# Silence inserted between two spans of a chunk, so Whisper hears a pause
+_JOIN_SILENCE_SEC = 0.2
+
+
+class AudioChunk:
+    """A group of speech spans [(start, end)] (seconds in the source file), written to path."""
+
+    def __init__(self, spans: list):
+        self.spans = spans
+        self.path = None
+        self._offsets = []           # chunk-local start time of each span
+        t = 0.0
+        for start, end in spans:
+            self._offsets.append(t)
+            t += end - start + _JOIN_SILENCE_SEC
+
+    @property
+    def speech_sec(self) -> float:
+        return sum(end - start for start, end in self.spans)
+
+    def to_source_time(self, t: float) -> float:
+        """Chunk-local time → time in the source file (pauses map to the end of the span before)."""
+        i = max(0, bisect_right(self._offsets, t) - 1)
+        start, end = self.spans[i]
+        return min(end, start + t - self._offsets[i])
+
+
+def _is_wav16k(path: str) -> bool:
+    try:
+        with wave.open(path, "rb") as w:
+            return (w.getframerate(), w.getnchannels(), w.getsampwidth()) == \
+                (TARGET_SAMPLE_RATE, TARGET_CHANNELS, TARGET_SAMPLE_WIDTH)
+    except (wave.Error, EOFError):
+        return False
+
+
+@timed("vad")
+def detect_speech(wav_path: str, min_silence_ms: int = VAD_MIN_SILENCE_MS,
+                  speech_pad_ms: int = VAD_SPEECH_PAD_MS,
+                  max_span_sec: float = VAD_CHUNK_TARGET_MIN * 60) -> list:
+    """Returns the speech spans [(start, end)] in seconds of a 16 kHz mono WAV."""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    options = VadOptions(
+        min_silence_duration_ms=min_silence_ms,
+        speech_pad_ms=speech_pad_ms,
+        max_speech_duration_s=max_span_sec,
+    )
+    spans = []
+    offset = 0.0
+    with wave.open(wav_path, "rb") as w:
+        while True:
+            frames = w.readframes(_VAD_WINDOW_SEC * TARGET_SAMPLE_RATE)
+            if not frames:
+                break
+            audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+            for ts in get_speech_timestamps(audio, options):
+                spans.append((offset + ts["start"] / TARGET_SAMPLE_RATE, offset + ts["end"] / TARGET_SAMPLE_RATE))
+            offset += len(audio) / TARGET_SAMPLE_RATE
+
+    # Join spans cut by a window border or separated by less than min_silence
+    merged = []
+    for start, end in spans:
+        if merged and start - merged[-1][1] < min_silence_ms / 1000 \
+                and end - merged[-1][0] <= max_span_sec:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def plan_chunks(spans: list, target_sec: float = VAD_CHUNK_TARGET_MIN * 60, workers: int = 1) -> list:
+    """
+    Splits the spans into contiguous chunks of about target_sec of speech each.
+    With several workers the chunk count is rounded up to a multiple of workers
+    and the speech is spread evenly, so every worker gets about the same load.
+    """
+    if not spans:
+        return []
+    total = sum(end - start for start, end in spans)
+    n = max(1, math.ceil(total / target_sec))
+    if workers > 1:
+        n = math.ceil(n / workers) * workers
+    n = min(n, len(spans))
+    per_chunk = total / n
+
+    chunks, current, done, k = [], [], 0.0, 1
+    for start, end in spans:
+        length = end - start
+        # Cut before the span that crosses the k-th boundary by more than half
+        if current and k < n and done + length / 2 > k * per_chunk:
+            chunks.append(AudioChunk(current))
+            current, k = [], k + 1
+        current.append((start, end))
+        done += length
+    chunks.append(AudioChunk(current))
+    return chunks
+
+
+def write_chunks(wav_path: str, chunks: list, output_dir: str) -> list:
+    """Writes the speech spans of each chunk into its own WAV; sets chunk.path."""
+    base = os.path.splitext(os.path.basename(wav_path))[0]
+    for old in glob.glob(os.path.join(glob.escape(output_dir), f"{glob.escape(base)}_chunk*.wav")):
+        os.remove(old)
+
+    pause = b"\x00" * int(_JOIN_SILENCE_SEC * TARGET_SAMPLE_RATE) * TARGET_SAMPLE_WIDTH
+    with wave.open(wav_path, "rb") as src:
+        params = src.getparams()
+        for i, chunk in enumerate(chunks):
+            chunk.path = os.path.join(output_dir, f"{base}_chunk{i}.wav")
+            with wave.open(chunk.path, "wb") as dst:
+                dst.setparams(params)
+                for start, end in chunk.spans:
+                    src.setpos(min(params.nframes, int(start * TARGET_SAMPLE_RATE)))
+                    dst.writeframes(src.readframes(int((end - start) * TARGET_SAMPLE_RATE)))
+                    dst.writeframes(pause)
+    return chunks
+
+
+@timed("chunk_planning")
+def plan_audio_chunks(file_path: str, output_dir: str, workers: int = 1,
+                      target_sec: float = VAD_CHUNK_TARGET_MIN * 60) -> list:
+    """detect_speech + plan_chunks + write_chunks; returns the written AudioChunks."""
+    os.makedirs(output_dir, exist_ok=True)
+    wav_path = file_path if _is_wav16k(file_path) else convert_to_wav16k(file_path, output_dir)
+
+    with wave.open(wav_path, "rb") as w:
+        duration = w.getnframes() / TARGET_SAMPLE_RATE
+    spans = detect_speech(wav_path, max_span_sec=target_sec)
+    chunks = write_chunks(wav_path, plan_chunks(spans, target_sec, workers), output_dir)
+    if wav_path != file_path:
+        os.remove(wav_path)
+
+    speech = sum(c.speech_sec for c in chunks)
+    logger.info(
+        f"{speech / 60:.1f} of {duration / 60:.1f} min are speech ({len(spans)} spans), "
+        f"in {len(chunks)} chunks of {', '.join(f'{c.speech_sec / 60:.1f}' for c in chunks)} min"
+    )
+    return chunks
@@ -1,7 +1,5 @@
 # final_project/config.py
-
-from langchain.agents import AgentType
-from langchain.callbacks.manager import CallbackManager
+# Plain constants only: every module imports this file, so it must stay cheap to import
 
 # 🔥 Default value if automatic selection is not used
 WHISPER_MODEL_SIZE = "small"
@@ -21,6 +19,60 @@ def select_whisper_model(duration_minutes: float) -> str:
     else:
         return WHISPER_MODEL_RULES["long"]["model"]
 
+# 🔥 Whisper model registry (shared by all sessions of one process)
+WHISPER_MODELS_DIR = "models"           # filled by download_model.py
+WHISPER_COMPUTE_TYPE = "int8"
+WHISPER_MODEL_MEMORY_MB = 2048          # LRU budget for loaded models
+WHISPER_PREWARM = True                  # load the models in WHISPER_MODEL_RULES at startup
+
+# 🔥 Long audio is transcribed in parts
+WHISPER_SPLIT_ABOVE_MIN = 30            # files longer than this (minutes) are split
+WHISPER_PART_MIN = 10                   # minutes per part (fixed split and calibration estimates)
+
+# 🔥 Parallel transcription of long audio (one WhisperModel per worker process)
+WHISPER_PARALLEL = True
+WHISPER_MAX_WORKERS = None      # None → derived from the number of CPU cores
+WHISPER_CPU_THREADS = 2         # cpu_threads given to each worker's model
+
+# 🔥 Throughput-aware model choice (python -m final_project.whisper_calibration)
+WHISPER_CALIBRATION_PATH = "models/whisper_calibration.json"   # measured real-time factors
+WHISPER_CALIBRATION_CLIP_SEC = 30       # length of the reference clip
+WHISPER_TIME_BUDGET_SEC = 600           # wall-clock target per file; None → always the best model
+WHISPER_QUALITY_ORDER = ["tiny", "base", "small", "medium", "large-v2", "large-v3"]   # worst → best
+
+# 🔥 Silence-aware chunking of long audio (> WHISPER_SPLIT_ABOVE_MIN)
+ADAPTIVE_CHUNKING = True                # False → fixed WHISPER_PART_MIN parts (split_audio)
+VAD_CHUNK_TARGET_MIN = 10               # minutes of speech per chunk
+VAD_MIN_SILENCE_MS = 1000               # shorter pauses do not split speech spans
+VAD_SPEECH_PAD_MS = 200                 # audio kept around each speech span
+
+# 🔥 Caption fast path (skip download + Whisper when the video has usable captions)
+CAPTIONS_ENABLED = True
+CAPTION_LANGUAGES = []                  # e.g. ["en"]; [] → the video's own language
+CAPTION_AUTO_POLICY = "never"           # automatic captions: "never" or "fallback" (when no manual track)
+
+# 🔥 Pipelined ingestion (download and transcription overlap)
+PIPELINED_INGESTION = True
+PIPELINE_WINDOW_SEC = 30                # audio fed to Whisper per step
+PIPELINE_MAX_BUFFERED_WINDOWS = 120     # decoded windows held while Whisper catches up
+PIPELINE_KEEP_WAV = False               # also write cache/audio/<key>.wav
+PIPELINE_PROMPT_CHARS = 200             # end of the previous text passed as the next window's prompt
+
+# 🔥 Progressive indexing (Q&A opens before transcription finishes)
+PROGRESSIVE_INDEXING = True
+PROGRESSIVE_INDEX_BATCH_CHARS = 2000    # transcript characters embedded per batch
+
+# 🔥 Background ingestion jobs (Streamlit)
+JOB_WORKERS = 2                         # videos processed at the same time per server
+JOB_RETENTION_SEC = 3600                # finished jobs kept in memory for late pollers
+
+# 🔥 Batch ingestion (python -m final_project.batch)
+BATCH_QUEUE_SIZE = 4                    # items waiting between two stages
+BATCH_DOWNLOAD_WORKERS = 3              # threads
+BATCH_TRANSCRIBE_WORKERS = None         # processes; None → cores // WHISPER_CPU_THREADS
+BATCH_SUMMARY_WORKERS = 4               # threads
+BATCH_EMBED_WORKERS = 2                 # threads
+
 # 🔁 Automatically map Whisper model to the appropriate GPT model
 WHISPER_TO_GPT_MAP = {
     "base": "gpt-3.5-turbo",
@@ -34,11 +86,65 @@ def select_gpt_model_by_whisper(whisper_model: str) -> str:
 # 🔥 GPT settings
 OPENAI_MODEL_NAME = "gpt-3.5-turbo"
 
+# 🔥 Shared OpenAI client layer (every chat / embeddings request goes through it)
+OPENAI_MAX_CONNECTIONS = 20             # pooled HTTP connections per process
+OPENAI_TIMEOUT_SEC = 60
+OPENAI_REQUESTS_PER_MINUTE = 500        # token bucket per model
+OPENAI_TOKENS_PER_MINUTE = 200000       # token bucket per model (estimated, corrected by usage)
+OPENAI_RATE_LIMITS = {}                 # per-model overrides, e.g. {"gpt-4": (500, 30000)}
+OPENAI_MAX_RETRIES = 5                  # on 429 (not insufficient_quota), 5xx and connection errors
+OPENAI_BACKOFF_BASE_SEC = 1.0           # full-jitter exponential backoff
+OPENAI_BACKOFF_MAX_SEC = 60.0
+OPENAI_COALESCE_REQUESTS = True         # identical requests in flight share one API call
+
+# 🔥 Map-reduce summarization for long transcripts
+SUMMARY_SINGLE_CALL_MAX_TOKENS = 3000   # up to this size one prompt is used (fast path)
+SUMMARY_WINDOW_TOKENS = 2500            # transcript tokens per partial summary
+SUMMARY_REDUCE_FAN_IN = 8               # partial summaries merged per reduce call
+SUMMARY_MAX_CONCURRENCY = 4             # concurrent requests to the GPT model
+SUMMARY_PARTIALS_DIR = "cache/summaries/partials"
+
+# 🔥 Vector storage layout
+VECTORSTORE_BACKEND = "chroma"          # per-video store: "chroma" or "numpy" (quantized memmap)
+NUMPY_VECTOR_DTYPE = "int8"             # "int8" (1 byte/dim) or "float16" (2 bytes/dim)
+SHARED_VECTORSTORE = False              # True → one collection for all videos (video_key metadata)
+SHARED_VECTORSTORE_DIR = "cache/vectorstore/_shared"
+SHARED_COLLECTION_NAME = "videos"
+
+# 🔥 Retrieval settings
+RETRIEVAL_MODE = "hybrid"               # "hybrid" (BM25 + vector), "lexical" or "vector"
+RETRIEVAL_K = 4                         # chunks given to the QA chain
+RETRIEVAL_RRF_K = 60                    # reciprocal rank fusion constant
+
+# 🔥 Answer cache in front of the QA chain
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_TTL_SEC = 24 * 3600
+ANSWER_CACHE_MAX_ENTRIES = 256          # per video and GPT model
+ANSWER_CACHE_SIMILARITY = 0.95          # cosine similarity for a near-identical question
+ANSWER_CACHE_MAX_VIDEOS = 64            # (video, GPT model) caches kept in memory
+
 # 🔥 Embedding model settings
 EMBEDDING_MODEL_NAME = "text-embedding-ada-002"
+EMBEDDING_CACHE_DIR = "cache/embeddings"      # content-addressed float32 vectors
+EMBEDDING_BATCH_SIZE = 256                    # texts per embeddings request
+EMBEDDING_MAX_CONCURRENCY = 4                 # embeddings requests in flight
 
 # 🔥 Agent type setting
-AGENT_TYPE = AgentType.CONVERSATIONAL_REACT_DESCRIPTION
+AGENT_TYPE = "conversational-react-description"     # value of langchain's AgentType.CONVERSATIONAL_REACT_DESCRIPTION
+
+# 🔥 Telemetry (stage timings, JSON event log, Prometheus text dump)
+TELEMETRY_ENABLED = True
+TELEMETRY_EVENTS_PATH = "logs/events.jsonl"   # one JSON object per line (stage spans, Q&A)
+TELEMETRY_METRICS_PATH = "logs/metrics.prom"  # Prometheus text format, rewritten on every flush
+TELEMETRY_FLUSH_SEC = 5                 # the background writer's interval
+TELEMETRY_MAX_QUEUED_EVENTS = 10000     # events beyond this are dropped (and counted)
+TELEMETRY_DURATION_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600]   # seconds
+
+# 🔥 Cache settings
+CACHE_DISK_BUDGET_MB = 10240            # LRU eviction starts above this size
+# Lower value → evicted first (large WAVs first, small transcripts last)
+CACHE_EVICTION_ORDER = {"audio": 0, "summary_partials": 0, "vectorstore": 1, "embeddings": 2,
+                        "summary": 2, "transcript": 3, "segments": 3}
 
 # 🔥 General settings
 CHUNK_SIZE = 500
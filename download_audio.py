@@ -3,10 +3,19 @@
 import yt_dlp
 import tempfile
 import os
+import queue
+import shutil
 import logging
+import subprocess
+import threading
+
+import numpy as np
+
+from final_project.telemetry import timed
 
 logger = logging.getLogger(__name__)
 
+@timed("download")
 def download_audio_from_youtube(url: str) -> str:
     """Download audio as a temporary WAV file from a YouTube URL."""
     temp_dir = tempfile.mkdtemp()
@@ -21,6 +30,8 @@ def download_audio_from_youtube(url: str) -> str:
             'preferredcodec': 'wav',
             'preferredquality': '8',  # 8,16,32
         }],
+        # Whisper only needs 16 kHz mono: smaller WAVs and split_audio can stream them as-is
+        'postprocessor_args': {'extractaudio': ['-ar', '16000', '-ac', '1']},
     }
 
     try:
@@ -32,3 +43,86 @@ def download_audio_from_youtube(url: str) -> str:
 
     wav_file_path = output_template.replace('%(ext)s', 'wav')
     return wav_file_path
+
+
+# Raw PCM produced by the streaming decoder: 16 kHz, mono, signed 16-bit
+STREAM_SAMPLE_RATE = 16000
+_BYTES_PER_SAMPLE = 2
+
+
+def get_audio_stream_info(url: str) -> dict:
+    """Resolves the direct best-audio stream URL (and its headers) without downloading."""
+    with yt_dlp.YoutubeDL({'format': 'bestaudio/best', 'quiet': True}) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def stream_audio_from_youtube(url: str, window_sec: float = 30, max_buffered_windows: int = 120,
+                              wav_path: str = None, info: dict = None):
+    """
+    Decodes a YouTube audio stream to 16 kHz mono while it downloads and yields
+    it as float32 NumPy windows of window_sec seconds (the last one may be shorter).
+
+    A reader thread keeps draining ffmpeg into a bounded queue, so the download
+    keeps going while the caller transcribes earlier windows. If wav_path is
+    given, ffmpeg also writes the full 16 kHz WAV there as a second output.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is required for pipelined ingestion")
+
+    info = info or get_audio_stream_info(url)
+    headers = ''.join(f"{k}: {v}\r\n" for k, v in (info.get('http_headers') or {}).items())
+
+    cmd = [ffmpeg, '-v', 'error', '-nostdin',
+           '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+    if headers:
+        cmd += ['-headers', headers]
+    cmd += ['-i', info['url'],
+            '-ac', '1', '-ar', str(STREAM_SAMPLE_RATE), '-f', 's16le', 'pipe:1']
+    if wav_path:
+        cmd += ['-ac', '1', '-ar', str(STREAM_SAMPLE_RATE), '-c:a', 'pcm_s16le', '-y', wav_path]
+
+    window_bytes = int(window_sec * STREAM_SAMPLE_RATE) * _BYTES_PER_SAMPLE
+    buffer = queue.Queue(maxsize=max_buffered_windows)
+    # stderr goes to a temp file: a pipe read only after exit can fill up and stall ffmpeg
+    stderr = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+
+    def _reader():
+        try:
+            while True:
+                data = proc.stdout.read(window_bytes)
+                if not data:
+                    break
+                buffer.put(data)
+        finally:
+            buffer.put(None)
+
+    reader = threading.Thread(target=_reader, daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            data = buffer.get()
+            if data is None:
+                break
+            # Drop a trailing odd byte, then scale int16 to [-1, 1] as Whisper expects
+            data = data[:len(data) - len(data) % _BYTES_PER_SAMPLE]
+            yield np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        # Unblock the reader if the caller stopped early with a full queue
+        while reader.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        stderr.seek(0)
+        err = stderr.read().decode('utf-8', 'replace').strip()
+        stderr.close()
+
+    if proc.returncode > 0:
+        logger.error(f"Error streaming audio from {url}: {err}")
+        raise RuntimeError(f"ffmpeg failed while streaming {url}: {err}")
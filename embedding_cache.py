@@ -0,0 +1,217 @@
+# final_project/embedding_cache.py
+"""
+Content-addressed cache for chunk embeddings.
+
+Each embedding model has its own folder under cache/embeddings/ with:
+- vectors.f32 : all vectors, one row of float32 values per cached text
+- keys.txt    : the SHA-1 of each cached text, line N ↔ row N
+- meta.json   : the vector dimension
+
+Both files are append-only, so a crash can at worst leave a few unindexed rows,
+which the next writer cuts off before appending.
+"""
+
+import os
+import json
+import math
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from filelock import FileLock
+from langchain_core.embeddings import Embeddings
+
+from final_project.config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+)
+from final_project.openai_client import embeddings_model
+from final_project.cache_utils import SHARED_KEY, get_cache_manager
+from final_project.telemetry import span, timed
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk float32 array of embeddings indexed by text hash, for one model.
+    Use get_store(): writers in this process share one instance, and writers
+    in other processes are serialized by a file lock next to the data.
+    """
+
+    def __init__(self, model_name: str, root: str = EMBEDDING_CACHE_DIR):
+        self.root = root
+        self.dir = os.path.join(root, model_name.replace("/", "_"))
+        os.makedirs(self.dir, exist_ok=True)
+        self._vectors_path = os.path.join(self.dir, "vectors.f32")
+        self._keys_path = os.path.join(self.dir, "keys.txt")
+        self._meta_path = os.path.join(self.dir, "meta.json")
+        self._file_lock = FileLock(os.path.join(self.dir, "write.lock"))
+        self._lock = threading.Lock()
+        self.dim = None
+        self._rows = {}                  # text hash → row
+        self._row_count = 0              # lines of keys.txt already in _rows
+        self._keys_read = 0              # and their length in bytes
+        self._keys_inode = None          # keys.txt they were read from
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """
+        Reads the rows appended to keys.txt since the last call (by this or another
+        process). Starts over if the files were removed by the cache eviction.
+        """
+        try:
+            stat = os.stat(self._keys_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._keys_inode or stat.st_size < self._keys_read:
+            self._rows, self._row_count, self._keys_read, self.dim = {}, 0, 0, None
+            self._keys_inode = stat.st_ino if stat else None
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None or not os.path.exists(self._keys_path):
+            return
+        # Rows without a complete vector (interrupted append) are ignored
+        complete_rows = os.path.getsize(self._vectors_path) // (4 * self.dim) \
+            if os.path.exists(self._vectors_path) else 0
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_read)
+            for line in f:
+                if self._row_count >= complete_rows or not line.endswith(b"\n"):
+                    break
+                self._rows.setdefault(line.decode("utf-8").strip(), self._row_count)
+                self._row_count += 1
+                self._keys_read += len(line)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, hashes: list) -> dict:
+        """Returns {hash: vector} for the hashes that are cached."""
+        with self._lock:
+            self._load_index()
+            found = {h: self._rows[h] for h in hashes if h in self._rows}
+            dim = self.dim
+        if not found:
+            return {}
+        try:
+            matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r").reshape(-1, dim)
+            return {h: np.array(matrix[row]) for h, row in found.items()}
+        except (OSError, ValueError, IndexError):
+            return {}                   # evicted meanwhile: every text is a miss
+
+    def put_many(self, items: dict) -> None:
+        """Appends {hash: vector} entries that are not cached yet."""
+        if not items:
+            return
+        with self._lock, self._file_lock:
+            # Another process may have appended since our last look
+            self._load_index()
+            new = {h: v for h, v in items.items() if h not in self._rows}
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = len(next(iter(new.values())))
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+
+            vectors = np.asarray(list(new.values()), dtype=np.float32).reshape(-1, self.dim)
+            first_row = self._row_count
+            # Drop whatever an interrupted writer left past the last indexed row,
+            # then append: vectors first, keys second, so a key is never visible without its vector
+            with open(self._keys_path, "ab") as f:
+                f.truncate(self._keys_read)
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(first_row * 4 * self.dim)
+                vectors.tofile(f)
+            with open(self._keys_path, "ab") as f:
+                f.write("".join(f"{h}\n" for h in new).encode("utf-8"))
+            self._load_index()
+        if os.path.abspath(self.root) == os.path.abspath(EMBEDDING_CACHE_DIR):
+            get_cache_manager().register(SHARED_KEY, "embeddings", self.root)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(model_name: str = EMBEDDING_MODEL_NAME, root: str = EMBEDDING_CACHE_DIR) -> EmbeddingStore:
+    """The EmbeddingStore of one model, shared by every CachedEmbeddings in this process."""
+    key = (model_name, os.path.abspath(root))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(model_name, root)
+        return _stores[key]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    OpenAI embeddings wrapper that only sends texts missing from the local cache,
+    in batches of batch_size with up to max_concurrency requests in flight.
+    stats tracks the hit rate and the API calls saved since the last reset_stats().
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL_NAME, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_concurrency: int = EMBEDDING_MAX_CONCURRENCY, store: EmbeddingStore = None):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.client = embeddings_model(model, chunk_size=batch_size)
+        self.store = store or get_store(model)
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.stats = {"texts": 0, "hits": 0, "misses": 0, "api_calls": 0, "api_calls_saved": 0}
+
+    @property
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["texts"] if self.stats["texts"] else 0.0
+
+    def embed_documents(self, texts: list) -> list:
+        with span("embed", model=self.model, texts=len(texts)) as s:
+            vectors, s["hits"], s["api_calls"] = self._embed_documents(texts)
+        return vectors
+
+    def _embed_documents(self, texts: list) -> tuple:
+        """Returns (vectors, cache hits, API calls made)."""
+        hashes = [text_hash(t) for t in texts]
+        cached = self.store.get_many(hashes)
+
+        # Each distinct missing text is embedded once, even if repeated in this call
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = t
+
+        batches = [list(missing.items())[i:i + self.batch_size]
+                   for i in range(0, len(missing), self.batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                results = pool.map(lambda b: self.client.embed_documents([t for _, t in b]), batches)
+                fresh = {}
+                for batch, vectors in zip(batches, results):
+                    fresh.update({h: v for (h, _), v in zip(batch, vectors)})
+            self.store.put_many(fresh)
+            cached.update({h: np.asarray(v, dtype=np.float32) for h, v in fresh.items()})
+
+        hits = sum(1 for h in hashes if h not in missing)
+        self.stats["texts"] += len(texts)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(texts) - hits
+        self.stats["api_calls"] += len(batches)
+        self.stats["api_calls_saved"] += math.ceil(len(texts) / self.batch_size) - len(batches)
+
+        return [cached[h].tolist() for h in hashes], hits, len(batches)
+
+    @timed("embed_query")
+    def embed_query(self, text: str) -> list:
+        return self.client.embed_query(text)
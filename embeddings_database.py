@@ -1,26 +1,305 @@
 # final_project/embeddings_database.py
 
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings          # ← Correct import after package split
 from langchain_community.vectorstores import Chroma    # ← Same library reused in app.py
+from langchain_core.documents import Document
 
-from final_project.config import EMBEDDING_MODEL_NAME
+import os
+import uuid
+import shutil
+import logging
+import threading
+
+from final_project.embedding_cache import CachedEmbeddings
+from final_project.openai_client import embeddings_model
+from final_project.numpy_vectorstore import NumpyVectorStore
+from final_project.cache_utils import (
+    artifact_path,
+    get_cache_manager,
+    is_shared_vectorstore,
+    register_shared_store_hooks,
+)
+from final_project.config import (
+    EMBEDDING_MODEL_NAME,
+    PROGRESSIVE_INDEX_BATCH_CHARS,
+    VECTORSTORE_BACKEND,
+    SHARED_VECTORSTORE,
+    SHARED_VECTORSTORE_DIR,
+    SHARED_COLLECTION_NAME,
+)
+from final_project.text_processing import chunk_segments
+from final_project.telemetry import span, timed
 
 # 🔥 Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────── Shared collection ───────────────────────────
+_shared_store = None
+_shared_lock = threading.Lock()
+
 
-def create_vectorstore(docs, persist_dir: str):
+def get_shared_vectorstore() -> Chroma:
+    """The single collection holding the chunks of every video (tagged with video_key)."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = Chroma(
+                collection_name=SHARED_COLLECTION_NAME,
+                persist_directory=SHARED_VECTORSTORE_DIR,
+                embedding_function=embeddings_model(EMBEDDING_MODEL_NAME),
+            )
+        return _shared_store
+
+
+class VideoVectorStore:
     """
-    Builds a Chroma VectorStore from a list of text chunks, saves it in persist_dir,
-    and returns the object (can be queried directly or closed and used via the path).
+    One video's view of the shared collection. Searches are filtered on
+    video_key; chunks are embedded with this view's own (cached) embeddings,
+    so the embedding stats stay per video.
+    Offers the parts of the VectorStore interface used by build_agent,
+    HybridRetriever and ProgressiveIndexer.
     """
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL_NAME)
 
-    store = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
+    def __init__(self, store: Chroma, video_key: str, embeddings=None):
+        self.store = store
+        self.video_key = video_key
+        self.embeddings = embeddings or CachedEmbeddings(model=EMBEDDING_MODEL_NAME)
+        self.bytes_added = 0            # rough disk footprint, reported to the cache index
+
+    @property
+    def _filter(self) -> dict:
+        return {"video_key": self.video_key}
+
+    def add_documents(self, docs: list) -> list:
+        if not docs:
+            return []
+        texts = [d.page_content for d in docs]
+        vectors = self.embeddings.embed_documents(texts)
+        ids = [f"{self.video_key}-{uuid.uuid4().hex}" for _ in docs]
+        metadatas = [{**d.metadata, "video_key": self.video_key} for d in docs]
+        self.store._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        self.bytes_added += sum(len(t.encode("utf-8")) for t in texts) + 4 * sum(len(v) for v in vectors)
+        return ids
+
+    def delete_all(self) -> None:
+        self.store._collection.delete(where=self._filter)
+
+    def count(self) -> int:
+        return len(self.store._collection.get(where=self._filter, include=[])["ids"])
+
+    def rows(self, embeddings: bool = True) -> dict:
+        include = ["documents", "metadatas"] + (["embeddings"] if embeddings else [])
+        return self.store._collection.get(where=self._filter, include=include)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list:
+        return self.store.similarity_search(query, k=k, filter=self._filter, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: list, k: int = 4, **kwargs) -> list:
+        return self.store.similarity_search_by_vector(embedding, k=k, filter=self._filter, **kwargs)
+
+    def as_retriever(self, search_kwargs: dict = None, **kwargs):
+        search_kwargs = {**(search_kwargs or {}), "filter": self._filter}
+        return self.store.as_retriever(search_kwargs=search_kwargs, **kwargs)
+
+    def persist(self) -> None:
+        """Chroma persists on write; kept for interface parity with per-video stores."""
+
+
+def search_all_videos(query: str, k: int = 4) -> list:
+    """Cross-video search over the shared collection (metadata carries video_key)."""
+    return get_shared_vectorstore().similarity_search(query, k=k)
+
+
+def _remove_video(video_key: str) -> None:
+    VideoVectorStore(get_shared_vectorstore(), video_key).delete_all()
+
+
+def _rename_video(old_key: str, new_key: str) -> None:
+    collection = get_shared_vectorstore()._collection
+    rows = collection.get(where={"video_key": old_key}, include=["metadatas"])
+    if rows["ids"]:
+        collection.update(
+            ids=rows["ids"],
+            metadatas=[{**m, "video_key": new_key} for m in rows["metadatas"]],
+        )
+
+
+# Lets cache eviction / key migration act on the rows of one video
+register_shared_store_hooks(remove=_remove_video, rename=_rename_video)
+
+
+# ─────────────────────────── Per-video stores ───────────────────────────
+def vectorstore_location(video_key: str) -> str:
+    """Where a video's chunks go: the shared collection or its own directory."""
+    return SHARED_VECTORSTORE_DIR if SHARED_VECTORSTORE else artifact_path(video_key, "vectorstore")
+
+
+def _uses_numpy(persist_dir: str) -> bool:
+    """Existing directories keep their format; new ones follow VECTORSTORE_BACKEND."""
+    if NumpyVectorStore.is_store(persist_dir):
+        return True
+    return VECTORSTORE_BACKEND == "numpy" and not os.path.exists(os.path.join(persist_dir, "chroma.sqlite3"))
+
+
+def open_vectorstore(persist_dir: str, video_key: str = None, embeddings=None):
+    """
+    Opens a store: the shared collection, a NumPy store or a per-video Chroma directory.
+    A directory that does not exist yet is created on the first add.
+    """
+    if is_shared_vectorstore(persist_dir):
+        return VideoVectorStore(get_shared_vectorstore(), video_key, embeddings)
+    if _uses_numpy(persist_dir):
+        return NumpyVectorStore(persist_dir, embeddings or CachedEmbeddings(model=EMBEDDING_MODEL_NAME))
+    return Chroma(
         persist_directory=persist_dir,
+        embedding_function=embeddings or embeddings_model(EMBEDDING_MODEL_NAME),
+    )
+
+
+def stored_documents(store) -> list:
+    """
+    The chunks a store actually holds, as Documents in time order. BM25 must
+    index these: a progressively indexed video was chunked batch by batch, so
+    re-chunking its segments gives different texts than the vector search returns.
+    """
+    if isinstance(store, (VideoVectorStore, NumpyVectorStore)):
+        rows = store.rows(embeddings=False)
+    else:
+        rows = store._collection.get(include=["documents", "metadatas"])
+    docs = [
+        Document(page_content=text, metadata={k: v for k, v in (meta or {}).items() if k != "video_key"})
+        for text, meta in zip(rows["documents"], rows["metadatas"])
+    ]
+    return sorted(docs, key=lambda d: d.metadata.get("start", 0.0))
+
+
+@timed("index")
+def create_vectorstore(docs, persist_dir: str, video_key: str = None):
+    """
+    Builds a VectorStore (Chroma, or NumpyVectorStore when VECTORSTORE_BACKEND is
+    "numpy") from a list of text chunks, saves it in persist_dir,
+    and returns the object (can be queried directly or closed and used via the path).
+    If persist_dir is the shared collection, the video's previous chunks are replaced
+    and a VideoVectorStore view is returned.
+    Chunks embedded before (same model, same text) are read from the local
+    embedding cache; store.embeddings.stats holds the hit rate and calls saved.
+    """
+    embeddings = CachedEmbeddings(model=EMBEDDING_MODEL_NAME)
+
+    if is_shared_vectorstore(persist_dir):
+        store = VideoVectorStore(get_shared_vectorstore(), video_key, embeddings)
+        store.delete_all()
+        store.add_documents(docs)
+    elif _uses_numpy(persist_dir):
+        # from_documents appends to an existing store: start from an empty one
+        shutil.rmtree(persist_dir, ignore_errors=True)
+        store = NumpyVectorStore.from_documents(docs, embeddings, persist_directory=persist_dir)
+    else:
+        store = Chroma.from_documents(
+            documents=docs,
+            embedding=embeddings,
+            persist_directory=persist_dir,
+        )
+        store.persist()                      # Writes index + metadata files
+    logger.info(
+        f"Embedded {embeddings.stats['texts']} chunks for {video_key or persist_dir}: "
+        f"hit rate {embeddings.hit_rate:.0%}, {embeddings.stats['api_calls_saved']} API calls saved"
     )
-    store.persist()                      # Writes index + metadata files
     return store
+
+
+def migrate_to_shared(keys: list = None, keep_old: bool = False) -> dict:
+    """
+    Copies per-video Chroma directories into the shared collection without
+    re-embedding (vectors, texts and metadata are copied as stored), then points
+    the cache index at the shared collection. Returns {key: chunks copied}.
+    """
+    manager = get_cache_manager()
+    shared = get_shared_vectorstore()
+    migrated = {}
+    for key in keys or manager.keys_with("vectorstore"):
+        vs_dir = manager.get_path(key, "vectorstore")
+        if vs_dir is None or is_shared_vectorstore(vs_dir):
+            continue
+        with manager.lock(key):
+            if NumpyVectorStore.is_store(vs_dir):
+                rows = NumpyVectorStore(vs_dir, None).rows()
+            else:
+                rows = Chroma(persist_directory=vs_dir)._collection.get(
+                    include=["embeddings", "documents", "metadatas"]
+                )
+            view = VideoVectorStore(shared, key)
+            view.delete_all()
+            if rows["ids"]:
+                shared._collection.upsert(
+                    ids=[f"{key}-{i}" for i in rows["ids"]],
+                    embeddings=rows["embeddings"],
+                    documents=rows["documents"],
+                    metadatas=[{**(m or {}), "video_key": key} for m in rows["metadatas"]],
+                )
+            size = sum(len(d.encode("utf-8")) for d in rows["documents"]) \
+                + 4 * sum(len(v) for v in rows["embeddings"])
+            manager.register(key, "vectorstore", SHARED_VECTORSTORE_DIR, size=size)
+            if not keep_old:
+                shutil.rmtree(vs_dir, ignore_errors=True)
+        migrated[key] = len(rows["ids"])
+        logger.info(f"Migrated {len(rows['ids'])} chunks of {key} from {vs_dir}")
+    return migrated
+
+
+class ProgressiveIndexer:
+    """
+    Appends transcript segments to the video's store while transcription is still running.
+    Segments are buffered until about batch_chars characters are available, then
+    chunked along segment boundaries (chunk_segments) and embedded in one call.
+    documents keeps every chunk indexed so far, in order.
+    """
+
+    def __init__(self, persist_dir: str, video_key: str = None,
+                 batch_chars: int = PROGRESSIVE_INDEX_BATCH_CHARS):
+        # A re-run (e.g. after a failed job) starts from an empty store, not on top of the old chunks
+        if NumpyVectorStore.is_store(persist_dir):
+            shutil.rmtree(persist_dir, ignore_errors=True)
+        self.store = open_vectorstore(
+            persist_dir, video_key, embeddings=CachedEmbeddings(model=EMBEDDING_MODEL_NAME)
+        )
+        if isinstance(self.store, VideoVectorStore):
+            self.store.delete_all()
+        elif isinstance(self.store, Chroma):
+            # Rows are deleted rather than the directory: Chroma keeps its client open per path
+            ids = self.store.get(include=[])["ids"]
+            if ids:
+                self.store.delete(ids=ids)
+        self.batch_chars = batch_chars
+        self.indexed_until = 0.0        # seconds of audio searchable so far
+        self.chunks_indexed = 0
+        self.documents = []
+        self._buffer = []               # (start, end, text) not indexed yet
+        self._lock = threading.Lock()
+
+    def add_segment(self, start: float, end: float, text: str) -> None:
+        """Buffers one transcription segment and indexes the buffer once it is large enough."""
+        with self._lock:
+            self._buffer.append((start, end, text))
+            if sum(len(t) for _, _, t in self._buffer) >= self.batch_chars:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Indexes whatever is left in the buffer and persists the store."""
+        with self._lock:
+            self._flush_locked()
+            self.store.persist()
+
+    def _flush_locked(self) -> None:
+        docs = chunk_segments(self._buffer)
+        if docs:
+            with span("index_batch", chunks=len(docs)):
+                self.store.add_documents(docs)
+            self.chunks_indexed += len(docs)
+            self.documents.extend(docs)
+        if self._buffer:
+            self.indexed_until = self._buffer[-1][1]
+        self._buffer = []
@@ -0,0 +1,122 @@
+# final_project/hybrid_retriever.py
+"""
+Local hybrid retrieval for build_agent:
+- BM25Index: compact in-memory inverted index over the transcript chunks
+  (NumPy arrays of doc ids / term frequencies per term)
+- HybridRetriever: fuses BM25 and vector results with reciprocal rank fusion,
+  or runs lexical-only (no embedding call for the query) / vector-only
+"""
+
+import re
+import math
+from collections import Counter, defaultdict
+
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.retrievers import BaseRetriever
+
+from final_project.config import RETRIEVAL_K, RETRIEVAL_RRF_K
+
+# Words, numbers and identifiers (snake_case, c#, c++)
+_TOKEN_RE = re.compile(r"[a-z0-9_]+[#+]*")
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents."""
+
+    def __init__(self, texts: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(texts)
+
+        postings = defaultdict(list)
+        lengths = np.zeros(self.n_docs, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        self.avg_len = float(lengths.mean()) if self.n_docs else 0.0
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / (self.avg_len or 1.0))
+        self._postings = {}
+        for term, items in postings.items():
+            ids = np.fromiter((d for d, _ in items), dtype=np.int32, count=len(items))
+            tfs = np.fromiter((tf for _, tf in items), dtype=np.float32, count=len(items))
+            idf = math.log(1 + (self.n_docs - len(items) + 0.5) / (len(items) + 0.5))
+            self._postings[term] = (ids, tfs, idf)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            ids, tfs, idf = self._postings[term]
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+        return scores
+
+    def top_k(self, query: str, k: int) -> list:
+        """Returns [(doc_id, score)] of the k best matching documents (score > 0)."""
+        scores = self.scores(query)
+        k = min(k, self.n_docs)
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best if scores[i] > 0]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    mode = "hybrid"  : BM25 + vector search, fused with reciprocal rank fusion
+    mode = "lexical" : BM25 only, no embedding request for the query
+    mode = "vector"  : the vector store only
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    docs: list
+    index: BM25Index
+    vectorstore: object = None
+    mode: str = "hybrid"
+    k: int = RETRIEVAL_K
+    rrf_k: int = RETRIEVAL_RRF_K
+
+    @classmethod
+    def from_documents(cls, docs: list, vectorstore=None, mode: str = "hybrid", **kwargs) -> "HybridRetriever":
+        if vectorstore is None and mode != "lexical":
+            raise ValueError(f"mode '{mode}' needs a vectorstore")
+        return cls(docs=list(docs), index=BM25Index([d.page_content for d in docs]),
+                   vectorstore=vectorstore, mode=mode, **kwargs)
+
+    def _lexical(self, query: str, k: int) -> list:
+        return [self.docs[i] for i, _ in self.index.top_k(query, k)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        if self.mode == "lexical":
+            return self._lexical(query, self.k)
+        if self.mode == "vector":
+            return self.vectorstore.similarity_search(query, k=self.k)
+
+        # Reciprocal rank fusion; documents are matched by their text
+        fused, by_text = defaultdict(float), {}
+        for results in (self._lexical(query, self.k * 2),
+                        self.vectorstore.similarity_search(query, k=self.k * 2)):
+            for rank, doc in enumerate(results):
+                fused[doc.page_content] += 1.0 / (self.rrf_k + rank + 1)
+                by_text.setdefault(doc.page_content, doc)
+
+        ranked = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [by_text[text] for text in ranked]
+
+
+def make_retriever(vectorstore, docs: list = None, mode: str = "hybrid", k: int = RETRIEVAL_K):
+    """Hybrid/lexical retriever when the chunks are known, plain vector retriever otherwise."""
+    if docs and mode in ("hybrid", "lexical"):
+        return HybridRetriever.from_documents(docs, vectorstore, mode=mode, k=k)
+    return vectorstore.as_retriever(search_kwargs={"k": k})
+
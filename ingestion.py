@@ -0,0 +1,346 @@
+# final_project/ingestion.py
+"""
+Pipelined ingestion of a YouTube video:
+the audio is decoded to 16 kHz mono while it downloads and fed to Whisper
+in windows, so transcription of the first minutes overlaps the download.
+Writing the full intermediate WAV is optional.
+
+The ingestion jobs below run a whole video (transcript, summary, vectorstore)
+off the Streamlit script thread and publish their stage and progress:
+- ProgressiveIngestion: pipelined, indexes segments as they arrive,
+  so Q&A can start before the end
+- SequentialIngestion: download the WAV, then transcribe, summarize and embed
+Both first look for usable captions (captions.py) and skip the audio entirely
+when they find some.
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from final_project.download_audio import (
+    download_audio_from_youtube,
+    get_audio_stream_info,
+    stream_audio_from_youtube,
+)
+from final_project.transcribe_audio import transcribe_audio, transcribe_stream
+from final_project.captions import fetch_captions
+from final_project.text_processing import chunk_segments
+from final_project.segment_store import save_segments
+from final_project.embeddings_database import ProgressiveIndexer, create_vectorstore, vectorstore_location
+from final_project.agent import build_agent
+from final_project.summarization import generate_summary
+from final_project.openai_client import is_rate_limit_error, is_quota_error
+from final_project.telemetry import span
+from final_project.cache_utils import save_cache, artifact_path, get_cache_manager
+from final_project.config import (
+    PIPELINE_WINDOW_SEC,
+    PIPELINE_MAX_BUFFERED_WINDOWS,
+    PIPELINED_INGESTION,
+    PIPELINE_KEEP_WAV,
+    PROGRESSIVE_INDEXING,
+    CAPTIONS_ENABLED,
+    select_gpt_model_by_whisper,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def transcribe_from_youtube(url: str, progress_bar=None, wav_path: str = None,
+                            on_segment=None, info: dict = None) -> tuple:
+    """
+    Downloads and transcribes a video in one overlapped stage.
+    If wav_path is given, the full 16 kHz WAV is also kept there.
+    info (from get_audio_stream_info) can be passed to skip the metadata request.
+    Returns: (full transcript, Whisper model name used, stats dict)
+    stats["time_to_first_segment"] is measured from the start of this call.
+    """
+    started = time.perf_counter()
+    info = info or get_audio_stream_info(url)
+    metadata_time = time.perf_counter() - started
+
+    windows = stream_audio_from_youtube(
+        url,
+        window_sec=PIPELINE_WINDOW_SEC,
+        max_buffered_windows=PIPELINE_MAX_BUFFERED_WINDOWS,
+        wav_path=wav_path,
+        info=info,
+    )
+    transcript, model_size, stats = transcribe_stream(
+        windows,
+        duration_sec=info.get("duration"),
+        progress_bar=progress_bar,
+        on_segment=on_segment,
+    )
+
+    stats["metadata_time"] = metadata_time
+    if stats["time_to_first_segment"] is not None:
+        stats["time_to_first_segment"] += metadata_time
+    stats["total_time"] += metadata_time
+    logger.info(f"Pipelined ingestion of {url}: {stats}")
+    return transcript, model_size, stats
+
+
+class _ProgressRecorder:
+    """Stands in for a Streamlit progress bar and records the value on the job instead."""
+
+    def __init__(self, job: "IngestionJob"):
+        self.job = job
+
+    def progress(self, value: float) -> None:
+        self.job.set_stage(self.job.stage, value)
+
+
+class IngestionJob(ABC):
+    """
+    Background ingestion of one video. The Streamlit script only polls the public
+    attributes; nothing here touches st.*, since Streamlit calls are not allowed
+    outside the script thread. Stage and progress are also written to the cache
+    index (CacheManager.set_job_status) so any session or process can read them.
+    """
+
+    def __init__(self, url: str, key: str, gpt_model: str = ""):
+        self.url = url
+        self.key = key
+        self.gpt_model = gpt_model
+        self.vs_dir = vectorstore_location(key)
+
+        self.stage = "queued"
+        self.progress = 0.0
+        self.transcribed_until = 0.0     # end time (s) of the last finished segment
+        self.transcript = None
+        self.segments = []               # (start, end, text) of every finished segment
+        self.documents = None            # the chunks in the vectorstore, once complete
+        self.summary = None
+        self.whisper_used = None
+        self.transcript_source = None    # "whisper:<model>" or "captions:<manual|auto>:<lang>"
+        self.stats = {}
+        self.warning = None
+        self.error = None
+        self.done = False
+        self.finished_at = None
+        self._info = None                # yt-dlp metadata fetched by the caption check
+        self._agents = {}
+        self._lock = threading.Lock()
+
+    # ── status ──
+    def set_stage(self, stage: str, progress: float = 0.0) -> None:
+        self.stage, self.progress = stage, progress
+        get_cache_manager().set_job_status(self.key, stage, progress, self.transcribed_until)
+
+    @property
+    @abstractmethod
+    def vectorstore(self):
+        """The store Q&A queries, once there is one."""
+
+    @property
+    def ready(self) -> bool:
+        """True as soon as the video can be queried."""
+        return self.done and self.error is None
+
+    @property
+    def chosen_model(self) -> str:
+        if self.gpt_model:
+            return self.gpt_model
+        return select_gpt_model_by_whisper(self.whisper_used) if self.whisper_used else "gpt-4"
+
+    def agent(self, model_name: str = None):
+        """
+        One RetrievalQA chain per model, shared by every session polling this job.
+        Once the transcript is complete, a new agent with the BM25 index is built;
+        the agents before it do not add answers to the video's answer cache.
+        """
+        model_name = model_name or self.chosen_model
+        complete = self.transcript is not None
+        with self._lock:
+            if (model_name, complete) not in self._agents:
+                self._agents[(model_name, complete)] = build_agent(
+                    self.vectorstore,
+                    model_name=model_name,
+                    cache_key=self.key,
+                    docs=self.documents if complete else None,
+                    partial=not complete,
+                )
+            return self._agents[(model_name, complete)]
+
+    # ── execution ──
+    def start(self) -> "IngestionJob":
+        """Runs the job in its own thread (JobManager uses a shared pool instead)."""
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def run(self) -> None:
+        try:
+            with span("ingest", key=self.key, url=self.url, mode=type(self).__name__) as s:
+                self._run()
+                s.update(transcript_source=self.transcript_source, whisper=self.whisper_used)
+            self.set_stage("done", 1.0)
+        except Exception as e:
+            logger.error(f"Ingestion of {self.url} failed: {e}")
+            self.error = e
+            self.set_stage("failed", self.progress)
+        finally:
+            self.finished_at = time.time()
+            self.done = True
+
+    @abstractmethod
+    def _run(self) -> None:
+        """Fills transcript, summary and the vectorstore; called by run()."""
+
+    def _on_segment(self, start: float, end: float, text: str) -> None:
+        self.transcribed_until = end
+        self.segments.append((start, end, text))
+
+    def _from_captions(self) -> str:
+        """
+        Caption fast path: when the video has a usable caption track, its segments
+        go through _on_segment like Whisper's would and the transcript is returned.
+        Returns None (and Whisper runs) when there is none.
+        """
+        if not CAPTIONS_ENABLED:
+            return None
+        self.set_stage("captions")
+        try:
+            self._info = get_audio_stream_info(self.url)
+            found = fetch_captions(self.url, info=self._info)
+        except Exception as e:
+            logger.warning(f"Caption check for {self.url} failed, transcribing instead: {e}")
+            return None
+        if found is None:
+            return None
+        segments, self.transcript_source = found
+        for segment in segments:
+            self._on_segment(*segment)
+        self.stats["transcript_source"] = self.transcript_source
+        return " ".join(text for _, _, text in segments)
+
+    def _save_transcript(self, transcript: str) -> None:
+        """Writes the segments and transcript, and records where they came from."""
+        if self.transcript_source is None:
+            self.transcript_source = f"whisper:{self.whisper_used}"
+        manager = get_cache_manager()
+        # Under the key's lock, so the eviction never removes a half-written entry
+        with manager.lock(self.key):
+            save_segments(self.key, self.segments)
+            manager.write_text(self.key, "transcript", transcript)
+            manager.set_meta(self.key, "transcript_source", self.transcript_source)
+
+    def _summarize(self, transcript: str) -> str:
+        self.set_stage("summarizing")
+        try:
+            return generate_summary(transcript, model_name=self.chosen_model)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                reason = "quota exceeded" if is_quota_error(e) else "rate limit reached"
+                self.warning = f"OpenAI {reason}. Summary generation is not available at the moment."
+                return "—"
+            raise
+
+
+class ProgressiveIngestion(IngestionJob):
+    """Pipelined download + transcription; finished segments are indexed as they arrive."""
+
+    def __init__(self, url: str, key: str, gpt_model: str = "", wav_path: str = None):
+        super().__init__(url, key, gpt_model)
+        self.wav_path = wav_path
+        self.indexer = ProgressiveIndexer(self.vs_dir, key)
+
+    @property
+    def vectorstore(self):
+        return self.indexer.store
+
+    @property
+    def ready(self) -> bool:
+        """True as soon as the first chunks can be retrieved."""
+        return self.indexer.chunks_indexed > 0 and self.error is None
+
+    def _on_segment(self, start: float, end: float, text: str) -> None:
+        super()._on_segment(start, end, text)
+        self.indexer.add_segment(start, end, text)
+
+    def _run(self) -> None:
+        transcript = self._from_captions()
+        if transcript is None:
+            self.set_stage("transcribing")
+            transcript, self.whisper_used, stats = transcribe_from_youtube(
+                self.url,
+                progress_bar=_ProgressRecorder(self),
+                wav_path=self.wav_path,
+                on_segment=self._on_segment,
+                info=self._info,
+            )
+            self.stats.update(stats)
+        self.indexer.flush()
+        self.stats["embedding"] = dict(self.indexer.store.embeddings.stats)
+
+        self._save_transcript(transcript)
+        self.documents = self.indexer.documents
+        self.transcript = transcript
+
+        self.summary = self._summarize(transcript)
+        save_cache(self.key, transcript, self.summary, self.vs_dir,
+                   vectorstore_size=getattr(self.indexer.store, "bytes_added", None))
+
+
+class SequentialIngestion(IngestionJob):
+    """
+    Transcribes the whole video (pipelined, or download-then-transcribe),
+    then summarizes it and embeds all chunks in one batch.
+    """
+
+    def __init__(self, url: str, key: str, gpt_model: str = "", pipelined: bool = PIPELINED_INGESTION):
+        super().__init__(url, key, gpt_model)
+        self.pipelined = pipelined
+        self._vectorstore = None
+
+    @property
+    def vectorstore(self):
+        return self._vectorstore
+
+    def _run(self) -> None:
+        wav_p = artifact_path(self.key, "audio")
+        transcript = self._from_captions()
+        if transcript is None and self.pipelined:
+            self.set_stage("transcribing")
+            transcript, self.whisper_used, stats = transcribe_from_youtube(
+                self.url,
+                progress_bar=_ProgressRecorder(self),
+                wav_path=wav_p if PIPELINE_KEEP_WAV else None,
+                on_segment=self._on_segment,
+                info=self._info,
+            )
+            self.stats.update(stats)
+        elif transcript is None:
+            self.set_stage("downloading")
+            wav = download_audio_from_youtube(self.url)
+            os.makedirs(os.path.dirname(wav_p), exist_ok=True)
+            shutil.move(wav, wav_p)
+            shutil.rmtree(os.path.dirname(wav), ignore_errors=True)
+
+            self.set_stage("transcribing")
+            transcript, self.whisper_used = transcribe_audio(
+                wav_p, _ProgressRecorder(self), on_segment=self._on_segment
+            )
+        self._save_transcript(transcript)
+        self.transcript = transcript
+
+        self.summary = self._summarize(transcript)
+
+        self.set_stage("indexing")
+        self.documents = chunk_segments(self.segments)
+        store = create_vectorstore(self.documents, persist_dir=self.vs_dir, video_key=self.key)
+        self.stats["embedding"] = dict(store.embeddings.stats)
+        save_cache(self.key, transcript, self.summary, self.vs_dir,
+                   vectorstore_size=getattr(store, "bytes_added", None))
+        self._vectorstore = store
+
+
+def make_ingestion(url: str, key: str, gpt_model: str = "") -> IngestionJob:
+    """Picks the ingestion job type from the settings in config."""
+    if PIPELINED_INGESTION and PROGRESSIVE_INDEXING:
+        wav_path = artifact_path(key, "audio") if PIPELINE_KEEP_WAV else None
+        return ProgressiveIngestion(url, key, gpt_model, wav_path=wav_path)
+    return SequentialIngestion(url, key, gpt_model, pipelined=PIPELINED_INGESTION)
@@ -0,0 +1,78 @@
+# final_project/jobs.py
+"""
+In-process job queue for video ingestion, shared by every Streamlit session.
+
+- Jobs are keyed by cache key: the same video submitted by several users
+  at the same time is processed once and every session polls the same job
+- Stage progress is written to the cache index, so a refreshed browser
+  (a brand-new session) can pick up where it left off
+- Finished jobs stay in memory for JOB_RETENTION_SEC so late pollers reuse
+  their vectorstore and agents instead of reopening them
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from final_project.ingestion import IngestionJob, make_ingestion
+from final_project.cache_utils import generate_cache_key, get_cache_manager
+from final_project.config import JOB_WORKERS, JOB_RETENTION_SEC
+
+logger = logging.getLogger(__name__)
+
+
+class JobManager:
+    """Deduplicating pool of ingestion jobs."""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, retention_sec: float = JOB_RETENTION_SEC):
+        self.retention_sec = retention_sec
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url: str, gpt_model: str = "") -> IngestionJob:
+        """
+        Queues the video unless a job for the same key is already queued,
+        running or finished successfully; returns the job either way.
+        """
+        key = generate_cache_key(url)
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(key)
+            if job is not None and job.error is None:
+                logger.info(f"Joining existing job for {key} ({job.stage})")
+                return job
+
+            job = make_ingestion(url, key, gpt_model)
+            self._jobs[key] = job
+            get_cache_manager().set_job_status(key, "queued")
+            self._executor.submit(job.run)
+            return job
+
+    def get(self, key: str) -> IngestionJob:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def active(self) -> list:
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def _prune(self) -> None:
+        now = time.time()
+        for key, job in list(self._jobs.items()):
+            if job.done and now - job.finished_at > self.retention_sec:
+                del self._jobs[key]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Returns the process-wide JobManager (created on first use)."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
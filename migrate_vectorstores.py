@@ -0,0 +1,31 @@
+# final_project/migrate_vectorstores.py
+"""
+Moves the per-video Chroma directories into the shared collection.
+
+    python -m final_project.migrate_vectorstores [KEY ...] [--keep-old]
+
+Vectors are copied as stored, so nothing is re-embedded. Set
+SHARED_VECTORSTORE = True in config afterwards so new videos go there too.
+"""
+
+import sys
+import logging
+import argparse
+
+from final_project.embeddings_database import migrate_to_shared
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Copy per-video vector stores into the shared collection.")
+    parser.add_argument("keys", nargs="*", help="cache keys to migrate (default: all)")
+    parser.add_argument("--keep-old", action="store_true", help="keep the per-video directories")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    migrated = migrate_to_shared(args.keys or None, keep_old=args.keep_old)
+    print(f"Migrated {len(migrated)} videos, {sum(migrated.values())} chunks")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
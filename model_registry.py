@@ -0,0 +1,188 @@
+# final_project/model_registry.py
+"""
+Process-wide registry of loaded Faster-Whisper models.
+
+- Models are keyed by (size, compute_type, cpu_threads) and loaded once per process
+- Local copies under models/faster-whisper-<size> (see download_model.py) are preferred
+- An LRU memory budget unloads the least recently used models
+- Safe to call from concurrent Streamlit sessions (threads)
+- faster_whisper (and ctranslate2) is imported on the first load, not with this module
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from final_project.config import (
+    WHISPER_MODEL_RULES,
+    WHISPER_MODELS_DIR,
+    WHISPER_COMPUTE_TYPE,
+    WHISPER_MODEL_MEMORY_MB,
+)
+
+if TYPE_CHECKING:
+    from faster_whisper import WhisperModel
+
+logger = logging.getLogger(__name__)
+
+# Rough in-memory footprint (MB, float16 weights) used when no local copy exists
+_APPROX_MODEL_MB = {
+    "tiny": 75,
+    "base": 145,
+    "small": 485,
+    "medium": 1530,
+    "large-v2": 3090,
+    "large-v3": 3090,
+}
+
+# Weight size relative to float16 for each compute type
+_COMPUTE_FACTOR = {"int8": 0.5, "int8_float16": 0.5, "int8_float32": 0.5,
+                   "float16": 1.0, "float32": 2.0}
+
+
+def local_model_dir(model_size: str) -> str:
+    """Returns the directory download_model.py uses for the given size."""
+    return os.path.join(WHISPER_MODELS_DIR, f"faster-whisper-{model_size}")
+
+
+def resolve_model_path(model_size: str) -> str:
+    """Uses the local copy if it was downloaded, otherwise the hub name."""
+    local_dir = local_model_dir(model_size)
+    if os.path.exists(os.path.join(local_dir, "model.bin")):
+        return local_dir
+    return model_size
+
+
+def installed_model_sizes() -> list:
+    """Lists the sizes found under the models/ directory."""
+    if not os.path.isdir(WHISPER_MODELS_DIR):
+        return []
+    prefix = "faster-whisper-"
+    return sorted(
+        name[len(prefix):] for name in os.listdir(WHISPER_MODELS_DIR)
+        if name.startswith(prefix) and os.path.exists(os.path.join(WHISPER_MODELS_DIR, name, "model.bin"))
+    )
+
+
+def estimate_model_mb(model_size: str, compute_type: str = WHISPER_COMPUTE_TYPE) -> float:
+    """Estimates the memory a loaded model takes, from its files on disk when available."""
+    local_dir = local_model_dir(model_size)
+    if os.path.isdir(local_dir):
+        size_mb = sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(local_dir) for f in files
+        ) / (1024 * 1024)
+    else:
+        size_mb = _APPROX_MODEL_MB.get(model_size, 1000)
+    return size_mb * _COMPUTE_FACTOR.get(compute_type, 1.0)
+
+
+class WhisperModelRegistry:
+    """
+    Thread-safe LRU cache of WhisperModel objects with a memory budget (MB).
+    A model that is evicted while a session still uses it stays alive until
+    that session drops its reference; only the registry forgets it.
+    """
+
+    def __init__(self, memory_budget_mb: float = WHISPER_MODEL_MEMORY_MB):
+        self.memory_budget_mb = memory_budget_mb
+        self._models = OrderedDict()        # key → (model, estimated MB)
+        self._lock = threading.Lock()
+        self._key_locks = {}                # key → lock held while that model loads
+
+    def get(self, model_size: str, compute_type: str = WHISPER_COMPUTE_TYPE,
+            cpu_threads: int = 0) -> "WhisperModel":
+        """Returns a loaded model, loading it on first use."""
+        key = (model_size, compute_type, cpu_threads)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given key; other keys load concurrently
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key][0]
+
+            logger.info(f"Loading Whisper model {key}")
+            from faster_whisper import WhisperModel     # ctranslate2 loads on first use
+            model = WhisperModel(
+                resolve_model_path(model_size),
+                device="cpu",
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+            )
+            size_mb = estimate_model_mb(model_size, compute_type)
+
+            with self._lock:
+                self._models[key] = (model, size_mb)
+                self._evict(keep=key)
+            return model
+
+    def _evict(self, keep: tuple) -> None:
+        """Unloads least recently used models until the budget is respected."""
+        while self.loaded_mb() > self.memory_budget_mb and len(self._models) > 1:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            self._models.pop(oldest)
+            logger.info(f"Unloaded Whisper model {oldest} (memory budget {self.memory_budget_mb} MB)")
+
+    def loaded_mb(self) -> float:
+        return sum(size_mb for _, size_mb in self._models.values())
+
+    def loaded_keys(self) -> list:
+        with self._lock:
+            return list(self._models)
+
+    def warm_up(self, sizes: list = None, compute_type: str = WHISPER_COMPUTE_TYPE) -> list:
+        """
+        Pre-loads models at startup. By default uses the sizes referenced in
+        WHISPER_MODEL_RULES plus any sizes found in the models/ directory,
+        and stops before exceeding the memory budget.
+        """
+        if sizes is None:
+            sizes = []
+            for size in [rule["model"] for rule in WHISPER_MODEL_RULES.values()] + installed_model_sizes():
+                if size not in sizes:
+                    sizes.append(size)
+
+        loaded = []
+        for size in sizes:
+            if (size, compute_type, 0) in self._models:
+                loaded.append(size)
+                continue
+            if self.loaded_mb() + estimate_model_mb(size, compute_type) > self.memory_budget_mb:
+                logger.info(f"Skipping warm-up of '{size}': memory budget reached")
+                continue
+            self.get(size, compute_type)
+            loaded.append(size)
+        return loaded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+# One registry per process
+_registry = WhisperModelRegistry()
+
+
+def get_registry() -> WhisperModelRegistry:
+    return _registry
+
+
+def get_whisper_model(model_size: str, compute_type: str = WHISPER_COMPUTE_TYPE,
+                      cpu_threads: int = 0) -> "WhisperModel":
+    """Shortcut for get_registry().get(...)."""
+    return _registry.get(model_size, compute_type, cpu_threads)
+
+
+def warm_up_models(sizes: list = None) -> list:
+    """Shortcut for get_registry().warm_up(...)."""
+    return _registry.warm_up(sizes)
@@ -0,0 +1,250 @@
+# final_project/numpy_vectorstore.py
+"""
+Lightweight vector store for one video: quantized, memory-mapped embeddings
+searched by brute force with NumPy.
+
+A directory holds:
+- vectors.f16 / vectors.i8 : unit-normalized vectors, one row per chunk
+- scales.f32               : per-row scale of the int8 rows (int8 only)
+- docs.jsonl               : id, text and metadata of each row
+- meta.json                : dtype, dimension, the number of committed rows
+                             and the length of their docs.jsonl lines
+
+A few thousand 1536-dim vectors take 3 KB (float16) or 1.5 KB (int8) each,
+and a top-k query is a handful of matrix-vector products, so there is no
+index to build or load.
+"""
+
+import os
+import json
+import uuid
+import logging
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from final_project.config import NUMPY_VECTOR_DTYPE
+
+logger = logging.getLogger(__name__)
+
+_DTYPES = {"float16": (np.float16, "vectors.f16"), "int8": (np.int8, "vectors.i8")}
+
+# Rows scored per matrix product; bounds the float32 copy of int8/float16 rows
+_BLOCK_ROWS = 4096
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize_int8(matrix: np.ndarray) -> tuple:
+    """Symmetric per-row int8 quantization; returns (int8 rows, float32 scales)."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    LangChain VectorStore over a directory of memory-mapped quantized vectors.
+    Scores are cosine similarities (higher is better). Appends are durable once
+    meta.json is rewritten, so an interrupted add leaves the store as it was.
+    """
+
+    def __init__(self, persist_directory: str, embedding, dtype: str = NUMPY_VECTOR_DTYPE):
+        self.persist_directory = persist_directory
+        self._embedding = embedding
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._scales = None
+        self.dim = None
+        self.count = 0
+        self._docs_bytes = None
+
+        meta = self.read_meta(persist_directory)
+        if meta:
+            dtype, self.dim, self.count = meta["dtype"], meta["dim"], meta["count"]
+            self._docs_bytes = meta.get("docs_bytes")     # missing in stores written before it was added
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}' (expected one of {list(_DTYPES)})")
+        self.dtype = dtype
+        self._vectors_path = os.path.join(persist_directory, _DTYPES[dtype][1])
+        self._scales_path = os.path.join(persist_directory, "scales.f32")
+        self._docs_path = os.path.join(persist_directory, "docs.jsonl")
+        self._docs = self._load_docs()
+
+    @staticmethod
+    def read_meta(persist_directory: str) -> dict:
+        path = os.path.join(persist_directory, "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def is_store(cls, persist_directory: str) -> bool:
+        return cls.read_meta(persist_directory) is not None
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def _load_docs(self) -> list:
+        """Reads the committed rows of docs.jsonl and sets _docs_bytes to their length."""
+        docs = []
+        if self.count and os.path.exists(self._docs_path):
+            with open(self._docs_path, "rb") as f:
+                if self._docs_bytes is not None:
+                    docs = [json.loads(line) for line in f.read(self._docs_bytes).splitlines(keepends=True)]
+                else:
+                    self._docs_bytes = 0
+                    for line in f:
+                        if len(docs) == self.count:
+                            break
+                        docs.append(json.loads(line))
+                        self._docs_bytes += len(line)
+        self._docs_bytes = self._docs_bytes or 0
+        return docs
+
+    def _write_meta(self) -> None:
+        tmp = os.path.join(self.persist_directory, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "dim": self.dim, "count": self.count, "docs_bytes": self._docs_bytes}, f)
+        os.replace(tmp, os.path.join(self.persist_directory, "meta.json"))
+
+    def _append(self, path: str, array: np.ndarray, row_bytes: int) -> None:
+        with open(path, "ab") as f:
+            f.seek(self.count * row_bytes)
+            f.truncate()                # drop rows of an interrupted append
+            array.tofile(f)
+
+    # ─────────────────────────── Writing ───────────────────────────
+    def add_embeddings(self, texts: list, vectors, metadatas: list = None, ids: list = None) -> list:
+        """Appends precomputed vectors (no embedding call)."""
+        texts = list(texts)
+        if not texts:
+            return []
+        matrix = _unit_rows(vectors)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+
+        with self._lock:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match the store ({self.dim})")
+
+            if self.dtype == "int8":
+                rows, scales = quantize_int8(matrix)
+                self._append(self._scales_path, scales, 4)
+            else:
+                rows = matrix.astype(np.float16)
+            self._append(self._vectors_path, rows, rows.itemsize * self.dim)
+
+            records = [{"id": i, "text": t, "metadata": m or {}} for i, t, m in zip(ids, texts, metadatas)]
+            data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+            with open(self._docs_path, "ab") as f:
+                f.truncate(self._docs_bytes)    # drop lines of an interrupted append
+                f.write(data)
+
+            self.count += len(records)
+            self._docs_bytes += len(data)
+            self._docs.extend(records)
+            self._write_meta()
+            self._matrix = None         # remap on the next query
+        return ids
+
+    def add_texts(self, texts, metadatas: list = None, *, ids: list = None, **kwargs) -> list:
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def persist(self) -> None:
+        """Every add is already on disk; kept for parity with Chroma."""
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas: list = None, *, persist_directory: str = None,
+                   dtype: str = NUMPY_VECTOR_DTYPE, ids: list = None, **kwargs) -> "NumpyVectorStore":
+        if persist_directory is None:
+            raise ValueError("NumpyVectorStore needs a persist_directory")
+        store = cls(persist_directory, embedding, dtype=dtype)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def rows(self, embeddings: bool = True) -> dict:
+        """All rows in Chroma's get() layout, with dequantized float32 embeddings unless embeddings=False."""
+        rows = {
+            "ids": [d["id"] for d in self._docs],
+            "documents": [d["text"] for d in self._docs],
+            "metadatas": [d["metadata"] for d in self._docs],
+        }
+        if embeddings:
+            matrix, scales = self._mapped()
+            vectors = np.zeros((0, self.dim or 0), dtype=np.float32) if matrix is None \
+                else np.asarray(matrix, dtype=np.float32)
+            if scales is not None:
+                vectors = vectors * scales[:, None]
+            rows["embeddings"] = vectors
+        return rows
+
+    # ─────────────────────────── Search ───────────────────────────
+    def _mapped(self) -> tuple:
+        with self._lock:
+            if self._matrix is None and self.count:
+                np_dtype = _DTYPES[self.dtype][0]
+                self._matrix = np.memmap(self._vectors_path, dtype=np_dtype, mode="r",
+                                         shape=(self.count, self.dim))
+                if self.dtype == "int8":
+                    self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(self.count,))
+            return self._matrix, self._scales
+
+    def _scores(self, vector) -> np.ndarray:
+        matrix, scales = self._mapped()
+        if matrix is None:
+            return np.zeros(0, dtype=np.float32)
+        query = _unit_rows([vector])[0]
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        if scales is not None:
+            scores *= scales
+        return scores
+
+    def _matches(self, metadata: dict, filter: dict) -> bool:
+        return all(metadata.get(k) == v for k, v in filter.items())
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter: dict = None) -> list:
+        scores = self._scores(embedding)
+        if filter:
+            mask = np.array([self._matches(d["metadata"], filter) for d in self._docs[:len(scores)]], dtype=bool)
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            (Document(page_content=self._docs[i]["text"], metadata=self._docs[i]["metadata"], id=self._docs[i]["id"]),
+             float(scores[i]))
+            for i in best
+        ]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter: dict = None, **kwargs) -> list:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: dict = None, **kwargs) -> list:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None, **kwargs) -> list:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] → relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
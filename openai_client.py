@@ -0,0 +1,488 @@
+# final_project/openai_client.py
+"""
+One OpenAI client layer per process, shared by summarization, the QA agent,
+the embeddings and the app.
+
+Every request goes through _LimitedTransport (an httpx transport), so the
+LangChain wrappers and the openai SDK need no changes besides their http client:
+- pooled connections (OPENAI_MAX_CONNECTIONS)
+- per-model token buckets on requests and tokens per minute; a 429 pauses
+  the model's buckets for every caller, not only the one that got it
+- full-jitter exponential backoff on 429, 5xx and connection errors
+  (insufficient_quota is returned at once, retrying cannot fix it)
+- identical requests in flight are sent once, the others get a copy
+- counters in get_metrics()
+
+chat_model() / embeddings_model() / get_openai_client() build the clients;
+base_url points them at another server (e.g. the mock in benchmark.py).
+The openai SDK and langchain_openai are imported when the first client is built.
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+import httpx
+
+from final_project.config import (
+    OPENAI_MODEL_NAME,
+    EMBEDDING_MODEL_NAME,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_TIMEOUT_SEC,
+    OPENAI_REQUESTS_PER_MINUTE,
+    OPENAI_TOKENS_PER_MINUTE,
+    OPENAI_RATE_LIMITS,
+    OPENAI_MAX_RETRIES,
+    OPENAI_BACKOFF_BASE_SEC,
+    OPENAI_BACKOFF_MAX_SEC,
+    OPENAI_COALESCE_REQUESTS,
+)
+from final_project.telemetry import register_counters
+
+if TYPE_CHECKING:
+    import openai
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+logger = logging.getLogger(__name__)
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Completion tokens assumed when the request sets no max_tokens
+_DEFAULT_COMPLETION_TOKENS = 256
+
+
+# ─────────────────────────── Rate limiting ───────────────────────────
+class TokenBucket:
+    """
+    Refills per_minute units per minute, up to per_minute. reserve() takes the
+    units at once (the level may go negative) and returns how long the caller
+    has to wait for them, so sync and async callers can share one bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, n: float = 1) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= min(n, self.capacity)
+            return max(0.0, -self.level / self.rate, self.paused_until - now)
+
+    def refund(self, n: float) -> None:
+        """Gives back (or, if negative, takes) units once the real cost is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + n)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """A requests bucket and a tokens bucket per model."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def buckets(self, model: str) -> tuple:
+        with self._lock:
+            if model not in self._buckets:
+                rpm, tpm = OPENAI_RATE_LIMITS.get(model, (OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE))
+                self._buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+            return self._buckets[model]
+
+    def configure(self, model: str, requests_per_minute: float, tokens_per_minute: float) -> None:
+        with self._lock:
+            self._buckets[model] = (TokenBucket(requests_per_minute), TokenBucket(tokens_per_minute))
+
+    def reserve(self, model: str, tokens: int) -> float:
+        requests, token_bucket = self.buckets(model)
+        return max(requests.reserve(1), token_bucket.reserve(tokens))
+
+    def settle(self, model: str, estimated: int, used: int) -> None:
+        self.buckets(model)[1].refund(estimated - used)
+
+    def pause(self, model: str, seconds: float) -> None:
+        for bucket in self.buckets(model):
+            bucket.pause(seconds)
+
+
+# ─────────────────────────── Metrics ───────────────────────────
+class ClientMetrics:
+    """Thread-safe counters of the client layer."""
+
+    _FIELDS = ("requests", "attempts", "retries", "rate_limited", "quota_errors", "errors",
+               "coalesced", "tokens_estimated", "tokens_used", "throttle_sec", "backoff_sec", "latency_sec")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = dict.fromkeys(self._FIELDS, 0)
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self._counts[name] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        sent = counts["attempts"]
+        counts["mean_latency_sec"] = counts["latency_sec"] / sent if sent else 0.0
+        return counts
+
+
+_limiter = RateLimiter()
+metrics = ClientMetrics()
+
+
+def set_rate_limit(model: str, requests_per_minute: float, tokens_per_minute: float) -> None:
+    """Replaces the buckets of one model (OPENAI_RATE_LIMITS is read once per model)."""
+    _limiter.configure(model, requests_per_minute, tokens_per_minute)
+
+
+def get_metrics() -> dict:
+    return metrics.snapshot()
+
+
+def reset_metrics() -> None:
+    metrics.reset()
+
+
+register_counters("openai", get_metrics)
+
+
+# ─────────────────────────── Request helpers ───────────────────────────
+def _parse_body(body: bytes) -> dict:
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _estimate_tokens(payload: dict) -> int:
+    """Rough cost of a request before it is sent (4 characters per token)."""
+    if "messages" in payload:
+        chars = sum(len(str(m.get("content") or "")) for m in payload["messages"])
+        completion = payload.get("max_tokens") or payload.get("max_completion_tokens") or _DEFAULT_COMPLETION_TOKENS
+        return chars // 4 + completion
+    inputs = payload.get("input") or payload.get("prompt") or ""
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    # Token ids (as sent by OpenAIEmbeddings) count as they are
+    return sum(len(i) // 4 if isinstance(i, str) else len(i) for i in inputs)
+
+
+def _coalesce_key(request: httpx.Request, body: bytes, payload: dict) -> str:
+    if not OPENAI_COALESCE_REQUESTS or request.method != "POST" or payload.get("stream"):
+        return None
+    return hashlib.sha256(f"{request.url}\0".encode("utf-8") + body).hexdigest()
+
+
+def _error_code(response: httpx.Response) -> str:
+    error = _parse_body(response.content).get("error")
+    return error.get("code") if isinstance(error, dict) else None
+
+
+def _retry_after(response: httpx.Response) -> float:
+    headers = response.headers if response is not None else {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+def _backoff(attempt: int, response: httpx.Response = None) -> float:
+    """Full jitter, never shorter than the server's retry-after."""
+    delay = random.uniform(0, min(OPENAI_BACKOFF_MAX_SEC, OPENAI_BACKOFF_BASE_SEC * 2 ** attempt))
+    return max(delay, _retry_after(response))
+
+
+def _replay(request: httpx.Request, response: httpx.Response) -> httpx.Response:
+    """A copy of a finished response for a coalesced request (the content is already decoded)."""
+    headers = [(k, v) for k, v in response.headers.multi_items()
+               if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+    return httpx.Response(response.status_code, headers=headers, content=response.content, request=request)
+
+
+# ─────────────────────────── Transport ───────────────────────────
+class _Call:
+    """Bookkeeping of one logical request: decides after each attempt whether to retry."""
+
+    def __init__(self, request: httpx.Request, payload: dict):
+        self.request = request
+        self.model = payload.get("model") or "unknown"
+        self.estimated = _estimate_tokens(payload)
+        self.stream = bool(payload.get("stream"))
+        self.attempt = 0
+        metrics.add(requests=1, tokens_estimated=self.estimated)
+
+    def throttle(self) -> float:
+        wait = _limiter.reserve(self.model, self.estimated)
+        metrics.add(throttle_sec=wait, attempts=1)
+        return wait
+
+    def failed(self, error: Exception) -> float:
+        """Connection error: returns the backoff delay, or raises once retries are used up."""
+        _limiter.settle(self.model, self.estimated, 0)
+        if self.attempt >= OPENAI_MAX_RETRIES:
+            metrics.add(errors=1)
+            raise error
+        return self._next(None)
+
+    def finished(self, response: httpx.Response, latency: float) -> float:
+        """Returns the backoff delay before the next attempt, or None when the response is final."""
+        metrics.add(latency_sec=latency)
+        if response.status_code not in _RETRY_STATUS:
+            usage = None if self.stream else _parse_body(response.content).get("usage")
+            used = usage.get("total_tokens", self.estimated) if isinstance(usage, dict) else self.estimated
+            _limiter.settle(self.model, self.estimated, used)
+            metrics.add(tokens_used=used, errors=int(response.status_code >= 400))
+            return None
+
+        _limiter.settle(self.model, self.estimated, 0)
+        if response.status_code == 429:
+            if _error_code(response) == "insufficient_quota":
+                metrics.add(quota_errors=1, errors=1)
+                return None
+            metrics.add(rate_limited=1)
+            _limiter.pause(self.model, _retry_after(response))
+        if self.attempt >= OPENAI_MAX_RETRIES:
+            logger.warning(f"OpenAI {self.request.url.path} still {response.status_code} "
+                           f"after {self.attempt} retries")
+            metrics.add(errors=1)
+            return None
+        return self._next(response)
+
+    def _next(self, response: httpx.Response) -> float:
+        delay = _backoff(self.attempt, response)
+        self.attempt += 1
+        metrics.add(retries=1, backoff_sec=delay)
+        return delay
+
+
+class _Inflight:
+    """Identical requests in flight: the first one sends, the others wait for its response."""
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: str) -> tuple:
+        """Returns (future, True if the caller must send the request)."""
+        with self._lock:
+            if key in self._futures:
+                metrics.add(coalesced=1)
+                return self._futures[key], False
+            self._futures[key] = Future()
+            return self._futures[key], True
+
+    def leave(self, key: str) -> None:
+        with self._lock:
+            self._futures.pop(key, None)
+
+
+_inflight = _Inflight()
+
+
+class _LimitedTransport(httpx.BaseTransport):
+    def __init__(self, inner: httpx.BaseTransport):
+        self._inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        payload = _parse_body(body)
+        key = _coalesce_key(request, body, payload)
+        if key is None:
+            return self._send(request, payload)
+
+        future, leader = _inflight.join(key)
+        if not leader:
+            return _replay(request, future.result())
+        try:
+            response = self._send(request, payload)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            _inflight.leave(key)
+
+    def _send(self, request: httpx.Request, payload: dict) -> httpx.Response:
+        call = _Call(request, payload)
+        while True:
+            time.sleep(call.throttle())
+            t0 = time.perf_counter()
+            try:
+                response = self._inner.handle_request(request)
+                if not call.stream or response.status_code in _RETRY_STATUS:
+                    response.read()
+            except httpx.TransportError as e:
+                delay = call.failed(e)
+            else:
+                delay = call.finished(response, time.perf_counter() - t0)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class _AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        payload = _parse_body(body)
+        key = _coalesce_key(request, body, payload)
+        if key is None:
+            return await self._send(request, payload)
+
+        future, leader = _inflight.join(key)
+        if not leader:
+            # The leader may run on another thread's event loop
+            return _replay(request, await asyncio.wrap_future(future))
+        try:
+            response = await self._send(request, payload)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            _inflight.leave(key)
+
+    async def _send(self, request: httpx.Request, payload: dict) -> httpx.Response:
+        call = _Call(request, payload)
+        while True:
+            await asyncio.sleep(call.throttle())
+            t0 = time.perf_counter()
+            try:
+                response = await self._inner.handle_async_request(request)
+                if not call.stream or response.status_code in _RETRY_STATUS:
+                    await response.aread()
+            except httpx.TransportError as e:
+                delay = call.failed(e)
+            else:
+                delay = call.finished(response, time.perf_counter() - t0)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+# ─────────────────────────── Clients ───────────────────────────
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS)
+
+
+_sync_client = None
+_sync_lock = threading.Lock()
+
+
+def http_client() -> httpx.Client:
+    """The pooled, rate-limited httpx client shared by the whole process."""
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is None:
+            _sync_client = httpx.Client(
+                transport=_LimitedTransport(httpx.HTTPTransport(limits=_limits())),
+                timeout=OPENAI_TIMEOUT_SEC,
+            )
+        return _sync_client
+
+
+def async_http_client() -> httpx.AsyncClient:
+    """
+    A new rate-limited async client. Its connections belong to the event loop
+    that first uses it, so open and close it inside that loop:
+    async with async_http_client() as client: ...
+    The buckets, retries and coalescing are shared with every other client.
+    """
+    return httpx.AsyncClient(
+        transport=_AsyncLimitedTransport(httpx.AsyncHTTPTransport(limits=_limits())),
+        timeout=OPENAI_TIMEOUT_SEC,
+    )
+
+
+def _client_kwargs(base_url: str = None) -> dict:
+    # Retries happen in the transport, where the rate limiter sees them
+    kwargs = {"http_client": http_client(), "max_retries": 0}
+    if base_url:
+        kwargs["base_url"] = base_url
+    return kwargs
+
+
+def chat_model(model_name: str = None, base_url: str = None, **kwargs) -> "ChatOpenAI":
+    """
+    ChatOpenAI on the shared client. For ainvoke, pass http_async_client=
+    an async_http_client() that the caller closes when its event loop is done.
+    """
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=model_name or OPENAI_MODEL_NAME, **_client_kwargs(base_url), **kwargs)
+
+
+def embeddings_model(model: str = EMBEDDING_MODEL_NAME, base_url: str = None, **kwargs) -> "OpenAIEmbeddings":
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model, **_client_kwargs(base_url), **kwargs)
+
+
+def get_openai_client(base_url: str = None, **kwargs) -> "openai.OpenAI":
+    """Plain openai SDK client on the shared connection pool."""
+    import openai
+    return openai.OpenAI(**_client_kwargs(base_url), **kwargs)
+
+
+# ─────────────────────────── Errors ───────────────────────────
+def _error_chain(error: BaseException):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for a 429 (rate limit or insufficient_quota) left after the retries, even if wrapped."""
+    openai = sys.modules.get("openai")      # no SDK error can exist before the SDK is loaded
+    return any(
+        (openai is not None and isinstance(e, openai.RateLimitError)) or getattr(e, "status_code", None) == 429
+        for e in _error_chain(error)
+    )
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """True when the account is out of quota (no retry can help)."""
+    return any(getattr(e, "code", None) == "insufficient_quota" for e in _error_chain(error))
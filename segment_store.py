@@ -0,0 +1,120 @@
+# final_project/segment_store.py
+"""
+Timestamped transcript segments, stored column-wise in cache/segments/<key>/:
+- starts.npy / ends.npy : float32 segment times in seconds
+- offsets.npy           : int64 byte offsets into text.bin (one more than segments)
+- text.bin              : the UTF-8 segment texts, concatenated
+
+Every file is memory-mapped on load. The transcript text and the chunks
+(text_processing.chunk_segments) are derived from it, so changing
+CHUNK_SIZE / CHUNK_OVERLAP only needs a re-embedding, not a new transcription.
+"""
+
+import os
+import mmap
+import shutil
+import logging
+
+import numpy as np
+
+from final_project.cache_utils import artifact_path, get_cache_manager
+from final_project.text_processing import chunk_segments, split_text
+
+logger = logging.getLogger(__name__)
+
+
+class Segments:
+    """Read-only view of a segment store; iterating yields (start, end, text)."""
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, offsets: np.ndarray, blob):
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self._blob = blob
+
+    @classmethod
+    def from_list(cls, segments: list) -> "Segments":
+        encoded = [text.strip().encode("utf-8") for _, _, text in segments]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(
+            np.array([s for s, _, _ in segments], dtype=np.float32),
+            np.array([e for _, e, _ in segments], dtype=np.float32),
+            offsets,
+            b"".join(encoded),
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def text(self, i: int) -> str:
+        return bytes(self._blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield float(self.starts[i]), float(self.ends[i]), self.text(i)
+
+    def full_text(self) -> str:
+        return " ".join(text for _, _, text in self)
+
+    @property
+    def duration(self) -> float:
+        return float(self.ends[-1]) if len(self) else 0.0
+
+
+def write_segments(path: str, segments: list) -> None:
+    """Writes the store next to path first, then swaps it in."""
+    data = Segments.from_list(segments)
+    tmp = f"{path}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "starts.npy"), data.starts)
+    np.save(os.path.join(tmp, "ends.npy"), data.ends)
+    np.save(os.path.join(tmp, "offsets.npy"), data.offsets)
+    with open(os.path.join(tmp, "text.bin"), "wb") as f:
+        f.write(data._blob)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def read_segments(path: str) -> Segments:
+    """Memory-maps a store written by write_segments; None if there is none."""
+    if not os.path.exists(os.path.join(path, "offsets.npy")):
+        return None
+    offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+    if len(offsets) <= 1:
+        return Segments.from_list([])
+    blob = b""
+    if offsets[-1]:             # an empty file cannot be mapped
+        with open(os.path.join(path, "text.bin"), "rb") as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Segments(
+        np.load(os.path.join(path, "starts.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "ends.npy"), mmap_mode="r"),
+        offsets,
+        blob,
+    )
+
+
+def save_segments(key: str, segments: list) -> None:
+    manager = get_cache_manager()
+    with manager.lock(key):
+        write_segments(artifact_path(key, "segments"), segments)
+        manager.register(key, "segments")
+    logger.info(f"Saved {len(segments)} segments for {key}")
+
+
+def load_segments(key: str) -> Segments:
+    path = get_cache_manager().get_path(key, "segments")
+    return read_segments(path) if path else None
+
+
+def video_documents(key: str, transcript: str = None) -> list:
+    """
+    The chunks of a video: segment-aligned with time metadata when its segments
+    are stored, plain split_text chunks of the transcript otherwise (older caches).
+    """
+    segments = load_segments(key)
+    if segments is not None and len(segments):
+        return chunk_segments(segments)
+    return split_text(transcript) if transcript else []
@@ -1,35 +1,183 @@
 # final_project/summarization.py
 
-from langchain_community.chat_models import ChatOpenAI
+import os
+import re
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import tiktoken
 from langchain.prompts import PromptTemplate
-from final_project.config import OPENAI_MODEL_NAME
-import streamlit as st
+from final_project.openai_client import chat_model, async_http_client
+from final_project.telemetry import timed
+from final_project.cache_utils import SHARED_KEY, get_cache_manager
+from final_project.config import (
+    OPENAI_MODEL_NAME,
+    SUMMARY_SINGLE_CALL_MAX_TOKENS,
+    SUMMARY_WINDOW_TOKENS,
+    SUMMARY_REDUCE_FAN_IN,
+    SUMMARY_MAX_CONCURRENCY,
+    SUMMARY_PARTIALS_DIR,
+)
+
+_SUMMARY_PROMPT = "Summarize the following text in a short paragraph:\n\n{text}"
+_MAP_PROMPT = (
+    "The following text is one part of a longer video transcript. "
+    "Summarize it in a short paragraph, keeping names, numbers and key facts:\n\n{text}"
+)
+_REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of one video transcript. "
+    "Combine them into a single short paragraph:\n\n{text}"
+)
+
+
+def _encoding(model_name: str):
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _split_by_tokens(text: str, max_tokens: int, model_name: str) -> list:
+    """
+    Splits text into windows of at most max_tokens tokens,
+    cutting at sentence boundaries whenever possible.
+    """
+    enc = _encoding(model_name)
+    windows, current, current_tokens = [], [], 0
+
+    for sentence in re.split(r"(?<=[.!?])\s+|\n+", text):
+        if not sentence.strip():
+            continue
+        tokens = enc.encode(sentence)
+        # A single oversized "sentence" (no punctuation) is cut by tokens
+        pieces = [tokens[i:i + max_tokens] for i in range(0, len(tokens), max_tokens)]
+        for piece_tokens in pieces:
+            piece = sentence if len(pieces) == 1 else enc.decode(piece_tokens)
+            n = len(piece_tokens)
+            if current and current_tokens + n > max_tokens:
+                windows.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += n
 
+    if current:
+        windows.append(" ".join(current))
+    return windows
+
+
+def _response_text(response) -> str:
+    if hasattr(response, "content"):
+        return response.content
+    elif isinstance(response, dict) and "content" in response:
+        return response["content"]
+    else:
+        return str(response)
+
+
+def _partial_path(model_name: str, prompt: str, text: str) -> str:
+    digest = hashlib.sha256(f"{model_name}\0{prompt}\0{text}".encode("utf-8")).hexdigest()
+    return os.path.join(SUMMARY_PARTIALS_DIR, f"{digest}.txt")
+
+
+async def _cached_summarize(chain, prompt: str, text: str, model_name: str,
+                            semaphore: asyncio.Semaphore) -> str:
+    """
+    Summarizes one window, reusing a cached partial summary when it exists,
+    so a retry after a 429 only repeats the windows that did not finish.
+    """
+    path = _partial_path(model_name, prompt, text)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:           # not summarized yet, or evicted
+        pass
+
+    async with semaphore:
+        response = await chain.ainvoke({"text": text})
+    summary = _response_text(response)
+
+    # Eviction skips locked keys, so the directory cannot vanish between makedirs and replace
+    with get_cache_manager().lock(SHARED_KEY):
+        os.makedirs(SUMMARY_PARTIALS_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(summary)
+        os.replace(tmp_path, path)
+    return summary
+
+
+async def _gather_all(coros) -> list:
+    """Like asyncio.gather, but lets every call finish (and be cached) before raising."""
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def _map_reduce_summary(text: str, model_name: str) -> str:
+    """
+    Summarizes token-bounded windows concurrently (map), then merges the
+    partial summaries in a tree, SUMMARY_REDUCE_FAN_IN at a time, until one is left.
+    """
+    # The async client lives as long as this event loop (one per summary), so it is closed here
+    async with async_http_client() as client:
+        llm = chat_model(model_name, http_async_client=client)
+        map_chain = PromptTemplate.from_template(_MAP_PROMPT) | llm
+        reduce_chain = PromptTemplate.from_template(_REDUCE_PROMPT) | llm
+        semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+
+        windows = _split_by_tokens(text, SUMMARY_WINDOW_TOKENS, model_name)
+        partials = await _gather_all(
+            _cached_summarize(map_chain, _MAP_PROMPT, w, model_name, semaphore) for w in windows
+        )
+
+        while len(partials) > 1:
+            groups = [
+                "\n\n".join(partials[i:i + SUMMARY_REDUCE_FAN_IN])
+                for i in range(0, len(partials), SUMMARY_REDUCE_FAN_IN)
+            ]
+            partials = await _gather_all(
+                _cached_summarize(reduce_chain, _REDUCE_PROMPT, g, model_name, semaphore) for g in groups
+            )
+
+        return partials[0] if partials else ""
+
+
+def _run_coroutine(coro):
+    """Runs a coroutine to completion, even if the calling thread already has a running loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+@timed("summarize")
 def generate_summary(text: str, model_name: str = None) -> str:
     """
     Generates a summary of the given text using a GPT model.
     You can manually pass a model_name or use the default from config.
+    Short texts use a single prompt; longer ones are summarized with a
+    concurrent map-reduce over token-bounded windows.
+    Rate limits are retried by the client layer; a 429 that is left
+    (see openai_client.is_rate_limit_error) is raised to the caller.
     """
     model_to_use = model_name or OPENAI_MODEL_NAME
-    summarizer = ChatOpenAI(model_name=model_to_use)
 
-    prompt = PromptTemplate.from_template(
-        "Summarize the following text in a short paragraph:\n\n{text}"
-    )
+    if len(_encoding(model_to_use).encode(text)) > SUMMARY_SINGLE_CALL_MAX_TOKENS:
+        try:
+            return _run_coroutine(_map_reduce_summary(text, model_to_use))
+        finally:
+            # The partial summaries count against the cache budget like every other artifact
+            if os.path.isdir(SUMMARY_PARTIALS_DIR):
+                get_cache_manager().register(SHARED_KEY, "summary_partials", SUMMARY_PARTIALS_DIR)
+
+    summarizer = chat_model(model_to_use)
+    prompt = PromptTemplate.from_template(_SUMMARY_PROMPT)
     summary_chain = prompt | summarizer
 
-    try:
-        response = summary_chain.invoke({"text": text})
-        if hasattr(response, "content"):
-            return response.content
-        elif isinstance(response, dict) and "content" in response:
-            return response["content"]
-        else:
-            return str(response)
-
-    except Exception as e:
-        # If the error has http_status = 429, show a friendly message
-        if getattr(e, "http_status", None) == 429:
-            st.error("Sorry, you have exceeded the OpenAI usage limit. Summary generation is temporarily unavailable.")
-            return "—"
-        raise
+    response = summary_chain.invoke({"text": text})
+    return _response_text(response)
@@ -0,0 +1,312 @@
+# final_project/telemetry.py
+"""
+Stage timings, a structured event log and a local metrics dump.
+
+- span("transcribe", key=...) / @timed("transcribe"): wall time, CPU time and
+  RSS of one pipeline stage. Nested spans name their parent, and the key given
+  to the outermost span is repeated as "trace" on every span inside it.
+  cpu_sec is process-wide: it includes the stage's own worker threads (e.g.
+  CTranslate2's) but also whatever other sessions ran meanwhile; thread_cpu_sec
+  (event log only) is the calling thread alone
+- @flushed: writes the queued events when the function returns, for functions
+  run in pool worker processes (they exit without running atexit handlers)
+- log_event(kind, **fields): one JSON object per line in TELEMETRY_EVENTS_PATH.
+  Events are queued and written in batches by a background thread, so callers
+  never wait for the disk
+- stage_stats(): per-stage count, percentiles, CPU and memory since start / reset_stats()
+- write_prometheus(): per-stage histograms and counters in Prometheus text format
+  at TELEMETRY_METRICS_PATH (rewritten on every flush; skipped in worker processes).
+  Other modules add their counters with register_counters()
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import functools
+import threading
+import contextvars
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+
+from final_project.config import (
+    TELEMETRY_ENABLED,
+    TELEMETRY_EVENTS_PATH,
+    TELEMETRY_METRICS_PATH,
+    TELEMETRY_FLUSH_SEC,
+    TELEMETRY_MAX_QUEUED_EVENTS,
+    TELEMETRY_DURATION_BUCKETS,
+)
+
+try:
+    import resource
+except ImportError:              # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = "ytqa"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Durations kept per stage for the percentiles in stage_stats()
+_RECENT_DURATIONS = 1000
+
+# (stage, trace) of the innermost open span
+_current = contextvars.ContextVar("telemetry_span", default=(None, None))
+
+
+# ─────────────────────────── Memory ───────────────────────────
+def rss_bytes() -> int:
+    """Resident set size of this process (0 where /proc is not available)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def max_rss_bytes() -> int:
+    """High-water mark of the RSS of this process."""
+    if resource is None:
+        return rss_bytes()
+    return max(rss_bytes(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)    # kB on Linux
+
+
+# ─────────────────────────── Stage statistics ───────────────────────────
+class _StageStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_sec = 0.0
+        self.cpu_sec = 0.0
+        self.max_rss = 0
+        self.buckets = [0] * len(TELEMETRY_DURATION_BUCKETS)
+        self.recent = deque(maxlen=_RECENT_DURATIONS)
+
+    def add(self, duration: float, cpu: float, rss: int, failed: bool) -> None:
+        self.count += 1
+        self.errors += failed
+        self.total_sec += duration
+        self.cpu_sec += cpu
+        self.max_rss = max(self.max_rss, rss)
+        self.recent.append(duration)
+        for i, bound in enumerate(TELEMETRY_DURATION_BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+
+
+_stages = {}
+_stages_lock = threading.Lock()
+_counters = {}                   # prefix → callable returning {name: number}
+
+
+def _record(stage: str, duration: float, cpu: float, rss: int, failed: bool) -> None:
+    with _stages_lock:
+        _stages.setdefault(stage, _StageStats()).add(duration, cpu, rss, failed)
+
+
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def stage_stats() -> dict:
+    """{stage: {count, errors, total_sec, p50_sec, p95_sec, max_sec, cpu_sec, max_rss_mb}}"""
+    with _stages_lock:
+        return {
+            stage: {
+                "count": s.count,
+                "errors": s.errors,
+                "total_sec": s.total_sec,
+                "p50_sec": _percentile(s.recent, 50),
+                "p95_sec": _percentile(s.recent, 95),
+                "max_sec": max(s.recent, default=0.0),
+                "cpu_sec": s.cpu_sec,
+                "max_rss_mb": s.max_rss / 2**20,
+            }
+            for stage, s in _stages.items()
+        }
+
+
+def reset_stats() -> None:
+    with _stages_lock:
+        _stages.clear()
+
+
+def register_counters(prefix: str, collect) -> None:
+    """collect() → {name: number}; dumped as <ytqa>_<prefix>_<name> by write_prometheus."""
+    _counters[prefix] = collect
+
+
+# ─────────────────────────── Spans ───────────────────────────
+@contextmanager
+def span(stage: str, **fields):
+    """
+    Times the block as one run of stage. Yields the fields dict, so the block
+    can add results to the event (e.g. s["chunks"] = len(docs)).
+    """
+    if not TELEMETRY_ENABLED:
+        yield fields
+        return
+    parent, trace = _current.get()
+    trace = fields.get("key", trace)
+    token = _current.set((stage, trace))
+    rss_before = rss_bytes()
+    cpu_before = time.process_time()
+    thread_cpu_before = time.thread_time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        cpu = time.process_time() - cpu_before
+        thread_cpu = time.thread_time() - thread_cpu_before
+        rss = rss_bytes()
+        _current.reset(token)
+        _record(stage, duration, cpu, rss, error is not None)
+        log_event(
+            "span", stage=stage, parent=parent, trace=trace,
+            duration_sec=round(duration, 4), cpu_sec=round(cpu, 4), thread_cpu_sec=round(thread_cpu, 4),
+            rss_mb=round(rss / 2**20, 1), rss_delta_mb=round((rss - rss_before) / 2**20, 1),
+            max_rss_mb=round(max_rss_bytes() / 2**20, 1), error=error, **fields,
+        )
+
+
+def timed(stage: str):
+    """Decorator form of span(stage)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def flushed(fn):
+    """
+    Flushes the queued events when fn returns. Pool worker processes end with
+    os._exit, so without it the events of their last TELEMETRY_FLUSH_SEC are lost.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            flush()
+    return wrapper
+
+
+# ─────────────────────────── Event log ───────────────────────────
+class _EventWriter:
+    """Drains the event queue into the JSON lines file every TELEMETRY_FLUSH_SEC."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=TELEMETRY_MAX_QUEUED_EVENTS)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="telemetry", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(TELEMETRY_FLUSH_SEC)
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            events = []
+            while True:
+                try:
+                    events.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if events:
+                    os.makedirs(os.path.dirname(TELEMETRY_EVENTS_PATH) or ".", exist_ok=True)
+                    with open(TELEMETRY_EVENTS_PATH, "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in events))
+                if multiprocessing.parent_process() is None:
+                    write_prometheus()
+            except OSError as e:
+                logger.warning(f"Could not write telemetry: {e}")
+
+
+_writer = _EventWriter()
+
+
+def log_event(kind: str, **fields) -> None:
+    """Queues one structured event for TELEMETRY_EVENTS_PATH."""
+    if TELEMETRY_ENABLED:
+        _writer.put({"ts": round(time.time(), 3), "event": kind, "pid": os.getpid(), **fields})
+
+
+def flush() -> None:
+    """Writes the queued events and the metrics file now."""
+    _writer.flush()
+
+
+# ─────────────────────────── Prometheus text dump ───────────────────────────
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text() -> str:
+    name = f"{_PREFIX}_stage_duration_seconds"
+    lines = [f"# HELP {name} Wall time of the pipeline stages.", f"# TYPE {name} histogram"]
+    with _stages_lock:
+        stages = sorted(_stages.items())
+        for stage, s in stages:
+            label = f'stage="{_label(stage)}"'
+            for bound, n in zip(TELEMETRY_DURATION_BUCKETS, s.buckets):
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {n}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {s.count}')
+            lines.append(f"{name}_sum{{{label}}} {s.total_sec:.6f}")
+            lines.append(f"{name}_count{{{label}}} {s.count}")
+
+        for metric, kind, help_text, value in (
+            ("stage_cpu_seconds_total", "counter", "Process-wide CPU time while each stage ran.", lambda s: f"{s.cpu_sec:.6f}"),
+            ("stage_errors_total", "counter", "Stage runs that raised.", lambda s: s.errors),
+            ("stage_max_rss_bytes", "gauge", "Largest RSS seen at the end of a stage.", lambda s: s.max_rss),
+        ):
+            lines += [f"# HELP {_PREFIX}_{metric} {help_text}", f"# TYPE {_PREFIX}_{metric} {kind}"]
+            lines += [f'{_PREFIX}_{metric}{{stage="{_label(stage)}"}} {value(s)}' for stage, s in stages]
+
+    lines += [
+        f"# TYPE {_PREFIX}_process_max_rss_bytes gauge", f"{_PREFIX}_process_max_rss_bytes {max_rss_bytes()}",
+        f"# TYPE {_PREFIX}_events_dropped_total counter", f"{_PREFIX}_events_dropped_total {_writer.dropped}",
+    ]
+    for prefix, collect in sorted(_counters.items()):
+        try:
+            values = collect()
+        except Exception as e:
+            logger.warning(f"Telemetry counters '{prefix}' failed: {e}")
+            continue
+        lines += [f"{_PREFIX}_{prefix}_{k} {v}" for k, v in sorted(values.items()) if isinstance(v, (int, float))]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str = TELEMETRY_METRICS_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
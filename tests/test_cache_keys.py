@@ -0,0 +1,117 @@
+# final_project/tests/test_cache_keys.py
+"""Canonical video IDs, cache keys and the migration of raw-URL keys."""
+
+import os
+
+import pytest
+
+from final_project import cache_utils
+from final_project.cache_utils import (
+    extract_video_id,
+    generate_cache_key,
+    legacy_cache_key,
+    load_cache,
+)
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+SAME_VIDEO_URLS = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "http://youtube.com/watch?v=dQw4w9WgXcQ",
+    "www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "  https://www.youtube.com/watch?v=dQw4w9WgXcQ\n",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?si=AbCdEf123&t=42",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ?autoplay=1",
+    "https://www.youtube.com/live/dQw4w9WgXcQ?feature=share",
+    "https://www.youtube.com/v/dQw4w9WgXcQ",
+    "https://m.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://music.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+    "https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL590L5WQmH8fJ54F369BLDSqIwcs-TCfs&index=3&t=1m2s",
+    "https://www.youtube.com/watch?feature=youtu.be&v=dQw4w9WgXcQ",
+    "https://www.youtube.com/attribution_link?a=xyz&u=%2Fwatch%3Fv%3DdQw4w9WgXcQ%26feature%3Dshare",
+    "dQw4w9WgXcQ",
+]
+
+NO_VIDEO_URLS = [
+    "https://www.youtube.com/playlist?list=PL590L5WQmH8fJ54F369BLDSqIwcs-TCfs",
+    "https://www.youtube.com/@channel",
+    "https://www.youtube.com/watch?v=tooshort",
+    "https://youtu.be/",
+    "https://example.com/watch?v=dQw4w9WgXcQ",
+    "https://notyoutube.com/watch?v=dQw4w9WgXcQ",
+    "not a url",
+]
+
+
+@pytest.mark.parametrize("url", SAME_VIDEO_URLS)
+def test_extract_video_id(url):
+    assert extract_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize("url", NO_VIDEO_URLS)
+def test_no_video_id(url):
+    assert extract_video_id(url) is None
+
+
+def test_every_url_form_shares_one_key():
+    keys = {generate_cache_key(url) for url in SAME_VIDEO_URLS}
+    assert len(keys) == 1
+    assert len(keys.pop()) == 16
+
+
+def test_ids_differing_in_case_get_different_keys():
+    assert generate_cache_key("dQw4w9WgXcQ") != generate_cache_key("dqw4w9wgxcq")
+
+
+def test_non_youtube_urls_fall_back_to_the_url():
+    a, b = "https://example.com/a.mp4", "https://example.com/b.mp4"
+    assert generate_cache_key(a) != generate_cache_key(b)
+    assert generate_cache_key(f" {a} ") == generate_cache_key(a)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """A fresh cache/ under tmp_path with its own CacheManager."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache_utils, "_manager", None)
+    return tmp_path
+
+
+def test_entry_under_a_raw_url_key_is_migrated(cache_dir):
+    url = "https://youtu.be/dQw4w9WgXcQ?t=10"
+    old_key, new_key = legacy_cache_key(url), generate_cache_key(url)
+    manager = cache_utils.get_cache_manager()
+    manager.write_text(old_key, "transcript", "the transcript")
+    manager.write_text(old_key, "summary", "the summary")
+    old_vs = cache_utils.artifact_path(old_key, "vectorstore")
+    os.makedirs(old_vs)
+    with open(os.path.join(old_vs, "chroma.sqlite3"), "w") as f:
+        f.write("x")
+    manager.register(old_key, "vectorstore", old_vs)
+    manager.set_meta(old_key, "transcript_source", "whisper:base")
+
+    assert load_cache(new_key) is None              # without the URL nothing is migrated
+    transcript, summary, vs_dir = load_cache(new_key, url)
+
+    assert (transcript, summary) == ("the transcript", "the summary")
+    assert vs_dir == cache_utils.artifact_path(new_key, "vectorstore")
+    assert os.path.exists(os.path.join(vs_dir, "chroma.sqlite3")) and not os.path.exists(old_vs)
+    assert manager.kinds(old_key) == set()
+    assert manager.get_meta(new_key, "transcript_source") == "whisper:base"
+    # Any other URL form now finds the migrated entry
+    assert load_cache(generate_cache_key(f"https://www.youtube.com/watch?v={VIDEO_ID}"))[0] == "the transcript"
+
+
+def test_migration_does_not_overwrite_an_existing_entry(cache_dir):
+    url = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+    old_key, new_key = legacy_cache_key(url), generate_cache_key(url)
+    manager = cache_utils.get_cache_manager()
+    manager.write_text(old_key, "transcript", "old")
+    manager.write_text(new_key, "transcript", "new")
+
+    assert cache_utils.migrate_cache_key(url, new_key) is False
+    assert manager.read_text(new_key, "transcript") == "new"
+    assert manager.read_text(old_key, "transcript") == "old"
@@ -0,0 +1,112 @@
+# final_project/tests/test_captions.py
+"""Caption parsing on local fixtures and caption track selection."""
+
+import os
+
+import pytest
+
+from final_project.captions import parse_vtt, parse_srv, parse_captions, find_caption_track
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "captions")
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+# ─────────────────────────── Parsing ───────────────────────────
+def test_manual_vtt():
+    assert parse_vtt(_read("manual.vtt")) == [
+        (0.0, 2.5, "Welcome back to the channel."),
+        (2.5, 5.0, "Today we talk about vector search & why it matters."),
+        (5.0, 6.0, "Again."),
+        (6.0, 7.0, "Again."),                # a line the speaker repeats is kept
+        (3723.25, 3724.0, "See you next time!"),
+    ]
+
+
+def test_rolling_auto_vtt_keeps_each_line_once():
+    assert parse_captions(_read("auto_rolling.vtt"), "vtt", "auto") == [
+        (0.16, 2.31, "hello everyone and welcome"),
+        (2.32, 4.87, "to the first lesson"),
+        (4.88, 7.03, "about search"),
+    ]
+
+
+def test_rolling_dedupe_is_off_for_manual_tracks():
+    text = _read("manual.vtt")
+    assert parse_captions(text, "vtt", "manual") == parse_vtt(text)
+    assert len(parse_vtt(text, rolling=True)) == 4
+
+
+def test_srv1():
+    assert parse_srv(_read("srv1.xml")) == [
+        (0.5, 2.6, "Welcome back to the channel."),
+        (2.6, 5.0, "Today we talk about vector search & why it matters."),
+        (6.25, 8.0, "See you next time!"),
+    ]
+
+
+def test_srv3():
+    segments = parse_captions(_read("srv3.xml"), "srv3")
+    assert [text for _, _, text in segments] == [
+        "Welcome back to the channel.",
+        "Today we talk about vector search",
+        "See you next time!",
+    ]
+    assert segments[0][:2] == (0.5, 2.6)
+    assert segments[-1][:2] == (6.25, 8.0)
+
+
+# ─────────────────────────── Track choice ───────────────────────────
+def _formats(*exts) -> list:
+    return [{"ext": ext, "url": f"https://example.com/{ext}"} for ext in exts]
+
+
+def _info(subtitles=None, automatic=None, language="en") -> dict:
+    return {"language": language, "subtitles": subtitles or {}, "automatic_captions": automatic or {}}
+
+
+def test_manual_track_in_the_videos_language():
+    info = _info(subtitles={"de": _formats("vtt"), "en": _formats("srv1", "json3", "vtt"),
+                            "live_chat": _formats("json")})
+    kind, lang, fmt = find_caption_track(info, languages=[], auto_policy="never")
+    assert (kind, lang, fmt["ext"]) == ("manual", "en", "vtt")
+
+
+def test_regional_variant_matches():
+    info = _info(subtitles={"en-GB": _formats("srv3")})
+    kind, lang, fmt = find_caption_track(info, languages=["en"], auto_policy="never")
+    assert (kind, lang, fmt["ext"]) == ("manual", "en-GB", "srv3")
+
+
+def test_manual_is_preferred_over_auto():
+    info = _info(subtitles={"en": _formats("srv1")}, automatic={"en-orig": _formats("vtt")})
+    assert find_caption_track(info, languages=["en"], auto_policy="fallback")[:2] == ("manual", "en")
+
+
+@pytest.mark.parametrize("policy, expected", [("never", None), ("fallback", ("auto", "en"))])
+def test_auto_only_with_fallback_policy(policy, expected):
+    info = _info(automatic={"en": _formats("vtt"), "fr": _formats("vtt")})
+    track = find_caption_track(info, languages=["en"], auto_policy=policy)
+    assert (track[:2] if track else None) == expected
+
+
+def test_orig_track_is_the_original_language():
+    # "-orig" marks the spoken language even when info["language"] says otherwise
+    info = _info(automatic={"en": _formats("vtt"), "es-orig": _formats("vtt", "srv3"), "es": _formats("vtt")},
+                 language="en")
+    kind, lang, fmt = find_caption_track(info, languages=["es"], auto_policy="fallback")
+    assert (kind, lang, fmt["url"]) == ("auto", "es", "https://example.com/vtt")
+
+
+def test_translated_auto_tracks_are_rejected():
+    info = _info(automatic={"en-orig": _formats("vtt"), "fr": _formats("vtt"), "de": _formats("vtt")})
+    assert find_caption_track(info, languages=["fr"], auto_policy="fallback") is None
+    assert find_caption_track(info, languages=["en"], auto_policy="fallback")[:2] == ("auto", "en")
+
+
+def test_no_usable_format():
+    info = _info(subtitles={"en": [{"ext": "json3", "url": "https://example.com/json3"}, {"ext": "vtt"}]})
+    assert find_caption_track(info, languages=["en"], auto_policy="never") is None
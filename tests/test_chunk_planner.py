@@ -0,0 +1,64 @@
+# final_project/tests/test_chunk_planner.py
+"""Chunk planning over speech spans and the chunk → source time mapping."""
+
+import random
+
+import pytest
+
+from final_project.chunk_planner import AudioChunk, plan_chunks
+
+
+def _spans(n: int, seed: int = 0) -> list:
+    """n speech spans of 5-15 s separated by 0.5-3 s silences."""
+    rng = random.Random(seed)
+    spans, t = [], 0.0
+    for _ in range(n):
+        length = rng.uniform(5, 15)
+        spans.append((t, t + length))
+        t += length + rng.uniform(0.5, 3)
+    return spans
+
+
+@pytest.mark.parametrize("workers", [2, 3, 4])
+def test_chunk_count_is_a_multiple_of_workers_with_even_load(workers):
+    spans = _spans(120)
+    chunks = plan_chunks(spans, target_sec=300, workers=workers)
+
+    assert len(chunks) % workers == 0
+    assert len(chunks) >= len(plan_chunks(spans, target_sec=300))
+    per_chunk = sum(end - start for start, end in spans) / len(chunks)
+    longest_span = max(end - start for start, end in spans)
+    for chunk in chunks:
+        assert abs(chunk.speech_sec - per_chunk) <= longest_span
+
+
+def test_chunk_count_never_exceeds_the_spans():
+    assert len(plan_chunks(_spans(3), target_sec=1, workers=4)) == 3
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_cuts_fall_only_between_spans(workers):
+    spans = _spans(80, seed=1)
+    chunks = plan_chunks(spans, target_sec=120, workers=workers)
+
+    assert all(chunk.spans for chunk in chunks)
+    assert [span for chunk in chunks for span in chunk.spans] == spans
+    for before, after in zip(chunks, chunks[1:]):
+        assert before.spans[-1][1] < after.spans[0][0]
+
+
+def test_to_source_time_across_inserted_pauses():
+    # Chunk-local layout: [0, 2) span 1, 0.2 s pause, [2.2, 7.2) span 2, pause, [7.4, 8.4) span 3
+    chunk = AudioChunk([(10.0, 12.0), (20.0, 25.0), (40.0, 41.0)])
+
+    assert chunk.speech_sec == pytest.approx(8.0)
+    expected = {
+        0.0: 10.0, 1.5: 11.5,
+        2.1: 12.0,                  # in the pause: end of the span before
+        2.25: 20.05, 3.2: 21.0, 7.15: 24.95,
+        7.3: 25.0,
+        7.45: 40.05, 8.0: 40.6,
+        9.0: 41.0,                  # past the last span
+    }
+    for local, source in expected.items():
+        assert chunk.to_source_time(local) == pytest.approx(source)
@@ -0,0 +1,73 @@
+# final_project/tests/test_numpy_vectorstore.py
+"""Crash recovery of the append path and the accuracy of quantized search."""
+
+import numpy as np
+import pytest
+
+from final_project.numpy_vectorstore import NumpyVectorStore
+
+DIM = 64
+
+
+def _vectors(rng, n: int) -> np.ndarray:
+    return rng.standard_normal((n, DIM)).astype(np.float32)
+
+
+def _add(store, rng, start: int, n: int) -> np.ndarray:
+    vectors = _vectors(rng, n)
+    store.add_embeddings([f"text {i}" for i in range(start, start + n)], vectors,
+                         metadatas=[{"row": i} for i in range(start, start + n)],
+                         ids=[f"id-{i}" for i in range(start, start + n)])
+    return vectors
+
+
+def _crash_on_commit():
+    raise OSError("disk full")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_interrupted_append_keeps_rows_aligned(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, None, dtype=dtype)
+    first = _add(store, rng, 0, 5)
+
+    # Vectors and docs are written, meta.json is not: the append never committed
+    store._write_meta = _crash_on_commit
+    with pytest.raises(OSError):
+        _add(store, rng, 5, 3)
+
+    reopened = NumpyVectorStore(path, None)
+    assert reopened.count == 5
+    assert reopened.rows()["ids"] == [f"id-{i}" for i in range(5)]
+
+    second = _add(reopened, rng, 5, 4)
+    store = NumpyVectorStore(path, None)
+    rows = store.rows()
+    assert store.count == 9
+    assert rows["ids"] == [f"id-{i}" for i in range(9)]
+    assert rows["documents"] == [f"text {i}" for i in range(9)]
+    assert [m["row"] for m in rows["metadatas"]] == list(range(9))
+    assert rows["embeddings"].shape == (9, DIM)
+    # Each row's own vector still finds its own text
+    for i, vector in enumerate(np.concatenate([first, second])):
+        doc, _ = store.similarity_search_with_score_by_vector(vector, k=1)[0]
+        assert (doc.id, doc.page_content) == (f"id-{i}", f"text {i}")
+
+
+@pytest.mark.parametrize("dtype, min_recall", [("float16", 0.98), ("int8", 0.9)])
+def test_quantized_top_k_matches_exact_search(tmp_path, dtype, min_recall):
+    rng = np.random.default_rng(1)
+    store = NumpyVectorStore(str(tmp_path / dtype), None, dtype=dtype)
+    vectors = _add(store, rng, 0, 500)
+    queries = _vectors(rng, 50)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    k, hits = 10, 0
+    for query in queries:
+        exact = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:k]
+        found = store.similarity_search_with_score_by_vector(query, k=k)
+        hits += len({f"id-{i}" for i in exact} & {doc.id for doc, _ in found})
+        scores = [score for _, score in found]
+        assert scores == sorted(scores, reverse=True)
+    assert hits / (k * len(queries)) >= min_recall
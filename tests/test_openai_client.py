@@ -0,0 +1,116 @@
+# final_project/tests/test_openai_client.py
+"""Client layer counters against the local mock server of benchmark.py."""
+
+import asyncio
+import threading
+
+import pytest
+
+from final_project import openai_client
+from final_project.benchmark import _start_mock
+from final_project.openai_client import (
+    TokenBucket,
+    http_client,
+    async_http_client,
+    get_metrics,
+    reset_metrics,
+    set_rate_limit,
+)
+
+MODEL = "mock-model"
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    """Starts the mock with server.latency / server.fail_every set by the test; yields its base URL."""
+    monkeypatch.setattr(openai_client, "OPENAI_BACKOFF_BASE_SEC", 0.01)
+    set_rate_limit(MODEL, 10000, 10**7)
+    reset_metrics()
+    server = _start_mock(latency_ms=0, fail_every=0)
+    server.url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    yield server
+    server.shutdown()
+
+
+def _chat(url: str, prompt: str) -> dict:
+    response = http_client().post(url, json={"model": MODEL, "messages": [{"role": "user", "content": prompt}]})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_distinct_requests_are_each_sent_once(mock_server):
+    for i in range(3):
+        _chat(mock_server.url, f"question {i}")
+    m = get_metrics()
+    assert mock_server.received == 3
+    assert (m["requests"], m["attempts"], m["retries"], m["rate_limited"], m["errors"]) == (3, 3, 0, 0, 0)
+    assert m["tokens_used"] == 3 * 21
+
+
+def test_429_is_retried_and_counted(mock_server):
+    # Server requests 2, 4, 6 get a 429: every request after the first needs one retry
+    mock_server.fail_every = 2
+    for i in range(4):
+        _chat(mock_server.url, f"question {i}")
+    m = get_metrics()
+    assert mock_server.received == 7
+    assert (m["requests"], m["attempts"], m["retries"], m["rate_limited"], m["errors"]) == (4, 7, 3, 3, 0)
+    assert m["backoff_sec"] >= 3 * 0.05         # never shorter than the mock's retry-after-ms
+
+
+def test_identical_requests_in_flight_are_coalesced(mock_server):
+    mock_server.latency = 0.3
+    barrier = threading.Barrier(5)
+    answers = []
+
+    def ask():
+        barrier.wait()
+        answers.append(_chat(mock_server.url, "same question"))
+
+    threads = [threading.Thread(target=ask) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    m = get_metrics()
+    assert mock_server.received == 1
+    assert (m["requests"], m["attempts"], m["coalesced"]) == (1, 1, 4)
+    assert len(answers) == 5 and all(a == answers[0] for a in answers)
+
+
+def test_retries_stop_after_max_retries(mock_server, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_RETRIES", 2)
+    mock_server.fail_every = 1
+    response = http_client().post(mock_server.url, json={"model": MODEL, "messages": [{"role": "user", "content": "x"}]})
+    m = get_metrics()
+    assert response.status_code == 429
+    assert mock_server.received == 3
+    assert (m["attempts"], m["retries"], m["rate_limited"], m["errors"]) == (3, 2, 3, 1)
+
+
+def test_async_client_retries_and_closes(mock_server):
+    mock_server.fail_every = 2
+
+    async def run():
+        async with async_http_client() as client:
+            for i in range(2):
+                response = await client.post(
+                    mock_server.url, json={"model": MODEL, "messages": [{"role": "user", "content": f"q{i}"}]}
+                )
+                assert response.status_code == 200
+        return client
+
+    client = asyncio.run(run())
+    m = get_metrics()
+    assert client.is_closed
+    assert (m["requests"], m["attempts"], m["retries"], m["rate_limited"]) == (2, 3, 1, 1)
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)                    # one unit per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    bucket.refund(1)
+    bucket.pause(5)
+    assert bucket.reserve(0) == pytest.approx(5.0, abs=0.05)
@@ -1,15 +1,69 @@
 # final_project/text_processing.py
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 from final_project.config import CHUNK_SIZE, CHUNK_OVERLAP
+from final_project.telemetry import timed
 
-def split_text(text: str):
+@timed("split_text")
+def split_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
     """Split a large text into smaller chunks."""
     
     splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,           # Each chunk is 1000 characters
-        chunk_overlap=CHUNK_OVERLAP      # Slight overlap to preserve meaning
+        chunk_size=chunk_size,           # Each chunk is 1000 characters
+        chunk_overlap=chunk_overlap      # Slight overlap to preserve meaning
     )
     
     docs = splitter.create_documents([text])
     return docs
+
+
+def _joined_len(window: list) -> int:
+    return sum(len(text) for _, _, text in window) + max(0, len(window) - 1)
+
+
+@timed("chunk_segments")
+def chunk_segments(segments, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> list:
+    """
+    Packs consecutive (start, end, text) segments into chunks of at most chunk_size
+    characters without cutting a segment. The last segments of a chunk (up to
+    chunk_overlap characters) are repeated at the start of the next one.
+    Each Document carries metadata start / end: the time range of its segments.
+    A single segment longer than chunk_size is split with split_text.
+    """
+    docs, window = [], []
+    fresh = False                # window holds segments not emitted yet
+
+    def emit():
+        docs.append(Document(
+            page_content=" ".join(text for _, _, text in window),
+            metadata={"start": window[0][0], "end": window[-1][1]},
+        ))
+
+    for start, end, text in segments:
+        text = text.strip()
+        if not text:
+            continue
+        start, end = float(start), float(end)
+
+        if len(text) > chunk_size:
+            if fresh:
+                emit()
+            window, fresh = [], False
+            for doc in split_text(text, chunk_size, chunk_overlap):
+                doc.metadata.update({"start": start, "end": end})
+                docs.append(doc)
+            continue
+
+        if fresh and _joined_len(window) + 1 + len(text) > chunk_size:
+            emit()
+            # Overlap: keep trailing segments that fit in chunk_overlap
+            while window and (_joined_len(window) > chunk_overlap
+                              or _joined_len(window) + 1 + len(text) > chunk_size):
+                window.pop(0)
+        window.append((start, end, text))
+        fresh = True
+
+    if fresh:
+        emit()
+    return docs
@@ -1,67 +1,334 @@
 # final_project/transcribe_audio.py
 
-from faster_whisper import WhisperModel
-from final_project.config import select_whisper_model
-from final_project.audio_utils import get_audio_duration, split_audio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import logging
+import time
 import os
 
-def transcribe_audio(file_path: str, progress_bar=None) -> tuple:
+import numpy as np
+
+from final_project.config import (
+    WHISPER_PARALLEL,
+    WHISPER_MAX_WORKERS,
+    WHISPER_CPU_THREADS,
+    WHISPER_SPLIT_ABOVE_MIN,
+    WHISPER_PART_MIN,
+    ADAPTIVE_CHUNKING,
+    PIPELINE_PROMPT_CHARS,
+)
+from final_project.audio_utils import get_audio_duration, split_audio
+from final_project.chunk_planner import plan_audio_chunks
+from final_project.model_registry import get_whisper_model
+from final_project.cache_utils import AUDIO_CHUNKS_DIR
+from final_project.whisper_calibration import plan_transcription, log_outcome
+from final_project.telemetry import span, timed, flushed
+
+logger = logging.getLogger(__name__)
+
+# Sample rate of the windows given to transcribe_stream
+STREAM_SAMPLE_RATE = 16000
+
+# Model owned by the current worker process (set by _init_worker)
+_worker_model = None
+
+
+def _init_worker(model_size: str, cpu_threads: int) -> None:
+    """Loads one WhisperModel per worker process, reused for all its parts."""
+    global _worker_model
+    _worker_model = get_whisper_model(model_size, cpu_threads=cpu_threads)
+
+
+def _segment_tuples(segments, to_source=None) -> list:
+    """faster-whisper segments → [(start, end, text)], times mapped by to_source(t) if given."""
+    if to_source is None:
+        return [(seg.start, seg.end, seg.text) for seg in segments]
+    return [(to_source(seg.start), to_source(seg.end), seg.text) for seg in segments]
+
+
+@flushed
+def _transcribe_part(idx: int, part: str, vad_filter: bool = True) -> tuple:
+    """Transcribes one audio part inside a worker. Returns (index, [(start, end, text)])."""
+    with span("whisper_part", part=idx) as s:
+        segments, _ = _worker_model.transcribe(part, beam_size=1, vad_filter=vad_filter)
+        segments = _segment_tuples(segments)
+        s["segments"] = len(segments)
+    return idx, segments
+
+
+def _resolve_workers(total_parts: int, max_workers: int = None, cpu_threads: int = None) -> tuple:
+    """
+    Chooses (workers, cpu_threads) so that workers * cpu_threads never
+    exceeds the available cores, and never starts more workers than parts.
+    """
+    cores = os.cpu_count() or 1
+    threads = max(1, min(cpu_threads or WHISPER_CPU_THREADS, cores))
+    workers = max(1, cores // threads)
+    cap = max_workers or WHISPER_MAX_WORKERS
+    if cap:
+        workers = min(workers, cap)
+    return max(1, min(workers, total_parts)), threads
+
+
+def _transcribe_parts_parallel(audio_parts: list, model_size: str, progress_bar=None,
+                               max_workers: int = None, cpu_threads: int = None,
+                               vad_filter: bool = True) -> list:
+    """
+    Spreads the parts over a process pool. Results are placed back by index,
+    so the transcript keeps the original order however the parts finish.
+    Returns the segments of each part, with times relative to the part.
+    """
+    total_parts = len(audio_parts)
+    workers, threads = _resolve_workers(total_parts, max_workers, cpu_threads)
+    results = [[] for _ in range(total_parts)]
+
+    # "spawn" avoids forking a parent that already holds CTranslate2 / Streamlit threads
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(model_size, threads),
+    ) as pool:
+        futures = [pool.submit(_transcribe_part, idx, part, vad_filter) for idx, part in enumerate(audio_parts)]
+        for done, future in enumerate(as_completed(futures), start=1):
+            idx, segments = future.result()
+            results[idx] = segments
+            if progress_bar:
+                progress_bar.progress(done / total_parts)
+
+    return results
+
+
+@timed("transcribe")
+def transcribe_audio(file_path: str, progress_bar=None, parallel: bool = None,
+                     max_workers: int = None, cpu_threads: int = None, on_segment=None) -> tuple:
     """
     Transcribes an audio file to text using Faster-Whisper,
     with automatic model selection, chunking of long files, and optional Streamlit progress bar.
+    Long files can be transcribed in parallel (one model per worker process);
+    parallel / max_workers / cpu_threads default to the values in config
+    (without parallelism, cpu_threads=None lets CTranslate2 use every core).
+    on_segment(start, end, text) is called for every segment, in time order,
+    with times in seconds from the start of the file.
+    The model (and, unless given, the layout, thread and worker counts) come from
+    plan_transcription: the best calibrated model that fits the time budget
+    with the given parallel / cpu_threads.
     Returns: (full transcript, Whisper model name used)
     """
+    started = time.perf_counter()
+
     # Calculate audio duration (in minutes)
     duration = get_audio_duration(file_path)
 
-    # Select Whisper model based on duration
-    model_size = select_whisper_model(duration)
+    # Select Whisper model from the measured throughput (duration rules if not calibrated)
+    plan = plan_transcription(duration, parallel=WHISPER_PARALLEL if parallel is None else parallel,
+                              cpu_threads=cpu_threads)
+    parallel = plan["parallel"]
+    if parallel:
+        # A single-process run keeps the caller's cpu_threads, so the registry reuses its model
+        cpu_threads = plan["cpu_threads"] or cpu_threads
+        if max_workers is None:
+            max_workers = plan["workers"]
 
-    # Load model on CPU to avoid CUDA/cuDNN errors
-    model = WhisperModel(model_size, device="cpu", compute_type="int8")
+    with span("whisper", model=plan["model"], audio_min=round(duration, 2), parallel=parallel):
+        result = _transcribe_file(file_path, duration, plan["model"], progress_bar, parallel,
+                                  max_workers, cpu_threads, on_segment)
+    log_outcome(plan, duration, time.perf_counter() - started)
+    return result
 
-    # If the audio is longer than 30 minutes → split into 10-minute chunks
-    if duration > 30:
-        cache_audio_dir = os.path.join("cache", "audio", "chunks")
-        os.makedirs(cache_audio_dir, exist_ok=True)
 
-        audio_parts = split_audio(
-            file_path,
-            chunk_duration_min=10,
-            output_dir=cache_audio_dir
+def _transcribe_parts(audio_parts: list, to_source: list, vad_filter: bool, model_size: str,
+                      progress_bar, parallel: bool, max_workers: int, cpu_threads: int, on_segment) -> tuple:
+    """Transcribes the parts of a long file; to_source maps part times back to the file."""
+    if parallel and len(audio_parts) > 1:
+        results = _transcribe_parts_parallel(
+            audio_parts, model_size, progress_bar,
+            max_workers=max_workers, cpu_threads=cpu_threads, vad_filter=vad_filter,
         )
-
         all_text = []
-        total_parts = len(audio_parts)
-
-        for idx, part in enumerate(audio_parts, start=1):
-            # Transcribe each part
-            segments, _ = model.transcribe(
-                part,
-                beam_size=1,
-                vad_filter=True
-            )
-            text = " ".join(seg.text for seg in segments)
-            all_text.append(text)
-
-            # Update progress bar if provided
-            if progress_bar:
-                progress_bar.progress(idx / total_parts)
-
+        for mapper, segments in zip(to_source, results):
+            all_text.append(" ".join(text for _, _, text in segments))
+            if on_segment:
+                for start, end, text in segments:
+                    on_segment(mapper(start), mapper(end), text)
         # Combine all chunks into full transcript
         return "\n".join(all_text), model_size
 
+    # Shared CPU model from the registry (loaded once per process)
+    model = get_whisper_model(model_size, cpu_threads=cpu_threads or 0)
+
+    all_text = []
+    total_parts = len(audio_parts)
+
+    for idx, part in enumerate(audio_parts, start=1):
+        # Transcribe each part
+        segments, _ = model.transcribe(
+            part,
+            beam_size=1,
+            vad_filter=vad_filter
+        )
+        segments = _segment_tuples(segments, to_source[idx - 1])
+        text = " ".join(text for _, _, text in segments)
+        all_text.append(text)
+        if on_segment:
+            for segment in segments:
+                on_segment(*segment)
+
+        # Update progress bar if provided
+        if progress_bar:
+            progress_bar.progress(idx / total_parts)
+
+    # Combine all chunks into full transcript
+    return "\n".join(all_text), model_size
+
+
+def _transcribe_file(file_path: str, duration: float, model_size: str, progress_bar, parallel: bool,
+                     max_workers: int, cpu_threads: int, on_segment) -> tuple:
+    """Body of transcribe_audio once the model is chosen."""
+    # If the audio is longer than WHISPER_SPLIT_ABOVE_MIN → split into chunks of about WHISPER_PART_MIN
+    if duration > WHISPER_SPLIT_ABOVE_MIN:
+        cache_audio_dir = AUDIO_CHUNKS_DIR
+        os.makedirs(cache_audio_dir, exist_ok=True)
+
+        if ADAPTIVE_CHUNKING:
+            # VAD once over the whole file; chunks hold speech only and are cut in silences
+            workers = _resolve_workers(os.cpu_count() or 1, max_workers, cpu_threads)[0] if parallel else 1
+            chunks = plan_audio_chunks(file_path, cache_audio_dir, workers=workers)
+            audio_parts = [c.path for c in chunks]
+            to_source = [c.to_source_time for c in chunks]
+            vad_filter = False
+        else:
+            audio_parts = split_audio(
+                file_path,
+                chunk_duration_min=WHISPER_PART_MIN,
+                output_dir=cache_audio_dir
+            )
+            # Start time of each part within the file
+            offsets = [0.0]
+            for part in audio_parts[:-1]:
+                offsets.append(offsets[-1] + get_audio_duration(part) * 60)
+            to_source = [lambda t, o=o: o + t for o in offsets]
+            vad_filter = True
+
+        try:
+            return _transcribe_parts(audio_parts, to_source, vad_filter, model_size, progress_bar,
+                                     parallel, max_workers, cpu_threads, on_segment)
+        finally:
+            # The parts are scratch files (the cache budget counts them until they are gone)
+            for part in audio_parts:
+                if os.path.exists(part):
+                    os.remove(part)
+
     else:
+        # Shared CPU model from the registry (loaded once per process)
+        model = get_whisper_model(model_size, cpu_threads=cpu_threads or 0)
+
         # Direct transcription for short files
         segments, _ = model.transcribe(
             file_path,
             beam_size=1,
             vad_filter=True
         )
-        transcript = " ".join(seg.text for seg in segments)
+        segments = _segment_tuples(segments)
+        transcript = " ".join(text for _, _, text in segments)
+        if on_segment:
+            for segment in segments:
+                on_segment(*segment)
 
         # Ensure progress bar reaches 100%
         if progress_bar:
             progress_bar.progress(1.0)
 
         return transcript, model_size
+
+
+@timed("transcribe_stream")
+def _prompt(texts: list) -> str:
+    """The last PIPELINE_PROMPT_CHARS characters of the text so far (None before any text)."""
+    tail, size = [], 0
+    for text in reversed(texts):
+        tail.append(text)
+        size += len(text) + 1
+        if size >= PIPELINE_PROMPT_CHARS:
+            break
+    prompt = " ".join(reversed(tail))[-PIPELINE_PROMPT_CHARS:].strip()
+    return prompt or None
+
+
+def transcribe_stream(windows, duration_sec: float = None, progress_bar=None,
+                      on_segment=None, model_size: str = None) -> tuple:
+    """
+    Transcribes audio that arrives as consecutive 16 kHz float32 windows
+    (e.g. from download_audio.stream_audio_from_youtube), so the first minutes
+    are transcribed while the rest is still downloading.
+
+    The last segment of each window is held back and re-decoded with the next
+    window, so words are not cut at window borders. Like a whole-file run, each
+    window keeps the language detected on the first speech and is prompted with
+    the end of the text before it. on_segment(start, end, text) is called for
+    every finished segment, with times in seconds from the start.
+    Returns: (full transcript, Whisper model name used, stats dict)
+    """
+    started = time.perf_counter()
+    plan = None
+    if model_size is None:
+        # Windows are decoded one after another: a single-process plan
+        plan = plan_transcription((duration_sec or 0) / 60, parallel=False)
+        model_size = plan["model"]
+    model = get_whisper_model(model_size)
+
+    texts = []
+    stats = {"time_to_first_segment": None, "audio_seconds": 0.0}
+    carry = np.zeros(0, dtype=np.float32)
+    offset = 0.0                 # seconds of audio before `carry`
+    language = None              # detected once, on the first window with speech
+
+    def _emit(segments):
+        for seg in segments:
+            if stats["time_to_first_segment"] is None:
+                stats["time_to_first_segment"] = time.perf_counter() - started
+                logger.info(f"First segment after {stats['time_to_first_segment']:.1f}s")
+            texts.append(seg.text)
+            if on_segment:
+                on_segment(offset + seg.start, offset + seg.end, seg.text)
+
+    for window in windows:
+        stats["audio_seconds"] += len(window) / STREAM_SAMPLE_RATE
+        audio = np.concatenate([carry, window]) if carry.size else window
+        segments, info = model.transcribe(audio, beam_size=1, vad_filter=True, language=language,
+                                          initial_prompt=_prompt(texts))
+        segments = list(segments)
+        if language is None and segments:
+            language = info.language
+
+        cut = len(audio)
+        max_carry = len(window) // 2
+        if segments and len(audio) - int(segments[-1].start * STREAM_SAMPLE_RATE) <= max_carry:
+            cut = int(segments[-1].start * STREAM_SAMPLE_RATE)
+            segments = segments[:-1]
+
+        _emit(segments)
+        offset += cut / STREAM_SAMPLE_RATE
+        carry = audio[cut:]
+
+        if progress_bar and duration_sec:
+            progress_bar.progress(min(1.0, offset / duration_sec))
+
+    if carry.size:
+        segments, _ = model.transcribe(carry, beam_size=1, vad_filter=True, language=language,
+                                       initial_prompt=_prompt(texts))
+        _emit(segments)
+
+    if progress_bar:
+        progress_bar.progress(1.0)
+
+    stats["total_time"] = time.perf_counter() - started
+    if plan is not None:
+        stats["predicted_time"] = plan["predicted_sec"]
+        log_outcome(plan, stats["audio_seconds"] / 60, stats["total_time"])
+    logger.info(
+        f"Streamed {stats['audio_seconds']:.0f}s of audio with '{model_size}' in {stats['total_time']:.1f}s "
+        f"(first segment after {stats['time_to_first_segment'] or 0:.1f}s)"
+    )
+    return " ".join(texts), model_size, stats
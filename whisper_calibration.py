@@ -0,0 +1,243 @@
+# final_project/whisper_calibration.py
+"""
+Throughput-aware choice of the Whisper model.
+
+    python -m final_project.whisper_calibration [--clip file.wav] [--sizes base small medium]
+
+Calibration transcribes a short reference clip with every installed model,
+once with WHISPER_CPU_THREADS threads (one parallel worker) and once with
+all cores (a single process). The real-time factor of each run
+(seconds of compute per second of audio) is saved to WHISPER_CALIBRATION_PATH.
+
+plan_transcription() then picks the best model that should finish a file of
+a given duration within WHISPER_TIME_BUDGET_SEC on the cores that are free,
+together with the matching cpu_threads / workers. Without a calibration file
+the duration rules in config (select_whisper_model) still apply.
+"""
+
+import os
+import sys
+import glob
+import json
+import math
+import time
+import wave
+import socket
+import logging
+import argparse
+
+import numpy as np
+
+from final_project.config import (
+    select_whisper_model,
+    WHISPER_COMPUTE_TYPE,
+    WHISPER_CPU_THREADS,
+    WHISPER_MAX_WORKERS,
+    WHISPER_PARALLEL,
+    WHISPER_SPLIT_ABOVE_MIN,
+    WHISPER_PART_MIN,
+    WHISPER_CALIBRATION_PATH,
+    WHISPER_CALIBRATION_CLIP_SEC,
+    WHISPER_TIME_BUDGET_SEC,
+    WHISPER_QUALITY_ORDER,
+)
+from final_project.model_registry import get_whisper_model, installed_model_sizes
+
+logger = logging.getLogger(__name__)
+
+_SAMPLE_RATE = 16000
+
+
+# ─────────────────────────── Calibration ───────────────────────────
+def _reference_clip(clip_path: str = None, clip_sec: float = WHISPER_CALIBRATION_CLIP_SEC) -> tuple:
+    """
+    Returns (float32 samples, is_speech). Uses the given 16 kHz mono WAV, else
+    the first cached audio file, else synthetic noise (decoded without VAD so
+    Whisper still does a full pass).
+    """
+    paths = [clip_path] if clip_path else sorted(glob.glob(os.path.join("cache", "audio", "*.wav")))
+    for path in paths:
+        try:
+            with wave.open(path, "rb") as w:
+                if w.getframerate() != _SAMPLE_RATE or w.getnchannels() != 1 or w.getsampwidth() != 2:
+                    continue
+                frames = w.readframes(int(clip_sec * _SAMPLE_RATE))
+        except (OSError, EOFError, wave.Error):
+            continue
+        logger.info(f"Calibrating on {path}")
+        return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0, True
+
+    logger.info("No reference clip found, calibrating on synthetic audio")
+    rng = np.random.default_rng(0)
+    return (0.1 * rng.standard_normal(int(clip_sec * _SAMPLE_RATE))).astype(np.float32), False
+
+
+def _measure_rtf(model_size: str, audio: np.ndarray, speech: bool, cpu_threads: int) -> float:
+    model = get_whisper_model(model_size, cpu_threads=cpu_threads)
+    # One untimed pass so lazy initialisation does not count
+    list(model.transcribe(audio[:_SAMPLE_RATE * 2], beam_size=1, vad_filter=False)[0])
+    t0 = time.perf_counter()
+    segments, _ = model.transcribe(audio, beam_size=1, vad_filter=speech)
+    list(segments)
+    return (time.perf_counter() - t0) / (len(audio) / _SAMPLE_RATE)
+
+
+def calibrate(sizes: list = None, clip_path: str = None,
+              clip_sec: float = WHISPER_CALIBRATION_CLIP_SEC) -> dict:
+    """Measures the real-time factor of each model and saves the results."""
+    sizes = sizes or installed_model_sizes() or sorted(
+        {select_whisper_model(m) for m in (1, 60, 600)}, key=_quality
+    )
+    audio, speech = _reference_clip(clip_path, clip_sec)
+    cores = os.cpu_count() or 1
+    thread_counts = sorted({min(WHISPER_CPU_THREADS, cores), cores})
+
+    results = {}
+    for size in sizes:
+        results[size] = {}
+        for threads in thread_counts:
+            rtf = _measure_rtf(size, audio, speech, threads)
+            results[size][str(threads)] = round(rtf, 4)
+            logger.info(f"Whisper '{size}' with {threads} threads: RTF {rtf:.3f}")
+
+    calibration = {
+        "host": socket.gethostname(),
+        "cores": cores,
+        "compute_type": WHISPER_COMPUTE_TYPE,
+        "clip_sec": round(len(audio) / _SAMPLE_RATE, 1),
+        "speech": speech,
+        "measured_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "rtf": results,
+    }
+    os.makedirs(os.path.dirname(WHISPER_CALIBRATION_PATH) or ".", exist_ok=True)
+    tmp = f"{WHISPER_CALIBRATION_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(tmp, WHISPER_CALIBRATION_PATH)
+    _cached.clear()
+    return calibration
+
+
+_cached = {}
+
+
+def load_calibration() -> dict:
+    """Returns the saved calibration for this host, or None."""
+    try:
+        mtime = os.path.getmtime(WHISPER_CALIBRATION_PATH)
+    except OSError:
+        return None
+    if _cached.get("mtime") != mtime:
+        with open(WHISPER_CALIBRATION_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("host") != socket.gethostname():
+            logger.warning(f"{WHISPER_CALIBRATION_PATH} was measured on {data.get('host')}, ignoring it")
+            data = None
+        _cached.update(mtime=mtime, data=data)
+    return _cached["data"]
+
+
+# ─────────────────────────── Selection ───────────────────────────
+def _quality(model_size: str) -> int:
+    return WHISPER_QUALITY_ORDER.index(model_size) if model_size in WHISPER_QUALITY_ORDER else -1
+
+
+def free_cores() -> int:
+    """Cores not busy according to the 1-minute load average (all cores where unavailable)."""
+    cores = os.cpu_count() or 1
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return cores
+    return max(1, min(cores, round(cores - load)))
+
+
+def _rtf_at(rtf_by_threads: dict, threads: int) -> float:
+    """RTF measured with the closest thread count, scaled linearly from there."""
+    measured = {int(t): r for t, r in rtf_by_threads.items()}
+    nearest = min(measured, key=lambda t: abs(t - threads))
+    return measured[nearest] * nearest / threads if threads < nearest else measured[nearest]
+
+
+def _predict(rtf_by_threads: dict, duration_sec: float, cores: int, parallel: bool,
+             cpu_threads: int = None) -> tuple:
+    """
+    Returns (predicted seconds, parallel, cpu_threads, workers) of the faster layout.
+    cpu_threads, if given, is the thread count the caller runs with (per worker).
+    """
+    single = max(1, min(cpu_threads or cores, cores))
+    options = [(duration_sec * _rtf_at(rtf_by_threads, single), False, single, 1)]
+    if parallel and duration_sec / 60 > WHISPER_SPLIT_ABOVE_MIN:
+        threads = max(1, min(cpu_threads or WHISPER_CPU_THREADS, cores))
+        parts = math.ceil(duration_sec / 60 / WHISPER_PART_MIN)
+        workers = min(max(1, cores // threads), parts, WHISPER_MAX_WORKERS or parts)
+        rounds = math.ceil(parts / workers)
+        options.append((rounds * WHISPER_PART_MIN * 60 * _rtf_at(rtf_by_threads, threads), True, threads, workers))
+    return min(options, key=lambda o: o[0])
+
+
+def plan_transcription(duration_min: float, budget_sec: float = WHISPER_TIME_BUDGET_SEC,
+                       cores: int = None, parallel: bool = WHISPER_PARALLEL, cpu_threads: int = None) -> dict:
+    """
+    Chooses the model, cpu_threads and worker count for a file of duration_min.
+    parallel=False and cpu_threads are the caller's constraints, e.g. a batch
+    pool worker that runs single-process on 2 threads next to other workers.
+    Returns {"model", "parallel", "cpu_threads", "workers", "predicted_sec"};
+    predicted_sec is None (and cpu_threads the given one) when no calibration is available.
+    """
+    calibration = load_calibration()
+    duration_sec = duration_min * 60
+    cores = cores or free_cores()
+    if not calibration or not calibration.get("rtf"):
+        return {"model": select_whisper_model(duration_min), "parallel": parallel,
+                "cpu_threads": cpu_threads, "workers": None, "predicted_sec": None}
+
+    candidates = []
+    for size, rtf_by_threads in calibration["rtf"].items():
+        predicted, use_parallel, threads, workers = _predict(rtf_by_threads, duration_sec, cores, parallel,
+                                                             cpu_threads)
+        candidates.append({"model": size, "parallel": use_parallel, "cpu_threads": threads,
+                           "workers": workers, "predicted_sec": predicted})
+
+    within = [c for c in candidates if budget_sec is None or c["predicted_sec"] <= budget_sec]
+    if within:
+        plan = max(within, key=lambda c: (_quality(c["model"]), -c["predicted_sec"]))
+    else:
+        plan = min(candidates, key=lambda c: c["predicted_sec"])
+        logger.warning(f"No Whisper model fits {budget_sec:.0f}s for {duration_min:.1f} min, using the fastest")
+    logger.info(
+        f"Whisper plan for {duration_min:.1f} min on {cores} free cores: '{plan['model']}' "
+        f"({'parallel' if plan['parallel'] else 'single process'}, {plan['cpu_threads']} threads, "
+        f"{plan['workers']} workers), predicted {plan['predicted_sec']:.0f}s (budget {budget_sec}s)"
+    )
+    return plan
+
+
+def log_outcome(plan: dict, duration_min: float, elapsed_sec: float) -> None:
+    """Logs predicted vs actual transcription time."""
+    if plan.get("predicted_sec"):
+        logger.info(
+            f"Whisper '{plan['model']}' on {duration_min:.1f} min: predicted {plan['predicted_sec']:.0f}s, "
+            f"actual {elapsed_sec:.0f}s ({elapsed_sec / plan['predicted_sec']:.2f}×)"
+        )
+    else:
+        logger.info(f"Whisper '{plan['model']}' on {duration_min:.1f} min: {elapsed_sec:.0f}s (not calibrated)")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the Whisper real-time factor on this host.")
+    parser.add_argument("--clip", help="16 kHz mono WAV used as reference (default: a cached audio file)")
+    parser.add_argument("--clip-sec", type=float, default=WHISPER_CALIBRATION_CLIP_SEC)
+    parser.add_argument("--sizes", nargs="*", help="model sizes (default: the installed ones)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    calibration = calibrate(args.sizes, args.clip, args.clip_sec)
+    print(f"\nSaved {WHISPER_CALIBRATION_PATH}")
+    for size, rtf in calibration["rtf"].items():
+        print(f"{size:<10} " + "  ".join(f"{t} threads: RTF {r:.3f}" for t, r in rtf.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())